@@ -0,0 +1,424 @@
+import os
+import json
+import glob
+import argparse
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+import networkx as nx
+
+from app.graph import (
+    graph_from_edges,
+    graph_from_adjacency_matrix,
+    planar_embedding,
+    find_faces_in_embedding,
+    build_faces_matrix,
+    build_vertex_faces,
+    calc_tait_0_aggregated,
+)
+from app.parallel import get_executor
+
+
+# number of graphs per output shard
+DEFAULT_SHARD_SIZE = 1000
+
+PROGRESS_FILE = "progress.json"
+
+SHARD_PATTERN = "shard_{:05d}.npz"
+
+
+def _plantri_vertex(letter: str) -> int:
+    if "a" <= letter <= "z":
+        return ord(letter) - ord("a")
+    return 26 + ord(letter) - ord("A")
+
+
+def parse_graph_record(record: str | Dict | List) -> Tuple[str | None, nx.Graph]:
+    """
+    Parse one graph of a catalog. Supported records:
+
+    * plantri ASCII planar code: `"4 bcd,adc,abd,acb"`, number of vertices
+      and comma separated neighbors of every vertex, vertices are letters `a-z`,
+      then `A-Z`;
+    * JSON object with `"edges"` (and optionally `"n_vertices"`), `"adjacency"`
+      (lists of neighbors) or `"adjacency_matrix"`, and optional `"id"`;
+    * JSON list of edges.
+
+    Args:
+        record (str | Dict | List): line of a catalog or already parsed JSON
+
+    Raises:
+        ValueError: if the record cannot be parsed
+
+    Returns:
+        Tuple[str | None, nx.Graph]: id of the graph (if given) and the graph
+    """
+    if isinstance(record, str):
+        line = record.strip()
+        if line.startswith("{") or line.startswith("["):
+            record = json.loads(line)
+        else:
+            n_vertices, _, neighbors = line.partition(" ")
+            n_vertices = int(n_vertices)
+            adjacency = neighbors.strip().split(",")
+            if len(adjacency) != n_vertices:
+                raise ValueError("Wrong number of vertices in planar code")
+            graph = nx.Graph()
+            graph.add_nodes_from(range(n_vertices))
+            for v, letters in enumerate(adjacency):
+                graph.add_edges_from((v, _plantri_vertex(u)) for u in letters)
+            return None, graph
+
+    if isinstance(record, list):
+        return None, graph_from_edges(record)
+
+    graph_id = record.get("id")
+    if graph_id is not None:
+        graph_id = str(graph_id)
+    if "edges" in record:
+        return graph_id, graph_from_edges(record["edges"], record.get("n_vertices"))
+    if "adjacency" in record:
+        graph = nx.Graph()
+        graph.add_nodes_from(range(len(record["adjacency"])))
+        for v, neighbors in enumerate(record["adjacency"]):
+            graph.add_edges_from((v, u) for u in neighbors)
+        return graph_id, graph
+    if "adjacency_matrix" in record:
+        return graph_id, graph_from_adjacency_matrix(record["adjacency_matrix"])
+    raise ValueError("Unknown graph record")
+
+
+def process_graph_record(
+    line: int, record: str | Dict | List, symmetry: bool = False
+) -> Dict[str, Any]:
+    """
+    Run the whole pipeline for one graph: faces of its planar embedding,
+    Faces Matrix and aggregated ranks and ${\\det}'$ (see `calc_tait_0_aggregated`).
+    Errors (e.g. the graph is not planar or not cubic) are reported in the result.
+
+    Args:
+        line (int): number of the record in the catalog
+        record (str | Dict | List): graph, see `parse_graph_record`
+        symmetry (bool, optional): see `calc_tait_0_aggregated`. Defaults to False.
+
+    Returns:
+        Dict[str, Any]: JSON-serializable result with `status` "ok" or "error"
+    """
+    graph_id = str(line)
+    try:
+        parsed_id, graph = parse_graph_record(record)
+        graph_id = parsed_id if parsed_id is not None else graph_id
+        if any(degree != 3 for _, degree in graph.degree):
+            raise ValueError("Graph is not cubic")
+        faces = find_faces_in_embedding(planar_embedding(graph))
+        vertex_faces = build_vertex_faces(faces)
+        (
+            n_tait_0,
+            n_even_ranks,
+            n_odd_ranks,
+            n_zero_ranks,
+            det_minors,
+            rank_list,
+            _,
+            nums,
+            _,
+        ) = calc_tait_0_aggregated(
+            build_faces_matrix(faces), n_workers=1, symmetry=symmetry
+        )
+    except (ValueError, KeyError, TypeError, nx.NetworkXException) as e:
+        return {"line": line, "id": graph_id, "status": "error", "message": str(e)}
+
+    return {
+        "line": line,
+        "id": graph_id,
+        "status": "ok",
+        "n_vertices": graph.number_of_nodes(),
+        "tait_0": n_tait_0,
+        "n_even_ranks": n_even_ranks,
+        "n_odd_ranks": n_odd_ranks,
+        "n_zero_ranks": n_zero_ranks,
+        "det_list": det_minors,
+        "rank_list": rank_list,
+        "num_list": nums,
+        "vertex_faces": vertex_faces.tolist(),
+    }
+
+
+def _process_graph_record_args(args: Tuple) -> Dict[str, Any]:
+    return process_graph_record(*args)
+
+
+def process_graph_records(
+    records: List[Tuple[int, str | Dict | List]],
+    symmetry: bool = False,
+    n_workers: int = 1,
+    progress: Callable[[int, int], None] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Process graphs with `process_graph_record` on a process pool (every graph
+    is processed by one worker), results are in the order of `records`
+
+    Args:
+        records (List[Tuple[int, str | Dict | List]]): numbers and records of graphs
+        symmetry (bool, optional): see `calc_tait_0_aggregated`. Defaults to False.
+        n_workers (int, optional): number of worker processes. Defaults to 1.
+        progress (Callable[[int, int], None] | None, optional): called with
+            the number of processed graphs and the total number. Defaults to None.
+
+    Returns:
+        List[Dict[str, Any]]: results of every graph
+    """
+    arguments = [(line, record, symmetry) for line, record in records]
+    if n_workers > 1:
+        results_iterator = get_executor(n_workers).map(
+            _process_graph_record_args, arguments
+        )
+    else:
+        results_iterator = map(_process_graph_record_args, arguments)
+
+    results = []
+    for result in results_iterator:
+        results.append(result)
+        if progress is not None:
+            progress(len(results), len(arguments))
+    return results
+
+
+def results_to_columns(results: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Convert results of graphs to columns of a shard. Lists of every graph
+    (histogram of ranks and ${\\det}'$, faces of vertices) are concatenated,
+    values of graph `i` are `column[offsets[i]:offsets[i + 1]]`.
+
+    Args:
+        results (List[Dict[str, Any]]): see `process_graph_record`
+
+    Returns:
+        Dict[str, np.ndarray]: columns
+    """
+    ok = [result["status"] == "ok" for result in results]
+
+    def column(key, dtype, default=-1):
+        return np.array(
+            [result[key] if is_ok else default for result, is_ok in zip(results, ok)],
+            dtype=dtype,
+        )
+
+    def ragged(key):
+        lists = [result[key] if is_ok else [] for result, is_ok in zip(results, ok)]
+        offsets = np.zeros(len(results) + 1, dtype=np.int64)
+        np.cumsum([len(values) for values in lists], out=offsets[1:])
+        return offsets, [v for values in lists for v in values]
+
+    histogram_offsets, det_values = ragged("det_list")
+    _, rank_values = ragged("rank_list")
+    _, num_values = ragged("num_list")
+    vertex_offsets, vertex_faces = ragged("vertex_faces")
+
+    return {
+        "line": np.array([result["line"] for result in results], dtype=np.int64),
+        "id": np.array([result["id"] for result in results], dtype=str),
+        "status": np.array([result["status"] for result in results], dtype=str),
+        "message": np.array(
+            [result.get("message", "") for result in results], dtype=str
+        ),
+        "n_vertices": column("n_vertices", np.int32),
+        "tait_0": column("tait_0", np.int64),
+        "n_even_ranks": column("n_even_ranks", np.int64),
+        "n_odd_ranks": column("n_odd_ranks", np.int64),
+        "n_zero_ranks": column("n_zero_ranks", np.int64),
+        "histogram_offsets": histogram_offsets,
+        "histogram_det": np.array(det_values, dtype=np.int8),
+        "histogram_rank": np.array(rank_values, dtype=np.int16),
+        "histogram_count": np.array(num_values, dtype=np.int64),
+        "vertex_offsets": vertex_offsets,
+        "vertex_faces": np.array(vertex_faces, dtype=np.int32).reshape(-1, 3),
+    }
+
+
+def _write_atomically(path: str, write: Callable[[Any], None]) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_progress(output_dir: str) -> Dict[str, Any]:
+    path = os.path.join(output_dir, PROGRESS_FILE)
+    if not os.path.exists(path):
+        return {"lines_done": 0, "n_shards": 0, "n_graphs": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _remove_shards(output_dir: str) -> None:
+    # shards of a previous run, `load_batch_results` would read them all
+    for path in glob.glob(os.path.join(output_dir, "shard_*.npz*")):
+        os.remove(path)
+
+
+def _iter_catalog_records(
+    input_path: str, lines_done: int
+) -> Iterator[Tuple[int, int, str]]:
+    """
+    Lines of a catalog after the first `lines_done`, without empty lines
+    and comments (`#`): number of lines read so far, number of the line, line
+    """
+    with open(input_path) as f:
+        for line_number, line in enumerate(f):
+            if line_number < lines_done:
+                continue
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line_number + 1, line_number, line
+
+
+def run_batch(
+    input_path: str,
+    output_dir: str,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    n_workers: int = 1,
+    symmetry: bool = False,
+    restart: bool = False,
+    progress: Callable[[int, int], None] | None = None,
+) -> Dict[str, Any]:
+    """
+    Process a catalog of graphs (one record per line, see `parse_graph_record`)
+    and write results to NPZ shards of `shard_size` graphs
+    (see `results_to_columns`) in `output_dir`.
+
+    Shards are written atomically and `progress.json` is updated after every shard,
+    so an interrupted run continues from the first graph of the unfinished shard.
+    A run from the start (`restart` or no saved progress) removes shards
+    of a previous run from `output_dir`.
+
+    Args:
+        input_path (str): path to the catalog
+        output_dir (str): directory for shards and progress
+        shard_size (int, optional): graphs per shard. Defaults to DEFAULT_SHARD_SIZE.
+        n_workers (int, optional): number of worker processes. Defaults to 1.
+        symmetry (bool, optional): see `calc_tait_0_aggregated`. Defaults to False.
+        restart (bool, optional): ignore the saved progress. Defaults to False.
+        progress (Callable[[int, int], None] | None, optional): called with
+            the number of processed graphs and the number of processed lines after
+            every shard. Defaults to None.
+
+    Raises:
+        ValueError: if the saved progress belongs to another catalog
+            or shard size (use `restart`)
+
+    Returns:
+        Dict[str, Any]: final progress: lines read, shards and graphs written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state = {"lines_done": 0, "n_shards": 0, "n_graphs": 0}
+    if not restart:
+        state = _read_progress(output_dir)
+    for key, value in [
+        ("input", os.path.abspath(input_path)),
+        ("shard_size", shard_size),
+    ]:
+        if state.get(key, value) != value:
+            raise ValueError(
+                f"Progress in {output_dir} belongs to a run with {key} "
+                f"{state[key]}, not {value}; restart to overwrite it"
+            )
+        state[key] = value
+    if state["n_shards"] == 0:
+        _remove_shards(output_dir)
+
+    def flush(records: List[Tuple[int, str]], lines_done: int) -> None:
+        results = process_graph_records(records, symmetry, n_workers)
+        columns = results_to_columns(results)
+        shard_path = os.path.join(output_dir, SHARD_PATTERN.format(state["n_shards"]))
+        _write_atomically(shard_path, lambda f: np.savez_compressed(f, **columns))
+
+        state["lines_done"] = lines_done
+        state["n_shards"] += 1
+        state["n_graphs"] += len(records)
+        _write_atomically(
+            os.path.join(output_dir, PROGRESS_FILE),
+            lambda f: f.write(json.dumps(state).encode()),
+        )
+        if progress is not None:
+            progress(state["n_graphs"], state["lines_done"])
+
+    records = []
+    lines_done = state["lines_done"]
+    for lines_done, line_number, line in _iter_catalog_records(
+        input_path, state["lines_done"]
+    ):
+        records.append((line_number, line))
+        if len(records) == shard_size:
+            flush(records, lines_done)
+            records = []
+    if records:
+        flush(records, lines_done)
+    return state
+
+
+def load_batch_results(output_dir: str) -> Dict[str, np.ndarray]:
+    """
+    Load all shards written by `run_batch` as one set of columns,
+    offsets of lists are shifted accordingly
+
+    Args:
+        output_dir (str): directory with shards
+
+    Returns:
+        Dict[str, np.ndarray]: columns, see `results_to_columns`
+    """
+    shards = []
+    for path in sorted(glob.glob(os.path.join(output_dir, "shard_*.npz"))):
+        with np.load(path) as shard:
+            shards.append({key: shard[key] for key in shard.files})
+    if not shards:
+        return {}
+
+    columns = {}
+    for key in shards[0]:
+        if key.endswith("_offsets"):
+            parts = [shards[0][key]]
+            for shard in shards[1:]:
+                parts.append(shard[key][1:] + parts[-1][-1])
+            columns[key] = np.concatenate(parts)
+        else:
+            columns[key] = np.concatenate([shard[key] for shard in shards])
+    return columns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Calculate ranks and det' distributions for a catalog of graphs"
+    )
+    parser.add_argument("input", help="catalog, one graph per line")
+    parser.add_argument("output_dir", help="directory for NPZ shards")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--symmetry", action="store_true")
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore saved progress"
+    )
+    args = parser.parse_args()
+
+    try:
+        state = run_batch(
+            args.input,
+            args.output_dir,
+            shard_size=args.shard_size,
+            n_workers=args.workers,
+            symmetry=args.symmetry,
+            restart=args.restart,
+            progress=lambda n_graphs, n_lines: print(
+                f"{n_graphs} graphs ({n_lines} lines) done", flush=True
+            ),
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Finished: {state['n_graphs']} graphs in {state['n_shards']} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import json
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# media type of responses encoded with `encode_binary`
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+MAGIC = b"ALPB"
+VERSION = 1
+
+# buffers are aligned, so that typed arrays can be created over them without copies
+ALIGNMENT = 8
+
+# lists of small integers (det', ranks, bordered determinants), stored as int8
+INT8_FIELDS = ("det_list", "rank_list", "bordered_det_list")
+
+# lists of exact values (gaussian sums, $\\chi$, terms), stored as indices
+# into a dictionary of their distinct string forms
+EXACT_FIELDS = ("gauss_sum_list", "total_gauss_sum_list", "chi_list", "term_list")
+
+# lists of vectors of spins (-1 or 1), stored as bits, 1 for spin 1
+SPIN_FIELDS = ("configurations",)
+
+
+def accepts_binary(accept: Optional[str]) -> bool:
+    """
+    Whether a client asked for `BINARY_MEDIA_TYPE` in the `Accept` header
+    """
+    if not accept:
+        return False
+    media_types = [part.split(";")[0].strip() for part in accept.split(",")]
+    return BINARY_MEDIA_TYPE in media_types
+
+
+def _index_dtype(n_values: int) -> np.dtype:
+    for dtype in (np.uint8, np.uint16):
+        if n_values <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.uint32)
+
+
+def _encode_field(
+    name: str, values: List[Any]
+) -> Optional[Tuple[Dict[str, Any], bytes]]:
+    """
+    Description and bytes of the buffer of a field, None if the field stays in JSON
+    """
+    if name in INT8_FIELDS:
+        array = np.asarray(values, dtype=np.int8)
+        return {"name": name, "type": "int8", "length": len(array)}, array.tobytes()
+    if name in EXACT_FIELDS:
+        dictionary = {}
+        indices = [
+            dictionary.setdefault(str(value), len(dictionary)) for value in values
+        ]
+        dtype = _index_dtype(len(dictionary))
+        array = np.asarray(indices, dtype=dtype)
+        description = {
+            "name": name,
+            "type": "index",
+            "dtype": dtype.name,
+            "length": len(array),
+            "values": list(dictionary),
+        }
+        return description, array.tobytes()
+    if name in SPIN_FIELDS:
+        n_vertices = len(values[0]) if len(values) > 0 else 0
+        spins = np.asarray(values, dtype=np.int8).reshape(len(values), n_vertices)
+        array = np.packbits(spins == 1, axis=1)
+        description = {
+            "name": name,
+            "type": "spins",
+            "shape": [len(values), n_vertices],
+        }
+        return description, array.tobytes()
+    return None
+
+
+def encode_binary(content: Dict[str, Any]) -> bytes:
+    """
+    Encode a response of a calculation endpoint compactly: the per-vector lists
+    of `content["data"]` (see `INT8_FIELDS`, `EXACT_FIELDS` and `SPIN_FIELDS`)
+    become packed buffers, everything else stays in a JSON header.
+
+    Layout (integers are little-endian):
+    - `MAGIC`, 4 bytes
+    - length of the header, uint32
+    - header, UTF-8 JSON: the response without the encoded lists, `version`
+      and `arrays`: for every list its "name", "type" ("int8", "index"
+      or "spins"), "offset" of its buffer, "length" or "shape", and for "index"
+      the "dtype" of indices and the distinct "values"
+    - zero padding to `ALIGNMENT`, then buffers, each aligned to `ALIGNMENT`;
+      offsets are counted from the first buffer
+
+    Spins are packed row by row, 8 per byte starting from the most significant
+    bit, every row starts at a new byte.
+
+    Args:
+        content (Dict[str, Any]): response with "data", e.g. `{"status": "ok",
+            "data": {...}, "admission": {...}}`
+
+    Returns:
+        bytes: encoded response
+    """
+    data = dict(content.get("data") or {})
+    arrays = []
+    buffers = []
+    offset = 0
+    for name in list(data):
+        encoded = _encode_field(name, data[name])
+        if encoded is None:
+            continue
+        description, buffer = encoded
+        del data[name]
+        description["offset"] = offset
+        arrays.append(description)
+        buffers.append(buffer)
+        offset += len(buffer)
+        padding = -offset % ALIGNMENT
+        buffers.append(b"\0" * padding)
+        offset += padding
+
+    header = {**content, "data": data, "version": VERSION, "arrays": arrays}
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    prefix = MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes
+    prefix += b"\0" * (-len(prefix) % ALIGNMENT)
+    return prefix + b"".join(buffers)
@@ -0,0 +1,396 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import pathlib
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import networkx as nx
+from networkx.algorithms.isomorphism import GraphMatcher
+
+
+BASE_DIR = pathlib.Path(os.path.abspath(__file__)).parent.parent
+
+# SQLite file of the result cache, empty string disables the cache
+DEFAULT_CACHE_PATH = os.environ.get(
+    "ALPHA_CACHE_PATH", str(BASE_DIR / ".cache" / "results.sqlite3")
+)
+
+# least recently used results are evicted when the cache is larger than this
+DEFAULT_CACHE_MAX_SIZE = int(os.environ.get("ALPHA_CACHE_MAX_SIZE", 512 * 2**20))
+
+WL_ITERATIONS = 4
+
+# version of stored results, part of every key: increase it when algorithms
+# or formats of results change, so that older entries are never returned
+CACHE_VERSION = 2
+
+
+def _vertex_node(v: int) -> str:
+    return f"v:{v}"
+
+
+def faces_matrix_structure(
+    faces_matrix: List[List[List[int]]],
+    n_vertices: int,
+    vertex_labels: Optional[Dict[int, str]] = None,
+) -> Optional[nx.Graph]:
+    """
+    Build a graph that describes a Faces Matrix up to relabeling of vertices
+    and faces: a node for every vertex, every face (diagonal element) and every
+    non-empty off-diagonal element, connected to the vertices it contains,
+    and off-diagonal elements are connected to their two faces.
+
+    Two Faces Matrices are equal up to relabeling if and only if these graphs are
+    isomorphic with labels preserved, and then filled Faces Matrices
+    of the corresponding vectors of spins are congruent.
+
+    Args:
+        faces_matrix (List[List[List[int]]]): Faces Matrix
+        n_vertices (int): number of vertices
+        vertex_labels (Optional[Dict[int, str]], optional): additional labels
+            of vertices (e.g. fixed spins) that must be preserved. Defaults to None.
+
+    Returns:
+        Optional[nx.Graph]: graph with node attribute "label", None if the matrix
+            is not symmetric
+    """
+    vertex_labels = vertex_labels or {}
+    n_faces = len(faces_matrix)
+
+    graph = nx.Graph()
+    for v in range(n_vertices):
+        graph.add_node(_vertex_node(v), label="v" + vertex_labels.get(v, ""))
+
+    for i in range(n_faces):
+        graph.add_node(f"f:{i}", label="f")
+        for j in range(i, n_faces):
+            if sorted(faces_matrix[i][j]) != sorted(faces_matrix[j][i]):
+                return None
+            if i == j:
+                node = f"f:{i}"
+            elif len(faces_matrix[i][j]) > 0:
+                node = f"c:{i}:{j}"
+                graph.add_node(node, label="c")
+                graph.add_edge(node, f"f:{i}")
+                graph.add_edge(node, f"f:{j}")
+            else:
+                continue
+            for v in faces_matrix[i][j]:
+                if not graph.has_node(_vertex_node(v)):
+                    return None
+                graph.add_edge(node, _vertex_node(v))
+    return graph
+
+
+def faces_structure(
+    faces: List[List[int]],
+    n_vertices: int,
+    vertex_labels: Optional[Dict[int, str]] = None,
+) -> Optional[nx.Graph]:
+    """
+    Same as `faces_matrix_structure`, but for a list of faces
+    """
+    vertex_labels = vertex_labels or {}
+
+    graph = nx.Graph()
+    for v in range(n_vertices):
+        graph.add_node(_vertex_node(v), label="v" + vertex_labels.get(v, ""))
+    for i, face in enumerate(faces):
+        graph.add_node(f"f:{i}", label="f")
+        for v in face:
+            if not graph.has_node(_vertex_node(v)):
+                return None
+            graph.add_edge(f"f:{i}", _vertex_node(v))
+    return graph
+
+
+def dual_graph_structure(dual_adjacency_matrix: List[List[int]]) -> nx.Graph:
+    """
+    Dual graph as a structure graph (all faces have the same label)
+    """
+    graph = nx.from_numpy_array(np.array(dual_adjacency_matrix))
+    graph = nx.relabel_nodes(graph, {f: f"f:{f}" for f in graph.nodes})
+    nx.set_node_attributes(graph, "f", "label")
+    return graph
+
+
+def sigma_index_permutation(
+    vertices: List[int], stored_vertices: List[int], mapping: Dict[int, int]
+) -> np.ndarray:
+    """
+    Permutation of indices of vectors of spins (see `app.graph.sigma_from_index`)
+    between two labelings of the same graph.
+
+    Args:
+        vertices (List[int]): vertices that are enumerated, in the order of bits
+        stored_vertices (List[int]): the same vertices in the stored labeling
+        mapping (Dict[int, int]): vertex -> vertex in the stored labeling
+
+    Returns:
+        np.ndarray: int64 array `perm`, vector of spins with index `i` corresponds
+            to the vector with index `perm[i]` in the stored labeling
+    """
+    n = len(vertices)
+    position = {v: q for q, v in enumerate(stored_vertices)}
+    indices = np.arange(2**n, dtype=np.int64)
+    perm = np.zeros(2**n, dtype=np.int64)
+    for p, v in enumerate(vertices):
+        q = position[mapping[v]]
+        perm |= ((indices >> (n - 1 - p)) & 1) << (n - 1 - q)
+    return perm
+
+
+def face_vector_index_permutation(
+    n_faces: int, face_mapping: Dict[int, int]
+) -> np.ndarray:
+    """
+    Permutation of indices of vectors $x \\in \\mathbb{F}_3^{n\\_faces}$
+    (see `app.graph.all_face_vectors`) between two labelings of faces
+
+    Args:
+        n_faces (int): number of faces
+        face_mapping (Dict[int, int]): face -> face in the stored labeling
+
+    Returns:
+        np.ndarray: int64 array `perm`, vector with index `i` corresponds
+            to the vector with index `perm[i]` in the stored labeling
+    """
+    indices = np.arange(3**n_faces, dtype=np.int64)
+    perm = np.zeros(3**n_faces, dtype=np.int64)
+    for f in range(n_faces):
+        digits = (indices // 3 ** (n_faces - 1 - f)) % 3
+        perm += digits * 3 ** (n_faces - 1 - face_mapping[f])
+    return perm
+
+
+def permute_lists(
+    result: Dict[str, Any], fields: Iterable[str], perm: np.ndarray
+) -> Dict[str, Any]:
+    """
+    Reorder per-sigma lists of a result, see `sigma_index_permutation`
+    """
+    result = dict(result)
+    for field in fields:
+        values = result[field]
+        result[field] = [values[j] for j in perm.tolist()]
+    return result
+
+
+class ResultCache:
+    """
+    Persistent cache of calculation results in a SQLite file.
+
+    Entries are keyed by the structure graph (see `faces_matrix_structure`): a lookup
+    first selects entries with the same Weisfeiler-Lehman hash of the structure
+    and then looks for an isomorphism with one of them, so graphs with relabeled
+    vertices and faces hit the same entry. The isomorphism is returned with the
+    result to remap per-sigma outputs.
+
+    The total size of stored results is limited by `max_size` bytes, least recently
+    used entries are evicted first. Entries of other versions of results
+    (see `CACHE_VERSION`) are removed when the cache is opened.
+    """
+
+    def __init__(self, path: str, max_size: int = DEFAULT_CACHE_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bucket TEXT NOT NULL,
+                    structure TEXT NOT NULL,
+                    result BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_bucket ON entries (bucket)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)"
+            )
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+            if version != CACHE_VERSION:
+                connection.execute("DELETE FROM entries")
+                connection.execute(f"PRAGMA user_version = {int(CACHE_VERSION)}")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def bucket(method: str, params: Dict[str, Any], structure: nx.Graph) -> str:
+        wl_hash = nx.weisfeiler_lehman_graph_hash(
+            structure, node_attr="label", iterations=WL_ITERATIONS
+        )
+        key = json.dumps(
+            [CACHE_VERSION, method, params, wl_hash, structure.number_of_nodes()],
+            sort_keys=True,
+        )
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(
+        self, method: str, params: Dict[str, Any], structure: nx.Graph
+    ) -> Optional[Tuple[Any, Dict[int, int], Dict[int, int]]]:
+        """
+        Find a result for a structure isomorphic to `structure`
+
+        Returns:
+            Optional[Tuple[Any, Dict[int, int], Dict[int, int]]]: the result,
+                the mapping of vertices and the mapping of faces to vertices
+                and faces of the stored structure, None on a miss
+        """
+        bucket = self.bucket(method, params, structure)
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id, structure, result FROM entries WHERE bucket = ?",
+                (bucket,),
+            ).fetchall()
+            for entry_id, stored, result in rows:
+                mappings = _find_isomorphism(structure, _load_structure(stored))
+                if mappings is None:
+                    continue
+                connection.execute(
+                    "UPDATE entries SET last_used = ? WHERE id = ?",
+                    (time.time(), entry_id),
+                )
+                return (json.loads(zlib.decompress(result)), *mappings)
+        return None
+
+    def put(
+        self, method: str, params: Dict[str, Any], structure: nx.Graph, result: Any
+    ) -> None:
+        bucket = self.bucket(method, params, structure)
+        blob = zlib.compress(json.dumps(result).encode())
+        if len(blob) > self.max_size:
+            return
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO entries (bucket, structure, result, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (bucket, _dump_structure(structure), blob, len(blob), time.time()),
+            )
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = 0
+        evicted = []
+        for entry_id, size in connection.execute(
+            "SELECT id, size FROM entries ORDER BY last_used DESC"
+        ):
+            total += size
+            if total > self.max_size:
+                evicted.append((entry_id,))
+        connection.executemany("DELETE FROM entries WHERE id = ?", evicted)
+
+
+def _dump_structure(structure: nx.Graph) -> str:
+    return json.dumps(
+        {
+            "labels": dict(structure.nodes(data="label")),
+            "edges": list(structure.edges),
+        }
+    )
+
+
+def _load_structure(data: str) -> nx.Graph:
+    data = json.loads(data)
+    graph = nx.Graph()
+    for node, label in data["labels"].items():
+        graph.add_node(node, label=label)
+    graph.add_edges_from(data["edges"])
+    return graph
+
+
+def _find_isomorphism(
+    structure: nx.Graph, stored: nx.Graph
+) -> Optional[Tuple[Dict[int, int], Dict[int, int]]]:
+    matcher = GraphMatcher(
+        structure, stored, node_match=lambda a, b: a["label"] == b["label"]
+    )
+    if not matcher.is_isomorphic():
+        return None
+    vertex_mapping, face_mapping = {}, {}
+    for node, image in matcher.mapping.items():
+        kind, _, index = node.partition(":")
+        if kind == "v":
+            vertex_mapping[int(index)] = int(image.partition(":")[2])
+        elif kind == "f":
+            face_mapping[int(index)] = int(image.partition(":")[2])
+    return vertex_mapping, face_mapping
+
+
+def cached_call(
+    cache: Optional[ResultCache],
+    method: str,
+    params: Dict[str, Any],
+    structure: Optional[nx.Graph],
+    compute: Callable[[], Any],
+    remap: Optional[Callable[[Any, Dict[int, int], Dict[int, int]], Any]] = None,
+) -> Any:
+    """
+    Return the cached result of `compute()` for an isomorphic structure, or calculate
+    and store it. Errors of the cache are treated as misses.
+
+    Args:
+        cache (Optional[ResultCache]): cache, None to always calculate
+        method (str): name of the calculation
+        params (Dict[str, Any]): JSON-serializable parameters that change the result
+            and are not a part of the structure
+        structure (Optional[nx.Graph]): structure graph, None to always calculate
+        compute (Callable[[], Any]): calculates a JSON-serializable result
+        remap (Optional[Callable[[Any, Dict[int, int], Dict[int, int]], Any]],
+            optional): converts a stored result to the labeling of the request,
+            given the mappings of vertices and faces to stored ones.
+            Defaults to None, i.e. the result does not depend on the labeling.
+
+    Returns:
+        Any: the result
+    """
+    if cache is None or structure is None:
+        return compute()
+
+    try:
+        hit = cache.get(method, params, structure)
+    except sqlite3.Error:
+        hit = None
+    if hit is not None:
+        result, vertex_mapping, face_mapping = hit
+        if remap is None:
+            return result
+        return remap(result, vertex_mapping, face_mapping)
+
+    result = compute()
+    try:
+        cache.put(method, params, structure, result)
+    except sqlite3.Error:
+        pass
+    return result
+
+
+def open_default_cache() -> Optional[ResultCache]:
+    """
+    Cache at `DEFAULT_CACHE_PATH`, None if it is disabled or cannot be opened
+    """
+    if not DEFAULT_CACHE_PATH:
+        return None
+    try:
+        return ResultCache(DEFAULT_CACHE_PATH)
+    except (OSError, sqlite3.Error):
+        return None
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import pathlib
+from typing import Any, Optional, Tuple
+
+
+BASE_DIR = pathlib.Path(os.path.abspath(__file__)).parent.parent
+
+# directory for checkpoints of jobs, see `checkpoint_for`
+DEFAULT_CHECKPOINT_DIR = os.environ.get(
+    "ALPHA_CHECKPOINT_DIR", str(BASE_DIR / ".cache" / "checkpoints")
+)
+
+# seconds between saves of a checkpoint
+DEFAULT_CHECKPOINT_INTERVAL = float(os.environ.get("ALPHA_CHECKPOINT_INTERVAL", 60))
+
+
+def checkpoint_key(name: str, *values: Any) -> str:
+    """
+    Identifier of a calculation: hash of its name and JSON-serializable arguments
+    """
+    data = json.dumps([name, values], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class Checkpoint:
+    """
+    State of an enumeration of vectors of spins saved in a local file: all vectors
+    with indices below `position` are processed and merged into `state`.
+
+    The file is written atomically, so a crash at any moment leaves either
+    the previous or the new checkpoint. It is tied to one calculation by a key
+    (see `checkpoint_key`), resuming another calculation from it is an error.
+    """
+
+    def __init__(self, path: str, interval: float = DEFAULT_CHECKPOINT_INTERVAL):
+        """
+        Args:
+            path (str): file of the checkpoint
+            interval (float, optional): minimal number of seconds between saves,
+                0 saves after every shard. Defaults to `DEFAULT_CHECKPOINT_INTERVAL`.
+        """
+        self.path = path
+        self.interval = interval
+        self._last_save = time.monotonic()
+
+    def load(self, key: str) -> Optional[Tuple[int, Any]]:
+        """
+        Raises:
+            ValueError: if the checkpoint was saved for another calculation
+
+        Returns:
+            Optional[Tuple[int, Any]]: position and state, None if there is
+                no checkpoint
+        """
+        try:
+            with open(self.path, "rb") as file:
+                data = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        if data["key"] != key:
+            raise ValueError(
+                f"Checkpoint {self.path} was saved for another calculation"
+            )
+        return data["position"], data["state"]
+
+    def is_due(self) -> bool:
+        return time.monotonic() - self._last_save >= self.interval
+
+    def save(self, key: str, position: int, state: Any) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump({"key": key, "position": position, "state": state}, file)
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def checkpoint_for(
+    name: str, interval: float = DEFAULT_CHECKPOINT_INTERVAL
+) -> Checkpoint:
+    """
+    Checkpoint in `DEFAULT_CHECKPOINT_DIR`, so the same request submitted again
+    (e.g. after a restart of the server) resumes from it
+
+    Args:
+        name (str): file name, e.g. `checkpoint_key` of the request
+        interval (float, optional): see `Checkpoint`
+    """
+    return Checkpoint(os.path.join(DEFAULT_CHECKPOINT_DIR, f"{name}.pickle"), interval)
@@ -0,0 +1,279 @@
+from typing import List, Tuple
+
+import numpy as np
+import networkx as nx
+import sympy
+from sympy.ntheory.modular import crt
+from networkx.algorithms.approximation import treewidth_min_fill_in
+
+
+# tables of bags with more vertices take too much memory ($4^{12}$ int64 is 128 MB)
+MAX_BAG_SIZE = 11
+
+# moduli for the tables, products of two residues fit into int64
+MODULUS_BITS = 31
+
+
+def dual_graph(faces_matrix: List[List[List[int]]]) -> nx.Graph:
+    """
+    Dual graph of a planar cubic graph: faces are adjacent if they share an edge
+
+    Args:
+        faces_matrix (List[List[List[int]]]): Faces Matrix
+
+    Returns:
+        nx.Graph: graph on faces from 0 to n+1
+    """
+    n_faces = len(faces_matrix)
+    graph = nx.Graph()
+    graph.add_nodes_from(range(n_faces))
+    for i in range(n_faces):
+        for j in range(i + 1, n_faces):
+            if len(faces_matrix[i][j]) > 0:
+                graph.add_edge(i, j)
+    return graph
+
+
+def _coloring_order(graph: nx.Graph, vertices: List[int]) -> List[int]:
+    """
+    Order of vertices of a connected component for backtracking: the next vertex
+    has the most already ordered neighbors (ties by degree), so conflicts
+    are found as early as possible
+    """
+    start = max(vertices, key=lambda v: (graph.degree(v), -v))
+    order = [start]
+    n_ordered_neighbors = {v: 0 for v in vertices}
+    del n_ordered_neighbors[start]
+    for u in graph.neighbors(start):
+        n_ordered_neighbors[u] += 1
+    while n_ordered_neighbors:
+        v = max(
+            n_ordered_neighbors,
+            key=lambda v: (n_ordered_neighbors[v], graph.degree(v), -v),
+        )
+        order.append(v)
+        del n_ordered_neighbors[v]
+        for u in graph.neighbors(v):
+            if u in n_ordered_neighbors:
+                n_ordered_neighbors[u] += 1
+    return order
+
+
+def _count_component_colorings(
+    graph: nx.Graph, vertices: List[int], n_colors: int
+) -> int:
+    """
+    Count colorings of a connected component by backtracking, see
+    `count_colorings_backtracking`
+    """
+    order = _coloring_order(graph, vertices)
+    position = {v: i for i, v in enumerate(order)}
+    n = len(order)
+
+    # bitmask of positions of earlier neighbors of every position
+    earlier_neighbors = [
+        sum(1 << position[u] for u in graph.neighbors(v) if position[u] < i)
+        for i, v in enumerate(order)
+    ]
+    # bitmask of positions of every color
+    color_positions = [0] * n_colors
+
+    def count(i: int, n_used: int) -> int:
+        neighbors = earlier_neighbors[i]
+        if i == n - 1:
+            n_free = sum(1 for c in range(n_used) if not color_positions[c] & neighbors)
+            return n_free + (n_colors - n_used)
+
+        total = 0
+        bit = 1 << i
+        for c in range(n_used):
+            if not color_positions[c] & neighbors:
+                color_positions[c] |= bit
+                total += count(i + 1, n_used)
+                color_positions[c] ^= bit
+        if n_used < n_colors:
+            # all unused colors are interchangeable
+            color_positions[n_used] |= bit
+            total += (n_colors - n_used) * count(i + 1, n_used + 1)
+            color_positions[n_used] ^= bit
+        return total
+
+    return count(0, 0)
+
+
+def count_colorings_backtracking(graph: nx.Graph, n_colors: int = 4) -> int:
+    """
+    Count proper colorings of a graph with `n_colors` colors by backtracking
+    with integer arithmetic only.
+
+    Connected components are counted separately. Within a component vertices
+    are colored in the order of `_coloring_order`, neighbors are checked with
+    bitmasks of positions of every color. Colors are symmetric, so a vertex is
+    given either one of the colors already used or the first unused one, and
+    the latter branch is multiplied by the number of unused colors; the last
+    vertex is not branched, its available colors are counted.
+
+    Args:
+        graph (nx.Graph): graph, a loop makes the number of colorings 0
+        n_colors (int, optional): number of colors. Defaults to 4.
+
+    Returns:
+        int: number of colorings
+    """
+    if nx.number_of_selfloops(graph) > 0:
+        return 0
+    result = 1
+    for component in nx.connected_components(graph):
+        result *= _count_component_colorings(graph, sorted(component), n_colors)
+        if result == 0:
+            break
+    return result
+
+
+def _moduli(n_bits: int) -> List[int]:
+    """
+    Distinct primes below $2^{31}$ with the product larger than $2^{n\\_bits}$
+    """
+    moduli = []
+    prime = 2**MODULUS_BITS
+    while sum(p.bit_length() - 1 for p in moduli) <= n_bits:
+        prime = sympy.prevprime(prime)
+        moduli.append(prime)
+    return moduli
+
+
+def _elimination_plan(
+    graph: nx.Graph, decomposition: nx.Graph
+) -> Tuple[List[Tuple], List[int]]:
+    """
+    Order bags of a tree decomposition from leaves to roots and describe how every
+    bag is processed: which edges of the graph are checked in it (every edge in
+    exactly one bag) and which axes of the tables of its children are summed out.
+
+    Vertices of a bag are sorted, they are the axes of its table, so the axes
+    of a child message (the vertices it shares with the parent) keep their order
+    in the table of the parent.
+
+    Returns:
+        Tuple[List[Tuple], List[int]]: for every bag in post-order its sorted
+            vertices, pairs of axes of its edges and its children
+            (index, summed axes, which axes of the parent table the message has);
+            and indices of roots
+    """
+    plan = []
+    roots = []
+    bag_index = {}
+    remaining_edges = {frozenset(edge) for edge in graph.edges}
+
+    for component in nx.connected_components(decomposition):
+        root = min(component, key=sorted)
+        parents = nx.dfs_predecessors(decomposition, root)
+        for bag in nx.dfs_postorder_nodes(decomposition, root):
+            variables = sorted(bag)
+            axis = {v: i for i, v in enumerate(variables)}
+
+            edge_axes = []
+            for u in variables:
+                for v in graph.neighbors(u):
+                    edge = frozenset((u, v))
+                    if v in axis and edge in remaining_edges:
+                        remaining_edges.remove(edge)
+                        edge_axes.append(tuple(sorted((axis[u], axis[v]))))
+
+            children = []
+            for child in decomposition.neighbors(bag):
+                if parents.get(child) != bag:
+                    continue
+                child_variables = plan[bag_index[child]][0]
+                summed_axes = tuple(
+                    i for i, v in enumerate(child_variables) if v not in axis
+                )
+                is_shared = tuple(v in child_variables for v in variables)
+                children.append((bag_index[child], summed_axes, is_shared))
+
+            bag_index[bag] = len(plan)
+            plan.append((variables, edge_axes, children))
+        roots.append(bag_index[root])
+
+    return plan, roots
+
+
+def _count_colorings_mod(
+    plan: List[Tuple], roots: List[int], n_colors: int, modulus: int
+) -> int:
+    not_equal = 1 - np.eye(n_colors, dtype=np.int64)
+
+    tables = {}
+    for index, (variables, edge_axes, children) in enumerate(plan):
+        k = len(variables)
+        table = np.ones((n_colors,) * k, dtype=np.int64)
+        for i, j in edge_axes:
+            shape = [1] * k
+            shape[i] = shape[j] = n_colors
+            table = table * not_equal.reshape(shape)
+        for child, summed_axes, is_shared in children:
+            message = tables.pop(child).sum(axis=summed_axes) % modulus
+            shape = [n_colors if shared else 1 for shared in is_shared]
+            table = table * message.reshape(shape) % modulus
+        tables[index] = table
+
+    count = 1
+    for root in roots:
+        count = count * int(tables[root].sum() % modulus) % modulus
+    return count
+
+
+def count_proper_colorings(graph: nx.Graph, n_colors: int = 4) -> Tuple[int, int]:
+    """
+    Count proper colorings of a graph with `n_colors` colors by dynamic programming
+    over a tree decomposition.
+
+    Every bag has a table with the number of colorings of the vertices forgotten
+    below it for every coloring of the bag, so the cost is
+    $O(|bags| \\cdot n\\_colors^{w + 1})$, where $w$ is the width of the decomposition
+    (for planar graphs $w = O(\\sqrt{n})$). Numbers of colorings grow
+    exponentially, so tables are calculated modulo several primes and the result
+    is restored by the Chinese remainder theorem.
+
+    Args:
+        graph (nx.Graph): simple graph
+        n_colors (int, optional): number of colors. Defaults to 4.
+
+    Raises:
+        ValueError: if the width of the decomposition is too large,
+            see `MAX_BAG_SIZE`
+
+    Returns:
+        Tuple[int, int]: number of colorings and width of the decomposition
+    """
+    width, decomposition = treewidth_min_fill_in(graph)
+    if width + 1 > MAX_BAG_SIZE:
+        raise ValueError(f"Treewidth {width} is too large")
+
+    plan, roots = _elimination_plan(graph, decomposition)
+
+    # every vertex has at most `n_colors` colors
+    n_bits = graph.number_of_nodes() * (n_colors - 1).bit_length()
+    moduli = _moduli(n_bits)
+    residues = [_count_colorings_mod(plan, roots, n_colors, p) for p in moduli]
+    count, _ = crt(moduli, residues)
+    return int(count), width
+
+
+def calc_tait_0_tree_decomposition(
+    faces_matrix: List[List[List[int]]],
+) -> Tuple[int, int]:
+    """
+    Calculate the number of Tait colorings as the number of 4-colorings of the dual
+    graph divided by 12 (like `app.graph.calc_tait_0_dual_chromatic`), but with
+    dynamic programming over a tree decomposition of the dual graph, see
+    `count_proper_colorings`
+
+    Args:
+        faces_matrix (List[List[List[int]]]): Faces Matrix
+
+    Returns:
+        Tuple[int, int]: number of Tait colorings and treewidth of the decomposition
+    """
+    n_colorings, width = count_proper_colorings(dual_graph(faces_matrix), 4)
+    return n_colorings // 12, width
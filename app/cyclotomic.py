@@ -0,0 +1,165 @@
+from functools import lru_cache
+from typing import Tuple
+
+import sympy
+
+
+class Cyclotomic3:
+    """
+    Exact element of $\\mathbb{Z}[\\omega, 1/\\sqrt 3]$, where
+    $\\omega = \\exp(2\\pi i/3)$, stored as $(a + b\\omega) / 3^k$
+    with integer $a$, $b$ and $k \\ge 0$.
+
+    Since $i\\sqrt 3 = 1 + 2\\omega$, this ring contains all values of
+    $\\chi$ and all normalized gaussian sums ${\\det}' M [i/\\sqrt 3]^{\\rank M}$,
+    so Tait sums are calculated with integer arithmetic only. The representation
+    is kept reduced (3 does not divide both $a$ and $b$ when $k > 0$),
+    so equal numbers have equal fields.
+    """
+
+    __slots__ = ("a", "b", "k")
+
+    def __init__(self, a: int = 0, b: int = 0, k: int = 0):
+        a, b, k = int(a), int(b), int(k)
+        while k > 0 and a % 3 == 0 and b % 3 == 0:
+            a, b, k = a // 3, b // 3, k - 1
+        if a == 0 and b == 0:
+            k = 0
+        self.a = a
+        self.b = b
+        self.k = k
+
+    @staticmethod
+    def _coerce(other) -> "Cyclotomic3":
+        if isinstance(other, Cyclotomic3):
+            return other
+        if isinstance(other, int) or hasattr(other, "__index__"):
+            return Cyclotomic3(int(other))
+        return NotImplemented
+
+    def __add__(self, other) -> "Cyclotomic3":
+        other = self._coerce(other)
+        if other is NotImplemented:
+            return other
+        k = max(self.k, other.k)
+        s1, s2 = 3 ** (k - self.k), 3 ** (k - other.k)
+        return Cyclotomic3(self.a * s1 + other.a * s2, self.b * s1 + other.b * s2, k)
+
+    __radd__ = __add__
+
+    def __neg__(self) -> "Cyclotomic3":
+        return Cyclotomic3(-self.a, -self.b, self.k)
+
+    def __sub__(self, other) -> "Cyclotomic3":
+        other = self._coerce(other)
+        if other is NotImplemented:
+            return other
+        return self + (-other)
+
+    def __rsub__(self, other) -> "Cyclotomic3":
+        return (-self) + other
+
+    def __mul__(self, other) -> "Cyclotomic3":
+        other = self._coerce(other)
+        if other is NotImplemented:
+            return other
+        # (a + b w)(c + d w) = ac + (ad + bc) w + bd w^2, and w^2 = -1 - w
+        a, b, c, d = self.a, self.b, other.a, other.b
+        return Cyclotomic3(a * c - b * d, a * d + b * c - b * d, self.k + other.k)
+
+    __rmul__ = __mul__
+
+    def __pow__(self, power: int) -> "Cyclotomic3":
+        if power < 0:
+            raise ValueError("Only non-negative powers are supported")
+        result = Cyclotomic3(1)
+        base = self
+        while power:
+            if power & 1:
+                result = result * base
+            base = base * base
+            power >>= 1
+        return result
+
+    def __eq__(self, other) -> bool:
+        other = self._coerce(other)
+        if other is NotImplemented:
+            return other
+        return (self.a, self.b, self.k) == (other.a, other.b, other.k)
+
+    def __hash__(self) -> int:
+        if self.is_integer():
+            return hash(self.a)
+        return hash((self.a, self.b, self.k))
+
+    def __bool__(self) -> bool:
+        return self.a != 0 or self.b != 0
+
+    def is_integer(self) -> bool:
+        return self.b == 0 and self.k == 0
+
+    def __int__(self) -> int:
+        if not self.is_integer():
+            raise ValueError(f"{self} is not an integer")
+        return self.a
+
+    def as_tuple(self) -> Tuple[int, int, int]:
+        return self.a, self.b, self.k
+
+    def to_sympy(self) -> sympy.Basic:
+        return _to_sympy(self.a, self.b, self.k)
+
+    def __str__(self) -> str:
+        return _to_str(self.a, self.b, self.k)
+
+    def __repr__(self) -> str:
+        return f"Cyclotomic3({self.a}, {self.b}, {self.k})"
+
+
+@lru_cache(maxsize=None)
+def _to_sympy(a: int, b: int, k: int) -> sympy.Basic:
+    # w = -1/2 + i sqrt(3)/2
+    denominator = 2 * 3**k
+    return sympy.Rational(2 * a - b, denominator) + sympy.Rational(
+        b, denominator
+    ) * sympy.sqrt(3) * sympy.I
+
+
+@lru_cache(maxsize=None)
+def _to_str(a: int, b: int, k: int) -> str:
+    return str(_to_sympy(a, b, k))
+
+
+OMEGA = Cyclotomic3(0, 1)
+I_DIV_SQRT_3 = Cyclotomic3(1, 2, 1)  # i / sqrt(3) = (1 + 2w) / 3
+
+_CHI_VALUES = (Cyclotomic3(1), OMEGA, Cyclotomic3(-1, -1))
+
+
+def chi(x: int) -> Cyclotomic3:
+    """
+    Calculate $\\chi(x) = \\omega^x$ exactly
+
+    Args:
+        x (int): any integer, taken mod 3
+
+    Returns:
+        Cyclotomic3: 1, $\\omega$ or $\\omega^2$
+    """
+    return _CHI_VALUES[int(x) % 3]
+
+
+@lru_cache(maxsize=None)
+def gauss_sum_value(det_minor: int, rank: int) -> Cyclotomic3:
+    """
+    Calculate normalized gaussian sum ${\\det}' M \\left[ i/\\sqrt 3 \\right]^{\\rank M}$
+    exactly
+
+    Args:
+        det_minor (int): largest non-zero principal minor, -1 or 1
+        rank (int): rank of the matrix
+
+    Returns:
+        Cyclotomic3: gaussian sum value
+    """
+    return det_minor * I_DIV_SQRT_3**rank
@@ -0,0 +1,569 @@
+import os
+import sys
+import json
+import time
+import uuid
+import pickle
+import argparse
+import threading
+import traceback
+import multiprocessing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.parallel import split_shards
+
+
+# number of shards of a distributed enumeration
+DEFAULT_N_SHARDS = 1024
+
+# a claimed shard is returned to the queue if its worker did not renew the lease
+# for this number of seconds
+DEFAULT_LEASE_TIMEOUT = float(os.environ.get("ALPHA_LEASE_TIMEOUT", 300))
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+# the coordinator raises when a shard function has raised an exception on workers
+# this number of times for the same shard
+DEFAULT_MAX_FAILURES = int(os.environ.get("ALPHA_MAX_SHARD_FAILURES", 3))
+
+TASK_FILE = "task.pickle"
+DONE_FILE = "done"
+QUEUE_DIR = "queue"
+CLAIMED_DIR = "claimed"
+RESULTS_DIR = "results"
+FAILURE_SUFFIX = ".failed"
+
+
+def _shard_name(start: int, stop: int) -> str:
+    # names sort in the order of shards
+    return f"{start:020d}_{stop:020d}"
+
+
+def _result_name(shard_name: str, key: str) -> str:
+    # a late result of a previous task in the same directory is never mistaken
+    # for a result of the current one
+    return f"{shard_name}.{key}"
+
+
+def _failure_name(shard_name: str, key: str) -> str:
+    return _result_name(shard_name, key) + FAILURE_SUFFIX
+
+
+def _read_failure(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomically(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _list_files(directory: str) -> List[str]:
+    return sorted(name for name in os.listdir(directory) if not name.endswith(".tmp"))
+
+
+class Coordinator:
+    """
+    Distributes shards of an enumeration of vectors of spins to workers
+    (see `run_worker`) through a shared directory:
+
+    - `task.pickle`: the shard function, its arguments and the key of the calculation
+    - `queue/<shard>`: descriptors of shards waiting for a worker
+    - `claimed/<shard>.<worker>`: shards being calculated, a worker claims a shard
+      by an atomic rename from `queue` and renews the lease by touching the file
+    - `results/<shard>.<key>`: pickled results of shards
+    - `results/<shard>.<key>.failed`: JSON with the traceback of the last exception
+      of the shard function and the number of failed attempts
+    - `done`: written when the calculation is finished
+
+    Claims whose lease expired (the worker died or lost the directory) are
+    returned to the queue. A shard may then be calculated twice, but its results
+    are identical, so this only wastes time. A shard whose function raised an
+    exception is queued again until it has failed `max_failures` times, then the
+    coordinator raises. Results stay in the directory until the end, so
+    a restarted coordinator continues the same calculation (and retries failed
+    shards from scratch).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        n_shards: int = DEFAULT_N_SHARDS,
+        lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        max_failures: int = DEFAULT_MAX_FAILURES,
+    ):
+        """
+        Args:
+            directory (str): shared directory, available to all workers
+            n_shards (int, optional): minimal number of shards, see
+                `app.parallel.split_shards`. Defaults to `DEFAULT_N_SHARDS`.
+            lease_timeout (float, optional): seconds. Defaults to
+                `DEFAULT_LEASE_TIMEOUT`.
+            poll_interval (float, optional): seconds between checks of the
+                directory. Defaults to `DEFAULT_POLL_INTERVAL`.
+            max_failures (int, optional): failed attempts of a shard before
+                the calculation is aborted. Defaults to `DEFAULT_MAX_FAILURES`.
+        """
+        self.directory = directory
+        self.n_shards = n_shards
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+        self.max_failures = max_failures
+
+    def _path(self, *names: str) -> str:
+        return os.path.join(self.directory, *names)
+
+    def _prepare_task(
+        self,
+        shard_function: Callable[..., Any],
+        args: Tuple,
+        n_vertices: int,
+        key: str,
+    ) -> List[Tuple[int, int]]:
+        """
+        Write the task and queue its shards without results
+
+        Raises:
+            ValueError: if the directory has an unfinished task of another
+                calculation
+        """
+        for name in (QUEUE_DIR, CLAIMED_DIR, RESULTS_DIR):
+            os.makedirs(self._path(name), exist_ok=True)
+
+        task_path = self._path(TASK_FILE)
+        if os.path.exists(task_path):
+            with open(task_path, "rb") as file:
+                task = pickle.load(file)
+            if task["key"] != key:
+                if not os.path.exists(self._path(DONE_FILE)):
+                    raise ValueError(
+                        f"Directory {self.directory} has an unfinished task"
+                        " of another calculation"
+                    )
+                self._clear()
+                task = None
+        else:
+            task = None
+        if os.path.exists(self._path(DONE_FILE)):
+            os.remove(self._path(DONE_FILE))
+
+        if task is None:
+            shards = split_shards(n_vertices, self.n_shards)
+            task = {
+                "key": key,
+                "shard_function": shard_function,
+                "args": args,
+                "n_vertices": n_vertices,
+                "shards": shards,
+            }
+            _write_atomically(task_path, pickle.dumps(task))
+        shards = task["shards"]
+
+        done = set(_list_files(self._path(RESULTS_DIR)))
+        claimed = {name.split(".")[0] for name in _list_files(self._path(CLAIMED_DIR))}
+        for start, stop in shards:
+            name = _shard_name(start, stop)
+            if _failure_name(name, key) in done:
+                os.remove(self._path(RESULTS_DIR, _failure_name(name, key)))
+            if _result_name(name, key) in done or name in claimed:
+                continue
+            descriptor = {"key": key, "start": start, "stop": stop}
+            _write_atomically(
+                self._path(QUEUE_DIR, name), json.dumps(descriptor).encode()
+            )
+        return shards
+
+    def _requeue_expired(self) -> None:
+        now = time.time()
+        for name in _list_files(self._path(CLAIMED_DIR)):
+            path = self._path(CLAIMED_DIR, name)
+            try:
+                if now - os.path.getmtime(path) < self.lease_timeout:
+                    continue
+                os.rename(path, self._path(QUEUE_DIR, name.split(".")[0]))
+            except FileNotFoundError:
+                # the worker has just finished the shard
+                pass
+
+    def _check_failures(self, shards: List[Tuple[int, int]], key: str) -> None:
+        """
+        Queue again failed shards that are neither queued nor claimed
+
+        Raises:
+            RuntimeError: if a shard has failed `max_failures` times
+        """
+        results = set(_list_files(self._path(RESULTS_DIR)))
+        queued = set(_list_files(self._path(QUEUE_DIR)))
+        claimed = {name.split(".")[0] for name in _list_files(self._path(CLAIMED_DIR))}
+        for start, stop in shards:
+            name = _shard_name(start, stop)
+            failure_name = _failure_name(name, key)
+            if (
+                failure_name not in results
+                or _result_name(name, key) in results
+                or name in queued
+                or name in claimed
+            ):
+                continue
+            failure = _read_failure(self._path(RESULTS_DIR, failure_name))
+            if failure is None:
+                continue
+            if failure["attempts"] >= self.max_failures:
+                raise RuntimeError(
+                    f"Shard {start}..{stop} failed {failure['attempts']} times,"
+                    f" last on worker {failure['worker']}:\n{failure['traceback']}"
+                )
+            descriptor = {"key": key, "start": start, "stop": stop}
+            _write_atomically(
+                self._path(QUEUE_DIR, name), json.dumps(descriptor).encode()
+            )
+
+    def _clear(self) -> None:
+        for name in (QUEUE_DIR, CLAIMED_DIR, RESULTS_DIR):
+            for file_name in os.listdir(self._path(name)):
+                try:
+                    os.remove(self._path(name, file_name))
+                except FileNotFoundError:
+                    pass
+        os.remove(self._path(TASK_FILE))
+
+    def fold(
+        self,
+        shard_function: Callable[..., Any],
+        n_vertices: int,
+        merge: Callable[[Any, Any], Any],
+        initial: Any,
+        args: Tuple = (),
+        progress: Callable[[int, int], None] | None = None,
+        key: str = "",
+    ) -> Any:
+        """
+        Calculate all shards on workers and merge their results in the order
+        of shards, like `app.parallel.fold_shards`. Blocks until all shards
+        are finished.
+
+        Args:
+            shard_function (Callable[..., Any]): top-level function, importable
+                by workers
+            n_vertices (int): number of spins
+            merge (Callable[[Any, Any], Any]): see `app.parallel.fold_shards`
+            initial (Any): see `app.parallel.fold_shards`
+            args (Tuple, optional): picklable arguments of `shard_function`
+            progress (Callable[[int, int], None] | None, optional): called with
+                the number of vectors of spins in finished shards and the total
+                number. Defaults to None.
+            key (str, optional): identifier of the calculation, see
+                `app.checkpoint.checkpoint_key`. Defaults to "".
+
+        Raises:
+            ValueError: if the directory has an unfinished task of another
+                calculation
+            RuntimeError: if a shard has failed `max_failures` times, the task
+                stays in the directory with the failure records
+
+        Returns:
+            Any: merged state
+        """
+        n_sigma = 2**n_vertices
+        shards = self._prepare_task(shard_function, args, n_vertices, key)
+        sizes = {
+            _result_name(_shard_name(start, stop), key): stop - start
+            for start, stop in shards
+        }
+
+        n_reported = -1
+        while True:
+            done = [
+                name for name in _list_files(self._path(RESULTS_DIR)) if name in sizes
+            ]
+            n_processed = sum(sizes[name] for name in done)
+            if progress is not None and n_processed != n_reported:
+                progress(n_processed, n_sigma)
+                n_reported = n_processed
+            if len(done) == len(shards):
+                break
+            self._requeue_expired()
+            self._check_failures(shards, key)
+            time.sleep(self.poll_interval)
+
+        state = initial
+        for start, stop in shards:
+            name = _result_name(_shard_name(start, stop), key)
+            with open(self._path(RESULTS_DIR, name), "rb") as file:
+                state = merge(state, pickle.load(file))
+
+        self._clear()
+        _write_atomically(self._path(DONE_FILE), key.encode())
+        return state
+
+
+def _claim_shard(directory: str, worker_id: str) -> Optional[Tuple[str, str]]:
+    """
+    Move the first queued shard to `claimed`
+
+    Returns:
+        Optional[Tuple[str, str]]: name of the shard and path of the claim,
+            None if the queue is empty
+    """
+    queue_dir = os.path.join(directory, QUEUE_DIR)
+    try:
+        names = _list_files(queue_dir)
+    except FileNotFoundError:
+        return None
+    for name in names:
+        claim_path = os.path.join(directory, CLAIMED_DIR, f"{name}.{worker_id}")
+        try:
+            os.rename(os.path.join(queue_dir, name), claim_path)
+        except FileNotFoundError:
+            # claimed by another worker
+            continue
+        try:
+            os.utime(claim_path)
+        except FileNotFoundError:
+            continue
+        return name, claim_path
+    return None
+
+
+def _renew_lease(claim_path: str, interval: float, stop_event: threading.Event) -> None:
+    while not stop_event.wait(interval):
+        try:
+            os.utime(claim_path)
+        except FileNotFoundError:
+            return
+
+
+def run_worker(
+    directory: str,
+    worker_id: Optional[str] = None,
+    lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    exit_when_done: bool = False,
+) -> int:
+    """
+    Calculate shards queued by a `Coordinator` in a shared directory: claim
+    a shard, calculate it while renewing the lease, write its result, repeat.
+    If the shard function raises an exception, its traceback is written to
+    the failure record of the shard instead and the worker continues.
+
+    Args:
+        directory (str): shared directory of the coordinator
+        worker_id (Optional[str], optional): name of the worker in claims.
+            Defaults to None, i.e. host name, process id and a random suffix.
+        lease_timeout (float, optional): the lease is renewed 3 times within this
+            time, must not exceed the timeout of the coordinator.
+            Defaults to `DEFAULT_LEASE_TIMEOUT`.
+        poll_interval (float, optional): seconds between checks of an empty queue.
+            Defaults to `DEFAULT_POLL_INTERVAL`.
+        exit_when_done (bool, optional): return when the queue is empty and
+            the calculation the worker took part in is finished, otherwise wait
+            for the next task forever. Defaults to False.
+
+    Returns:
+        int: number of calculated shards
+    """
+    if worker_id is None:
+        worker_id = f"{os.uname().nodename}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    worker_id = worker_id.replace(".", "-")
+
+    task: Optional[Dict[str, Any]] = None
+    n_calculated = 0
+    while True:
+        claimed = _claim_shard(directory, worker_id)
+        if claimed is None:
+            if exit_when_done and task is not None:
+                try:
+                    with open(os.path.join(directory, DONE_FILE)) as file:
+                        if file.read() == task["key"]:
+                            return n_calculated
+                except FileNotFoundError:
+                    pass
+            time.sleep(poll_interval)
+            continue
+        name, claim_path = claimed
+
+        try:
+            with open(claim_path) as file:
+                descriptor = json.load(file)
+        except FileNotFoundError:
+            # the lease has already expired
+            continue
+        if task is None or task["key"] != descriptor["key"]:
+            with open(os.path.join(directory, TASK_FILE), "rb") as file:
+                task = pickle.load(file)
+
+        stop_event = threading.Event()
+        heartbeat = threading.Thread(
+            target=_renew_lease,
+            args=(claim_path, lease_timeout / 3, stop_event),
+            daemon=True,
+        )
+        heartbeat.start()
+        try:
+            result = task["shard_function"](
+                *task["args"], descriptor["start"], descriptor["stop"]
+            )
+        except Exception:
+            failure_path = os.path.join(
+                directory, RESULTS_DIR, _failure_name(name, descriptor["key"])
+            )
+            failure = _read_failure(failure_path)
+            _write_atomically(
+                failure_path,
+                json.dumps(
+                    {
+                        "worker": worker_id,
+                        "attempts": 1 if failure is None else failure["attempts"] + 1,
+                        "traceback": traceback.format_exc(),
+                    }
+                ).encode(),
+            )
+        else:
+            _write_atomically(
+                os.path.join(
+                    directory, RESULTS_DIR, _result_name(name, descriptor["key"])
+                ),
+                pickle.dumps(result),
+            )
+            n_calculated += 1
+        finally:
+            stop_event.set()
+            heartbeat.join()
+
+        try:
+            os.remove(claim_path)
+        except FileNotFoundError:
+            pass
+
+
+def _run_coordinator(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.graph import calc_tait_0_aggregated, calc_heawood, calc_heawood_fixed
+
+    with open(args.input) as file:
+        params = json.load(file)
+    coordinator = Coordinator(
+        args.directory,
+        args.shards,
+        args.lease_timeout,
+        args.poll_interval,
+        args.max_failures,
+    )
+
+    def progress(processed: int, total: int) -> None:
+        print(f"{processed}/{total}", file=sys.stderr, flush=True)
+
+    if args.command == "tait_0":
+        (
+            n_tait_0,
+            n_even_ranks,
+            n_odd_ranks,
+            n_zero_ranks,
+            det_minors,
+            ranks,
+            _,
+            nums,
+            _,
+        ) = calc_tait_0_aggregated(
+            params["faces_matrix"],
+            symmetry=params.get("symmetry", False),
+            progress=progress,
+            coordinator=coordinator,
+        )
+        return {
+            "tait_0": n_tait_0,
+            "n_even_ranks": n_even_ranks,
+            "n_odd_ranks": n_odd_ranks,
+            "n_zero_ranks": n_zero_ranks,
+            "det_list": det_minors,
+            "rank_list": ranks,
+            "num_list": nums,
+        }
+
+    count_only = params.get("count_only", False)
+    fixed_spins = params.get("fixed_spins")
+    if fixed_spins is None:
+        result = calc_heawood(
+            params["faces"],
+            progress=progress,
+            count_only=count_only,
+            coordinator=coordinator,
+        )
+    else:
+        result = calc_heawood_fixed(
+            params["faces"],
+            {int(v): spin for v, spin in fixed_spins.items()},
+            progress=progress,
+            count_only=count_only,
+            coordinator=coordinator,
+        )
+    return {"count": result} if count_only else {"configurations": result}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Distributed enumeration of vectors of spins"
+        " through a shared directory"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    worker_parser = subparsers.add_parser("worker", help="calculate queued shards")
+    worker_parser.add_argument("directory")
+    worker_parser.add_argument(
+        "--processes", type=int, default=1, help="worker processes on this host"
+    )
+    worker_parser.add_argument("--exit-when-done", action="store_true")
+
+    for command in ("tait_0", "heawood"):
+        coordinator_parser = subparsers.add_parser(
+            command, help=f"coordinate {command}, input is JSON with request params"
+        )
+        coordinator_parser.add_argument("directory")
+        coordinator_parser.add_argument("input")
+        coordinator_parser.add_argument("--shards", type=int, default=DEFAULT_N_SHARDS)
+        coordinator_parser.add_argument(
+            "--max-failures", type=int, default=DEFAULT_MAX_FAILURES
+        )
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument(
+            "--lease-timeout", type=float, default=DEFAULT_LEASE_TIMEOUT
+        )
+        subparser.add_argument(
+            "--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL
+        )
+
+    args = parser.parse_args()
+    if args.command != "worker":
+        json.dump(_run_coordinator(args), sys.stdout)
+        print()
+        return
+
+    worker_args = (
+        args.directory,
+        None,
+        args.lease_timeout,
+        args.poll_interval,
+        args.exit_when_done,
+    )
+    if args.processes == 1:
+        run_worker(*worker_args)
+        return
+    processes = [
+        multiprocessing.Process(target=run_worker, args=worker_args)
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+import os
+import sys
+import json
+import time
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+import networkx as nx
+from networkx.algorithms.approximation import treewidth_min_fill_in
+
+from app.coloring import MODULUS_BITS, dual_graph, count_proper_colorings
+from app.graph import (
+    graph_from_edges,
+    planar_embedding,
+    find_faces_in_embedding,
+    build_faces_matrix,
+    calc_tait_0_in_detail,
+    calc_tait_0_aggregated,
+    calc_tait_0_fixed_in_detail,
+    calc_s_values,
+    calc_heawood,
+    estimate_heawood_search,
+)
+from app.batch import parse_graph_record
+from app.parallel import default_n_workers, resolve_n_workers
+from app.symmetry import face_structure_automorphisms
+
+
+# requests estimated to take longer are run as background jobs
+MAX_SYNC_SECONDS = float(os.environ.get("ALPHA_MAX_SYNC_SECONDS", 30))
+
+# requests estimated to take longer are rejected
+MAX_JOB_SECONDS = float(os.environ.get("ALPHA_MAX_JOB_SECONDS", 7 * 24 * 3600))
+
+# requests with larger estimated responses are downgraded (calc_tait_0 in detail
+# is calculated aggregated) or rejected
+MAX_RESPONSE_BYTES = int(os.environ.get("ALPHA_MAX_RESPONSE_BYTES", 64 * 2**20))
+
+# size of responses that do not grow with the number of vectors of spins
+SUMMARY_RESPONSE_BYTES = 2**11
+
+# estimates of larger graphs overflow float and are clamped to this,
+# which is over any budget and still a valid JSON number
+MAX_ESTIMATE = sys.float_info.max
+
+# size of the result of one graph of a batch, and its part per vertex
+BATCH_RECORD_BYTES = 2**9
+BATCH_VERTEX_BYTES = 12
+
+# random probes of the Heawood search tree per estimate, see
+# `app.graph.estimate_heawood_search`
+HEAWOOD_PROBES = 64
+
+RUN = "run"
+DOWNGRADE = "downgrade"
+JOB = "job"
+REJECT = "reject"
+
+_calibration: Optional[Dict[str, Dict[str, float]]] = None
+_calibration_lock = threading.Lock()
+
+
+def _prism_faces(k: int) -> List[List[int]]:
+    return find_faces_in_embedding(
+        planar_embedding(graph_from_edges(nx.circular_ladder_graph(k).edges))
+    )
+
+
+def _measure(function, n_units: float, n_repeats: int = 3) -> float:
+    """
+    Seconds per unit of work, the best of several runs
+    """
+    best = float("inf")
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best / n_units
+
+
+def _scaled(n_units: int | float, per_unit: float) -> float:
+    """
+    `n_units * per_unit` for counts like $2^{2n}$ that may not fit into float,
+    clamped to `MAX_ESTIMATE`
+    """
+    try:
+        return min(float(n_units) * per_unit, MAX_ESTIMATE)
+    except OverflowError:
+        return MAX_ESTIMATE
+
+
+def _response_bytes(data: Any) -> int:
+    return len(json.dumps(data, separators=(",", ":")))
+
+
+def calibrate() -> Dict[str, Dict[str, float]]:
+    """
+    Micro-benchmark of the kernel of every method on small prisms in this process:
+    seconds per unit of work and bytes of the response per item, see
+    `estimate_tait_0` and others for the units. Takes less than a second.
+
+    Returns:
+        Dict[str, Dict[str, float]]: "seconds" and "bytes" for every kernel
+    """
+    calibration = {}
+
+    faces_matrix = build_faces_matrix(_prism_faces(5))
+    n_faces = len(faces_matrix)
+    n_sigma = 2 ** (2 * (n_faces - 2))
+
+    _, gauss_list, det_list, rank_list = calc_tait_0_in_detail(
+        faces_matrix, n_workers=1
+    )
+    calibration["detail"] = {
+        "seconds": _measure(
+            lambda: calc_tait_0_in_detail(faces_matrix, n_workers=1),
+            n_sigma * n_faces**3,
+            1,
+        ),
+        "bytes": _response_bytes([[str(g) for g in gauss_list], det_list, rank_list])
+        / n_sigma,
+    }
+
+    # the system of the cube with a fixed spin is consistent for all vectors of spins
+    cube_faces_matrix = build_faces_matrix(_prism_faces(4))
+    n_cube_faces = len(cube_faces_matrix)
+    n_free_sigma = 2 ** (2 * (n_cube_faces - 2) - 1)
+    _, (_, *lists) = calc_tait_0_fixed_in_detail(
+        cube_faces_matrix, {0: 1}, n_workers=1
+    )
+    calibration["fixed"] = {
+        "seconds": _measure(
+            lambda: calc_tait_0_fixed_in_detail(cube_faces_matrix, {0: 1}, n_workers=1),
+            n_free_sigma * n_cube_faces**3,
+            1,
+        ),
+        "bytes": _response_bytes([[str(v) for v in values] for values in lists])
+        / n_free_sigma,
+    }
+
+    # batched elimination needs larger blocks to reach its speed
+    large_faces_matrix = build_faces_matrix(_prism_faces(6))
+    n_large_faces = len(large_faces_matrix)
+    calibration["aggregated"] = {
+        "seconds": _measure(
+            lambda: calc_tait_0_aggregated(large_faces_matrix, n_workers=1),
+            2 ** (2 * (n_large_faces - 2)) * n_large_faces**3,
+        ),
+        "bytes": 0,
+    }
+    # orbits are calculated for all vectors of spins, which is the main cost
+    calibration["symmetry"] = {
+        "seconds": _measure(
+            lambda: calc_tait_0_aggregated(
+                large_faces_matrix, n_workers=1, symmetry=True
+            ),
+            2 ** (2 * (n_large_faces - 2)),
+        ),
+        "bytes": 0,
+    }
+
+    n_items = 3**n_cube_faces * 2**3
+    s_values = calc_s_values(cube_faces_matrix, [0, 1], [2, 3, 4], n_workers=1)
+    calibration["s_values"] = {
+        "seconds": _measure(
+            lambda: calc_s_values(cube_faces_matrix, [0, 1], [2, 3, 4], n_workers=1),
+            n_items,
+        ),
+        "bytes": _response_bytes([str(v) for v in s_values]) / n_items,
+    }
+
+    heawood_faces = _prism_faces(9)
+    n_heawood_vertices = 2 * (len(heawood_faces) - 2)
+    configurations = calc_heawood([list(f) for f in heawood_faces], n_workers=1)
+    n_heawood_nodes, _ = estimate_heawood_search(heawood_faces, n_probes=1024)
+    calibration["heawood"] = {
+        "seconds": _measure(
+            lambda: calc_heawood(
+                [list(f) for f in heawood_faces], n_workers=1, count_only=True
+            ),
+            n_heawood_nodes,
+        ),
+        "bytes": _response_bytes(configurations)
+        / (len(configurations) * n_heawood_vertices),
+    }
+
+    graph = dual_graph(build_faces_matrix(_prism_faces(12)))
+    width, _ = treewidth_min_fill_in(graph)
+    calibration["tree_decomposition"] = {
+        "seconds": _measure(
+            lambda: count_proper_colorings(graph, 4),
+            _tree_decomposition_units(graph.number_of_nodes(), width),
+        ),
+        "bytes": 0,
+    }
+
+    return calibration
+
+
+def get_calibration() -> Dict[str, Dict[str, float]]:
+    """
+    Results of `calibrate`, calculated once per process
+    """
+    global _calibration
+    with _calibration_lock:
+        if _calibration is None:
+            _calibration = calibrate()
+        return _calibration
+
+
+def _tree_decomposition_units(n_faces: int, width: int) -> float:
+    # a table of $4^{w + 1}$ entries for every bag, for every modulus
+    n_moduli = n_faces * 2 // (MODULUS_BITS - 1) + 1
+    return n_faces * 4 ** (width + 1) * n_moduli
+
+
+def _estimate(
+    n_iterations: int, seconds: float, response_bytes: float, n_workers: int = 1
+) -> Dict[str, Any]:
+    return {
+        "n_iterations": n_iterations,
+        "seconds": seconds / n_workers,
+        "response_bytes": int(min(response_bytes, MAX_ESTIMATE))
+        + SUMMARY_RESPONSE_BYTES,
+    }
+
+
+def estimate_tait_0(
+    faces_matrix: List[List[List[int]]],
+    detail: bool = True,
+    symmetry: bool = False,
+    method: str = "alpha",
+) -> Dict[str, Any]:
+    """
+    Estimate the cost of `/api/v1/calc_tait_0`: $2^{2n}$ vectors of spins
+    (fewer with `symmetry`), each costs $O(F^3)$ for $F = n + 2$ faces;
+    for "tree_decomposition" the number of entries of tables of all bags.
+
+    Returns:
+        Dict[str, Any]: "n_iterations", "seconds" and "response_bytes"
+    """
+    calibration = get_calibration()
+    n_faces = len(faces_matrix)
+    n_vertices = 2 * (n_faces - 2)
+
+    if method == "tree_decomposition":
+        width, _ = treewidth_min_fill_in(dual_graph(faces_matrix))
+        n_units = _tree_decomposition_units(n_faces, width)
+        seconds = _scaled(n_units, calibration["tree_decomposition"]["seconds"])
+        return _estimate(int(n_units), seconds, 0)
+
+    n_sigma = 2**n_vertices
+    n_workers = resolve_n_workers(None, n_sigma)
+    if detail:
+        kernel = calibration["detail"]
+        return _estimate(
+            n_sigma,
+            _scaled(n_sigma * n_faces**3, kernel["seconds"]),
+            _scaled(n_sigma, kernel["bytes"]),
+            n_workers,
+        )
+
+    if symmetry:
+        # one vector of spins per orbit of automorphisms and the flip of all spins
+        n_iterations = n_sigma // (2 * len(face_structure_automorphisms(faces_matrix)))
+        seconds = _scaled(n_sigma, calibration["symmetry"]["seconds"])
+    else:
+        n_iterations = n_sigma
+        seconds = _scaled(n_sigma * n_faces**3, calibration["aggregated"]["seconds"])
+    return _estimate(n_iterations, seconds, 0, n_workers)
+
+
+def estimate_tait_0_fixed(
+    faces_matrix: List[List[List[int]]], fixed_spins: Dict[int, int]
+) -> Dict[str, Any]:
+    """
+    Estimate the cost of `/api/v1/calc_tait_0_fixed`: $2^{2n - |fixed|}$ vectors
+    of free spins, each costs $O(F^3)$
+    """
+    kernel = get_calibration()["fixed"]
+    n_faces = len(faces_matrix)
+    n_sigma = 2 ** (2 * (n_faces - 2) - len(fixed_spins))
+    return _estimate(
+        n_sigma,
+        _scaled(n_sigma * n_faces**3, kernel["seconds"]),
+        _scaled(n_sigma, kernel["bytes"]),
+        resolve_n_workers(None, n_sigma),
+    )
+
+
+def estimate_tait_0_fixed_sweep(
+    faces_matrix: List[List[List[int]]], vertices: List[int]
+) -> Dict[str, Any]:
+    """
+    Estimate the cost of `/api/v1/calc_tait_0_fixed_sweep`: $2^{2n - k}$ vectors
+    of free spins, each costs $O(F^3)$ for the elimination and $O(F^2)$ for every
+    one of $2^k$ assignments
+    """
+    kernel = get_calibration()["fixed"]
+    n_faces = len(faces_matrix)
+    n_assignments = 2 ** len(vertices)
+    n_sigma = 2 ** (2 * (n_faces - 2) - len(vertices))
+    return _estimate(
+        n_sigma,
+        _scaled(n_sigma * (n_faces**3 + n_assignments * n_faces**2), kernel["seconds"]),
+        n_assignments * (len(vertices) + 1) * 8,
+        resolve_n_workers(None, n_sigma),
+    )
+
+
+def estimate_s_values(
+    faces_matrix: List[List[List[int]]],
+    vertices_in: List[int],
+    vertices_mid: List[int],
+) -> Dict[str, Any]:
+    """
+    Estimate the cost of `/api/v1/calc_s_values`: a value for every vector
+    $x \\in \\mathbb{F}_3^F$ and every vector of spins of `vertices_mid`
+    (the sum over spins of `vertices_in` is factorized)
+    """
+    kernel = get_calibration()["s_values"]
+    n_sigma = 2 ** len(vertices_mid)
+    n_items = 3 ** len(faces_matrix) * n_sigma
+    return _estimate(
+        n_items,
+        _scaled(n_items, kernel["seconds"]),
+        _scaled(n_items, kernel["bytes"]),
+        resolve_n_workers(None, n_sigma),
+    )
+
+
+def estimate_heawood(
+    faces: List[List[int]],
+    fixed_spins: Optional[Dict[int, int]] = None,
+    count_only: bool = False,
+) -> Dict[str, Any]:
+    """
+    Estimate the cost of `/api/v1/calc_heawood`. Backtracking visits far fewer
+    than $2^{2n - |fixed|}$ vectors of free spins, so the number of nodes
+    of the search tree and of configurations are estimated by random probes
+    of the tree (see `app.graph.estimate_heawood_search`), and the time
+    per node is calibrated on a prism.
+    """
+    kernel = get_calibration()["heawood"]
+    n_vertices = 2 * (len(faces) - 2)
+    n_sigma = 2 ** (n_vertices - len(fixed_spins or {}))
+    n_nodes, n_configurations = estimate_heawood_search(
+        faces, fixed_spins, HEAWOOD_PROBES
+    )
+    response_bytes = 0
+    if not count_only:
+        response_bytes = _scaled(n_configurations * n_vertices, kernel["bytes"])
+    return _estimate(
+        int(min(n_nodes, MAX_ESTIMATE)),
+        _scaled(n_nodes, kernel["seconds"]),
+        response_bytes,
+        resolve_n_workers(None, n_sigma),
+    )
+
+
+def estimate_batch(
+    graphs: List[Union[str, Dict[str, Any], List[List[int]]]], symmetry: bool = False
+) -> Dict[str, Any]:
+    """
+    Estimate the cost of `/api/v1/batch`: every graph of the catalog costs
+    as `calc_tait_0` aggregated in one process (the number of faces of a cubic
+    planar graph with $2n$ vertices is $n + 2$, the automorphisms are not
+    searched for `symmetry`, so it is an upper bound), and graphs are spread
+    over the workers, so the time is at least that of the largest graph.
+    Records that cannot be parsed cost nothing, they are reported as errors.
+    """
+    calibration = get_calibration()
+    n_iterations, seconds, largest_seconds, response_bytes = 0, 0.0, 0.0, 0
+    for record in graphs:
+        try:
+            _, graph = parse_graph_record(record)
+        except (ValueError, KeyError, TypeError, nx.NetworkXException):
+            continue
+        n_vertices = graph.number_of_nodes()
+        n_faces = n_vertices // 2 + 2
+        n_sigma = 2**n_vertices
+        if symmetry:
+            graph_seconds = _scaled(n_sigma, calibration["symmetry"]["seconds"])
+        else:
+            graph_seconds = _scaled(
+                n_sigma * n_faces**3, calibration["aggregated"]["seconds"]
+            )
+        n_iterations += n_sigma
+        seconds = min(seconds + graph_seconds, MAX_ESTIMATE)
+        largest_seconds = max(largest_seconds, graph_seconds)
+        response_bytes += BATCH_RECORD_BYTES + BATCH_VERTEX_BYTES * n_vertices
+    n_workers = max(1, min(default_n_workers(), len(graphs)))
+    return _estimate(
+        n_iterations, max(seconds / n_workers, largest_seconds), response_bytes
+    )
+
+
+def admission_action(estimate: Dict[str, Any], can_downgrade: bool = False) -> str:
+    """
+    What to do with a request of a compute endpoint, given its estimate
+
+    Args:
+        estimate (Dict[str, Any]): see `estimate_tait_0`
+        can_downgrade (bool, optional): the request has a cheaper form with
+            a smaller response. Defaults to False.
+
+    Returns:
+        str: `RUN` it, `DOWNGRADE` it if the response is too large (and estimate
+            again), run it as a background `JOB` if it is too slow, or `REJECT` it
+    """
+    if estimate["response_bytes"] > MAX_RESPONSE_BYTES:
+        return DOWNGRADE if can_downgrade else REJECT
+    if estimate["seconds"] > MAX_JOB_SECONDS:
+        return REJECT
+    if estimate["seconds"] > MAX_SYNC_SECONDS:
+        return JOB
+    return RUN
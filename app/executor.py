@@ -0,0 +1,384 @@
+import os
+import time
+import signal
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+
+from app.parallel import WorkerBudget, limit_n_workers
+
+
+# requests of one route calculated at the same time
+DEFAULT_ROUTE_CONCURRENCY = int(os.environ.get("ALPHA_ROUTE_CONCURRENCY", 2))
+
+# requests of one route waiting for a slot, more are rejected
+DEFAULT_MAX_QUEUED = int(os.environ.get("ALPHA_MAX_QUEUED", 16))
+
+# seconds, the process of a request is killed after that
+DEFAULT_REQUEST_TIMEOUT = float(os.environ.get("ALPHA_REQUEST_TIMEOUT", 300))
+
+# seconds between calls of the progress callback while no progress is reported
+PROGRESS_INTERVAL = 1.0
+
+# seconds a process that was asked to stop has to finish (e.g. to save
+# a checkpoint) before it is killed
+STOP_GRACE_SECONDS = 30.0
+
+
+class Overloaded(Exception):
+    """
+    Too many requests of a route are waiting
+    """
+
+
+class RequestTimeout(Exception):
+    """
+    The calculation of a request took longer than its timeout and was killed
+    """
+
+
+class StopRequested(Exception):
+    """
+    Raised from the progress callback in the process of a calculation
+    after the progress callback of the caller has raised an exception
+    """
+
+
+def _run_child(
+    sender,
+    function: Callable[..., Any],
+    args: Tuple,
+    stop_event=None,
+    n_workers: Optional[int] = None,
+) -> None:
+    # own process group, so that killing it also kills the process pool
+    # of `app.parallel` the calculation may start
+    os.setsid()
+    if n_workers is not None:
+        limit_n_workers(n_workers)
+
+    def report_progress(processed: int, total: int) -> None:
+        sender.send(("progress", (processed, total)))
+        if stop_event.is_set():
+            raise StopRequested()
+
+    try:
+        if stop_event is None:
+            message = ("ok", function(*args))
+        else:
+            message = ("ok", function(*args, report_progress))
+    except BaseException as e:
+        message = ("error", e)
+    sender.send(message)
+    sender.close()
+
+
+def _stream_child(
+    sender,
+    function: Callable[..., Iterator[Any]],
+    args: Tuple,
+    n_workers: Optional[int] = None,
+) -> None:
+    # same as `_run_child`, but sends every record of the generator
+    os.setsid()
+    if n_workers is not None:
+        limit_n_workers(n_workers)
+    try:
+        for record in function(*args):
+            sender.send(("record", record))
+        message = ("done", None)
+    except BaseException as e:
+        message = ("error", e)
+    sender.send(message)
+    sender.close()
+
+
+def _kill(process) -> None:
+    # also kills workers of a process pool left after the process exited
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.join()
+
+
+def _receive(receiver, process, timeout: Optional[float]) -> Optional[Tuple]:
+    # next message of the process, None if there is none in `timeout` seconds
+    if not receiver.poll(timeout):
+        return None
+    try:
+        return receiver.recv()
+    except EOFError:
+        raise RuntimeError(
+            f"Calculation process exited with code {process.exitcode}"
+        ) from None
+
+
+def call_in_process(
+    function: Callable[..., Any],
+    args: Tuple = (),
+    timeout: Optional[float] = None,
+    progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    budget: Optional[WorkerBudget] = None,
+) -> Any:
+    """
+    Call `function(*args)` in a forked process and wait for the result.
+
+    The process is forked rather than taken from a pool: it inherits the loaded
+    modules, so starting it is cheap, and it can be killed on timeout without
+    affecting other requests.
+
+    With `progress`, the function is called as `function(*args, report)`:
+    calls of `report(processed, total)` in the process are passed to `progress`
+    here, and `progress` is also called with the last values every
+    `PROGRESS_INTERVAL` seconds (with `0, None` before the first report).
+    If `progress` raises an exception, the next `report` in the process raises
+    `StopRequested`, so the calculation can stop cleanly (e.g. save
+    a checkpoint); the process is killed if it does not finish in
+    `STOP_GRACE_SECONDS`, and the exception of `progress` is raised.
+
+    With `budget`, the process pool of `app.parallel` in the process gets
+    the workers taken from the budget, they are returned when the process exits.
+
+    Args:
+        function (Callable[..., Any]): function, the result must be picklable
+        args (Tuple, optional): arguments. Defaults to ().
+        timeout (Optional[float], optional): seconds. Defaults to None, i.e. no limit.
+        progress (Optional[Callable[[int, Optional[int]], None]], optional):
+            progress callback. Defaults to None.
+        budget (Optional[WorkerBudget], optional): workers shared with other
+            calculations. Defaults to None, i.e. the default number of workers.
+
+    Raises:
+        RequestTimeout: if the timeout is exceeded, the process is killed
+        Exception: exception raised by `function` or `progress`
+
+    Returns:
+        Any: result of `function`
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    stop_event = None if progress is None else context.Event()
+    n_workers = None if budget is None else budget.acquire()
+    process = context.Process(
+        target=_run_child, args=(sender, function, args, stop_event, n_workers)
+    )
+    try:
+        process.start()
+    except BaseException:
+        if budget is not None:
+            budget.release(n_workers)
+        raise
+    sender.close()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    last_progress = (0, None)
+    stop_error, stop_deadline = None, None
+    try:
+        while True:
+            waits = [] if deadline is None else [deadline - time.monotonic()]
+            if stop_deadline is not None:
+                waits.append(stop_deadline - time.monotonic())
+            elif progress is not None:
+                waits.append(PROGRESS_INTERVAL)
+            message = _receive(receiver, process, max(0, min(waits)) if waits else None)
+            if message is not None:
+                status, value = message
+                if status != "progress":
+                    break
+                last_progress = value
+            elif stop_deadline is not None and time.monotonic() >= stop_deadline:
+                break
+            elif deadline is not None and time.monotonic() >= deadline:
+                raise RequestTimeout(f"Calculation took longer than {timeout} seconds")
+            if progress is not None and stop_error is None:
+                try:
+                    progress(*last_progress)
+                except Exception as e:
+                    stop_error = e
+                    stop_deadline = time.monotonic() + STOP_GRACE_SECONDS
+                    stop_event.set()
+    finally:
+        receiver.close()
+        _kill(process)
+        if budget is not None:
+            budget.release(n_workers)
+    if stop_error is not None:
+        raise stop_error
+    if status == "error":
+        raise value
+    return value
+
+
+class ComputeExecutor:
+    """
+    Runs CPU-bound calculations of routes off the event loop: every request
+    is calculated in its own process (see `call_in_process`), at most
+    `concurrency` requests of a route at a time, and at most `max_queued`
+    requests of a route wait for a slot. Streamed responses are produced
+    the same way (see `stream`). Worker processes of `app.parallel`
+    are taken from `budget`, shared with other calculations.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_ROUTE_CONCURRENCY,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+        timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        budget: Optional[WorkerBudget] = None,
+    ):
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.budget = budget
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._n_waiting: Dict[str, int] = {}
+        # threads only wait for the processes
+        self._threads = ThreadPoolExecutor(thread_name_prefix="compute")
+
+    async def run(
+        self,
+        route: str,
+        function: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Calculate `function(*args)` in a separate process
+
+        Args:
+            route (str): name of the route, limits are per route
+            function (Callable[..., Any]): function, the result must be picklable
+            timeout (Optional[float], optional): seconds. Defaults to None,
+                i.e. the timeout of the executor.
+
+        Raises:
+            Overloaded: if too many requests of the route are waiting
+            RequestTimeout: if the timeout is exceeded
+
+        Returns:
+            Any: result of `function`
+        """
+        semaphore = await self._acquire(route)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._threads,
+                call_in_process,
+                function,
+                args,
+                self.timeout if timeout is None else timeout,
+                None,
+                self.budget,
+            )
+        finally:
+            semaphore.release()
+
+    async def stream(
+        self,
+        route: str,
+        function: Callable[..., Iterator[Any]],
+        *args: Any,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Produce the records of the generator `function(*args)` in a separate
+        process and relay them through a pipe while they are calculated.
+        The limits are the same as in `run`: the slot of the route is held
+        and the timeout counts until the whole stream is produced; the process
+        is killed when the stream ends, fails or is closed by the client.
+
+        Args:
+            route (str): name of the route, limits are per route
+            function (Callable[..., Iterator[Any]]): generator function,
+                records must be picklable
+            timeout (Optional[float], optional): seconds. Defaults to None,
+                i.e. the timeout of the executor.
+
+        Raises:
+            Overloaded: if too many requests of the route are waiting, before
+                the stream starts
+
+        Returns:
+            AsyncIterator[Any]: records; iterating raises `RequestTimeout`
+                if the timeout is exceeded, or the exception of `function`
+        """
+        semaphore = await self._acquire(route)
+        timeout = self.timeout if timeout is None else timeout
+        n_workers = None if self.budget is None else self.budget.acquire()
+        try:
+            context = multiprocessing.get_context("fork")
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_stream_child, args=(sender, function, args, n_workers)
+            )
+            process.start()
+            sender.close()
+        except BaseException:
+            if self.budget is not None:
+                self.budget.release(n_workers)
+            semaphore.release()
+            raise
+        return self._relay(semaphore, process, receiver, n_workers, timeout)
+
+    async def _relay(
+        self,
+        semaphore: asyncio.Semaphore,
+        process,
+        receiver,
+        n_workers: Optional[int],
+        timeout: Optional[float],
+    ) -> AsyncIterator[Any]:
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                wait = None if deadline is None else deadline - time.monotonic()
+                message = await loop.run_in_executor(
+                    self._threads,
+                    _receive,
+                    receiver,
+                    process,
+                    None if wait is None else max(0, wait),
+                )
+                if message is None:
+                    raise RequestTimeout(
+                        f"Calculation took longer than {timeout} seconds"
+                    )
+                status, value = message
+                if status == "error":
+                    raise value
+                if status == "done":
+                    return
+                yield value
+        finally:
+            # the process is killed first, so a thread still waiting
+            # for a message wakes up
+            _kill(process)
+            receiver.close()
+            if self.budget is not None:
+                self.budget.release(n_workers)
+            semaphore.release()
+
+    async def _acquire(self, route: str) -> asyncio.Semaphore:
+        """
+        Wait for a slot of the route
+
+        Raises:
+            Overloaded: if too many requests of the route are waiting
+
+        Returns:
+            asyncio.Semaphore: semaphore of the route, release it when done
+        """
+        n_waiting = self._n_waiting.get(route, 0)
+        if n_waiting >= self.max_queued:
+            raise Overloaded(f"Too many requests of {route} are waiting")
+        if route not in self._semaphores:
+            self._semaphores[route] = asyncio.Semaphore(self.concurrency)
+        semaphore = self._semaphores[route]
+
+        self._n_waiting[route] = n_waiting + 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._n_waiting[route] -= 1
+        return semaphore
@@ -0,0 +1,252 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+def to_f3(value: int) -> int:
+    """
+    Map an integer to its representative in $\\mathbb{F}_3$ from {-1, 0, 1}
+
+    Args:
+        value (int): any integer
+
+    Returns:
+        int: -1, 0 or 1
+    """
+    value %= 3
+    return -1 if value == 2 else value
+
+
+def _eliminate_pivot(matrix: np.ndarray, p: int) -> None:
+    """
+    Eliminate row and column `p` of a symmetric matrix over $\\mathbb{F}_3$ by
+    congruence, in place. `matrix[p, p]` must be non-zero.
+
+    Since every non-zero element of $\\mathbb{F}_3$ is its own inverse, the
+    Schur complement is $M - d \\cdot M_{:,p} M_{p,:}$, where $d = M_{pp}$.
+
+    Args:
+        matrix (np.ndarray): symmetric matrix with values 0, 1, 2
+        p (int): pivot index
+    """
+    d = matrix[p, p]
+    column = matrix[:, p].copy()
+    matrix -= d * np.outer(column, column)
+    matrix %= 3
+
+
+def symmetric_elimination_f3(matrix: np.ndarray) -> Tuple[int, int, List[int]]:
+    """
+    Diagonalize a symmetric matrix over $\\mathbb{F}_3$ by congruence
+    in $O(n^3)$ operations.
+
+    Pivots are taken on the diagonal whenever possible. If every remaining
+    diagonal element is zero but some $M_{ij} \\ne 0$, the principal block
+    $\\{i, j\\}$ is non-degenerate ($\\det = -M_{ij}^2 \\ne 0$): row and column
+    $j$ are added to row and column $i$, which makes $M_{ii} = 2 M_{ij} \\ne 0$,
+    and then $i$ and $j$ are eliminated one after another. This operation does not
+    leave the block $\\{i, j\\}$, so the principal minor on the set of pivots
+    is the product of the pivots.
+
+    All largest non-zero principal minors of a symmetric matrix over $\\mathbb{F}_3$
+    have the same value (the discriminant of the non-degenerate part, since the only
+    non-zero square is 1), so the product of pivots is ${\\det}' M$.
+
+    **Warning**: if a matrix has rank 0, ${\\det}' M$ is considered 1.
+
+    Args:
+        matrix (np.ndarray): symmetric integer matrix, values are taken mod 3
+
+    Returns:
+        Tuple[int, int, List[int]]: ${\\det}' M$ (-1 or 1), rank of the matrix and
+            sorted list of indices that form a largest non-zero principal minor
+    """
+    m = np.array(matrix, dtype=np.int64) % 3
+
+    det_minor = 1
+    rows = []
+
+    while True:
+        diagonal = np.nonzero(np.diagonal(m))[0]
+        if len(diagonal) > 0:
+            p = int(diagonal[0])
+            det_minor *= int(m[p, p])
+            rows.append(p)
+            _eliminate_pivot(m, p)
+            continue
+
+        off_diagonal = np.nonzero(m)
+        if len(off_diagonal[0]) == 0:
+            break
+
+        i, j = int(off_diagonal[0][0]), int(off_diagonal[1][0])
+        m[i, :] += m[j, :]
+        m[:, i] += m[:, j]
+        m %= 3
+        for p in (i, j):
+            det_minor *= int(m[p, p])
+            rows.append(p)
+            _eliminate_pivot(m, p)
+
+    return to_f3(det_minor), len(rows), sorted(rows)
+
+
+def batched_symmetric_elimination_f3(
+    matrices: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate rank and ${\\det}'$ of a batch of symmetric matrices over $\\mathbb{F}_3$
+    at once, see `symmetric_elimination_f3`.
+
+    On every step each matrix of the batch is eliminated by one diagonal pivot
+    with array operations over the whole batch; matrices without non-zero diagonal
+    elements first get $M_{ij} \\ne 0$ moved to the diagonal by adding row and column
+    $j$ to row and column $i$. Since ${\\det}'$ is invariant under congruence,
+    it is the product of all pivots. Matrices that became zero are dropped
+    from the batch, so the number of steps is the largest rank in the batch.
+
+    Args:
+        matrices (np.ndarray): integer tensor of shape (K, n, n), values are
+            taken mod 3
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: int8 arrays of shape (K,): ranks and
+            ${\\det}'$ values (-1 or 1, 1 for zero matrices)
+    """
+    work = np.asarray(matrices) % 3
+    work = work.astype(np.int8, copy=False)
+    n_matrices, n, _ = work.shape
+
+    ranks = np.zeros(n_matrices, dtype=np.int8)
+    dets = np.ones(n_matrices, dtype=np.int8)
+    active = np.arange(n_matrices)
+    diagonal_indices = np.arange(n)
+
+    while active.size > 0:
+        nonzero = work.reshape(len(active), -1) != 0
+        is_nonzero = nonzero.any(axis=1)
+        if not is_nonzero.all():
+            work = work[is_nonzero]
+            active = active[is_nonzero]
+            nonzero = nonzero[is_nonzero]
+            if active.size == 0:
+                break
+        batch = np.arange(len(active))
+
+        diagonal = work[:, diagonal_indices, diagonal_indices]
+        no_diagonal = ~diagonal.any(axis=1)
+        if no_diagonal.any():
+            selected = np.nonzero(no_diagonal)[0]
+            flat = np.argmax(nonzero[selected], axis=1)
+            i, j = flat // n, flat % n
+            work[selected, i, :] = (work[selected, i, :] + work[selected, j, :]) % 3
+            work[selected, :, i] = (work[selected, :, i] + work[selected, :, j]) % 3
+            diagonal = work[:, diagonal_indices, diagonal_indices]
+
+        p = np.argmax(diagonal != 0, axis=1)
+        pivots = work[batch, p, p]
+        column = work[batch, :, p]
+        work -= pivots[:, None, None] * column[:, :, None] * column[:, None, :]
+        work %= 3
+
+        ranks[active] += 1
+        dets[active[pivots == 2]] *= -1
+
+    return ranks, dets
+
+
+def batched_bordered_elimination_f3(
+    matrices: np.ndarray, vectors: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Eliminate a batch of symmetric matrices $M$ over $\\mathbb{F}_3$ bordered
+    by vectors $l$,
+    $$
+    \\begin{pmatrix} M & l \\\\ l^T & 0 \\end{pmatrix},
+    $$
+    with pivots taken only from $M$, see `batched_symmetric_elimination_f3`.
+    The border gets the same row and column operations, so a single pass gives
+    rank and ${\\det}'$ of $M$ and, for every vector $l$, whether $M x = l$
+    is consistent (nothing is left of the border outside the pivots,
+    i.e. $\\rank (M|l) = \\rank M$) and the determinant of $M$ restricted
+    to the pivots and bordered by $l$: the corner becomes
+    $-\\sum_p l_p'^2 / d_p$, so this determinant is ${\\det}' M$ times the corner.
+    For a consistent system it does not depend on the choice of the largest
+    nonzero principal minor.
+
+    Each matrix is factorized once for all vectors, which only add
+    $O(n \\cdot m)$ operations per pivot.
+
+    Args:
+        matrices (np.ndarray): integer tensor of shape (K, n, n), values are
+            taken mod 3
+        vectors (np.ndarray): integer array of shape (m, n) of vectors $l$
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: int8 ranks and
+            int8 ${\\det}'$ values (-1 or 1) of shape (K,), bool consistency and
+            int8 bordered determinants (-1, 0 or 1, meaningful if consistent)
+            of shape (K, m)
+    """
+    work = np.asarray(matrices) % 3
+    work = work.astype(np.int8, copy=False)
+    n_matrices, n, _ = work.shape
+    vectors = np.asarray(vectors) % 3
+    n_vectors = len(vectors)
+    border = np.repeat(vectors.T.astype(np.int8)[None], n_matrices, axis=0)
+    corner = np.zeros((n_matrices, n_vectors), dtype=np.int8)
+
+    ranks = np.zeros(n_matrices, dtype=np.int8)
+    dets = np.ones(n_matrices, dtype=np.int8)
+    consistent = np.ones((n_matrices, n_vectors), dtype=bool)
+    corners = np.zeros((n_matrices, n_vectors), dtype=np.int8)
+    active = np.arange(n_matrices)
+    diagonal_indices = np.arange(n)
+
+    while active.size > 0:
+        nonzero = work.reshape(len(active), -1) != 0
+        is_nonzero = nonzero.any(axis=1)
+        if not is_nonzero.all():
+            # only the border is left: it is the result for these matrices
+            done = ~is_nonzero
+            consistent[active[done]] = ~border[done].any(axis=1)
+            corners[active[done]] = corner[done]
+            work = work[is_nonzero]
+            border = border[is_nonzero]
+            corner = corner[is_nonzero]
+            active = active[is_nonzero]
+            nonzero = nonzero[is_nonzero]
+            if active.size == 0:
+                break
+        batch = np.arange(len(active))
+
+        diagonal = work[:, diagonal_indices, diagonal_indices]
+        no_diagonal = ~diagonal.any(axis=1)
+        if no_diagonal.any():
+            selected = np.nonzero(no_diagonal)[0]
+            flat = np.argmax(nonzero[selected], axis=1)
+            i, j = flat // n, flat % n
+            work[selected, i, :] = (work[selected, i, :] + work[selected, j, :]) % 3
+            work[selected, :, i] = (work[selected, :, i] + work[selected, :, j]) % 3
+            border[selected, i, :] = (
+                border[selected, i, :] + border[selected, j, :]
+            ) % 3
+            diagonal = work[:, diagonal_indices, diagonal_indices]
+
+        p = np.argmax(diagonal != 0, axis=1)
+        pivots = work[batch, p, p]
+        column = work[batch, :, p]
+        border_row = border[batch, p, :]
+        work -= pivots[:, None, None] * column[:, :, None] * column[:, None, :]
+        work %= 3
+        border -= pivots[:, None, None] * column[:, :, None] * border_row[:, None, :]
+        border %= 3
+        corner -= pivots[:, None] * border_row * border_row
+        corner %= 3
+
+        ranks[active] += 1
+        dets[active[pivots == 2]] *= -1
+
+    bordered = dets[:, None] * corners % 3
+    bordered[bordered == 2] = -1
+    return ranks, dets, consistent, bordered.astype(np.int8)
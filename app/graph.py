@@ -1,18 +1,39 @@
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Iterator, Callable
 import math
-import itertools
+import random
+import operator
 
 import numpy as np
 import networkx as nx
 import sympy
 
+from app.coloring import count_colorings_backtracking
+from app.cyclotomic import Cyclotomic3, chi, gauss_sum_value
+from app.f3 import (
+    symmetric_elimination_f3,
+    batched_symmetric_elimination_f3,
+    batched_bordered_elimination_f3,
+)
+from app.checkpoint import Checkpoint, checkpoint_key
+from app.distributed import Coordinator
+from app.parallel import map_shards, fold_shards, split_shards
+from app.symmetry import (
+    face_structure_automorphisms,
+    bit_permutation_weights,
+    calc_orbits,
+)
+
 
-i_div_sqrt_3 = sympy.I / sympy.sqrt(3)
-two_pi_i_3 = 2 * sympy.pi * sympy.I / 3
 F3 = sympy.GF(3)
 
+# approximate memory limit for one block of vectors of spins, in bytes
+DEFAULT_MEMORY_BUDGET = 64 * 2**20
+
+# number of vectors of spins per chunk of streamed results
+DEFAULT_CHUNK_SIZE = 2**12
 
-def calc_chi(x: int | Any) -> Any:
+
+def calc_chi(x: int | Any) -> Cyclotomic3:
     """
     Calculate function $\\chi(x) \\equiv \\exp(2\\pi i x/3)$, i.e. a non-trivial
     homomorphism from $\\mathbb{F}_3$ into the unit circle.
@@ -21,9 +42,28 @@ def calc_chi(x: int | Any) -> Any:
         x (int | Any): value from $\\mathbb{F}_3$, i.e. either -1, 0 or 1.
 
     Returns:
-        Any: sympy exponent value
+        Cyclotomic3: exact value $\\omega^x$
+    """
+    return chi(x)
+
+
+def to_tait_0(total: Cyclotomic3) -> int:
     """
-    return sympy.exp(two_pi_i_3 * x)
+    Convert exact sum of $\\alpha$-representation terms into the number
+    of Tait colorings
+
+    Args:
+        total (Cyclotomic3): sum of terms
+
+    Returns:
+        int: number of Tait colorings
+    """
+    if not isinstance(total, Cyclotomic3):
+        total = Cyclotomic3(total)
+    assert (
+        total.is_integer()
+    ), f"Calculated sum of Tait colorings is not integer, got {total}"
+    return int(total)
 
 
 def calc_vertex_positions(adjacency_matrix: List[List[int]]) -> List[List[float]]:
@@ -64,6 +104,9 @@ def find_faces_in_graph(
         List[List[int]]: list of faces, each face is a list of vertices,
             first and last vertex are the same
     """
+    # visited edges are removed from a copy of the matrix
+    adjacency_matrix = [list(row) for row in adjacency_matrix]
+
     faces = []
     n = len(adjacency_matrix)
     for i in range(n):
@@ -83,6 +126,82 @@ def find_faces_in_graph(
     return faces
 
 
+def graph_from_adjacency_matrix(adjacency_matrix: List[List[int]]) -> nx.Graph:
+    """
+    Build a graph from its adjacency matrix
+    """
+    return nx.from_numpy_array(np.array(adjacency_matrix))
+
+
+def graph_from_edges(edges: List[List[int]], n_vertices: int | None = None) -> nx.Graph:
+    """
+    Build a graph from a list of edges
+
+    Args:
+        edges (List[List[int]]): pairs of vertices
+        n_vertices (int | None, optional): number of vertices, vertices without
+            edges are added up to it. Defaults to None.
+
+    Returns:
+        nx.Graph: graph
+    """
+    graph = nx.Graph()
+    if n_vertices is not None:
+        graph.add_nodes_from(range(n_vertices))
+    graph.add_edges_from((u, v) for u, v in edges)
+    return graph
+
+
+def planar_embedding(graph: nx.Graph) -> nx.PlanarEmbedding:
+    """
+    Find a combinatorial planar embedding (rotation system) of a graph
+
+    Raises:
+        ValueError: if graph is not planar
+    """
+    is_planar, embedding = nx.check_planarity(graph)
+    if not is_planar:
+        raise ValueError("Graph is not planar")
+    return embedding
+
+
+def find_faces_in_embedding(embedding: nx.PlanarEmbedding) -> List[List[int]]:
+    """
+    Find all faces of a planar embedding by traversing half-edges in $O(E)$,
+    without coordinates.
+
+    Half-edge $(v, w)$ is followed by $(w, u)$, where $u$ is the next neighbor
+    of $w$ after $v$ counter-clockwise, which is the same rule as in
+    `find_faces_in_graph` (the neighbor with the smallest counter-clockwise angle).
+    Half-edges are started in lexicographic order.
+
+    Args:
+        embedding (nx.PlanarEmbedding): planar embedding, see `planar_embedding`
+
+    Returns:
+        List[List[int]]: list of faces, each face is a list of vertices,
+            first and last vertex are the same
+    """
+    half_edges = [
+        (v, w) for v in sorted(embedding.nodes) for w in sorted(embedding.neighbors(v))
+    ]
+    index = {half_edge: k for k, half_edge in enumerate(half_edges)}
+    next_half_edge = [index[(w, embedding[w][v]["ccw"])] for v, w in half_edges]
+
+    faces = []
+    visited = bytearray(len(half_edges))
+    for k, (v, _) in enumerate(half_edges):
+        if visited[k]:
+            continue
+        face = [v]
+        while not visited[k]:
+            visited[k] = 1
+            face.append(half_edges[k][1])
+            k = next_half_edge[k]
+        faces.append(face)
+    return faces
+
+
 def find_neighbors(
     adjacency_matrix: List[List[int]],
     vertex_positions: List[List[float]],
@@ -196,6 +315,125 @@ def build_faces_matrix(faces: List[List[int]]) -> List[List[List[int]]]:
     return matrix
 
 
+def build_vertex_faces(faces: List[List[int]]) -> np.ndarray:
+    """
+    Build the compact form of the Faces Matrix of a planar cubic graph: three faces
+    of every vertex. Faces Matrix is restored with `vertex_faces_to_faces_matrix`,
+    `fm[i][j]` are the vertices that have both faces `i` and `j`.
+
+    Args:
+        faces (List[List[int]]): a list of faces, each face is a list of
+            vertices in that face
+
+    Raises:
+        ValueError: if some vertex is not in exactly 3 faces
+
+    Returns:
+        np.ndarray: int32 array of shape (2n, 3), sorted faces of every vertex
+    """
+    n_vertices = 2 * (len(faces) - 2)
+    vertex_faces = [[] for _ in range(n_vertices)]
+    for f, face in enumerate(faces):
+        for v in sorted(set(face)):
+            if v >= n_vertices:
+                raise ValueError("Graph is not cubic")
+            vertex_faces[v].append(f)
+    if any(len(v_faces) != 3 for v_faces in vertex_faces):
+        raise ValueError("Every vertex must be in exactly 3 faces")
+    return np.array(vertex_faces, dtype=np.int32).reshape(n_vertices, 3)
+
+
+def validate_vertex_faces(
+    vertex_faces: List[List[int]], n_faces: int | None = None
+) -> int:
+    """
+    Check the compact form of the Faces Matrix (see `build_vertex_faces`): an even
+    positive number $2n$ of vertices, three distinct faces of every vertex,
+    and faces from 0 to `n_faces` - 1
+
+    Args:
+        vertex_faces (List[List[int]]): faces of every vertex
+        n_faces (int | None, optional): number of faces. Defaults to None,
+            i.e. $n + 2$ for $2n$ vertices.
+
+    Raises:
+        ValueError: if the compact form is invalid
+
+    Returns:
+        int: number of faces
+    """
+    n_vertices = len(vertex_faces)
+    if n_vertices == 0 or n_vertices % 2 == 1:
+        raise ValueError(
+            f"Number of vertices must be even and positive, got {n_vertices}"
+        )
+    if n_faces is None:
+        n_faces = n_vertices // 2 + 2
+    for v, v_faces in enumerate(vertex_faces):
+        if len(v_faces) != 3 or len(set(v_faces)) != 3:
+            raise ValueError(f"Vertex {v} must be in exactly 3 distinct faces")
+        for f in v_faces:
+            if not 0 <= f < n_faces:
+                raise ValueError(
+                    f"Face {f} of vertex {v} is out of range [0, {n_faces})"
+                )
+    return n_faces
+
+
+def vertex_faces_to_faces(
+    vertex_faces: List[List[int]], n_faces: int | None = None
+) -> List[List[int]]:
+    """
+    Restore sorted lists of vertices of faces from the compact form,
+    see `build_vertex_faces`
+
+    Args:
+        vertex_faces (List[List[int]]): faces of every vertex
+        n_faces (int | None, optional): number of faces. Defaults to None,
+            i.e. $n + 2$ for $2n$ vertices.
+
+    Raises:
+        ValueError: if the compact form is invalid, see `validate_vertex_faces`
+
+    Returns:
+        List[List[int]]: a list of faces
+    """
+    n_faces = validate_vertex_faces(vertex_faces, n_faces)
+    faces = [[] for _ in range(n_faces)]
+    for v, v_faces in enumerate(vertex_faces):
+        for f in v_faces:
+            faces[f].append(v)
+    return faces
+
+
+def vertex_faces_to_faces_matrix(
+    vertex_faces: List[List[int]], n_faces: int | None = None
+) -> List[List[List[int]]]:
+    """
+    Restore Faces Matrix from the compact form (see `build_vertex_faces`)
+    in $O(V + F^2)$: every vertex is added to the 9 elements of pairs of its faces.
+    The result is the same as `build_faces_matrix` of the faces.
+
+    Args:
+        vertex_faces (List[List[int]]): faces of every vertex
+        n_faces (int | None, optional): number of faces. Defaults to None,
+            i.e. $n + 2$ for $2n$ vertices.
+
+    Raises:
+        ValueError: if the compact form is invalid, see `validate_vertex_faces`
+
+    Returns:
+        List[List[List[int]]]: Faces Matrix
+    """
+    n_faces = validate_vertex_faces(vertex_faces, n_faces)
+    matrix = [[[] for _ in range(n_faces)] for _ in range(n_faces)]
+    for v, v_faces in enumerate(vertex_faces):
+        for f1 in v_faces:
+            for f2 in v_faces:
+                matrix[f1][f2].append(v)
+    return matrix
+
+
 def largest_nonzero_principal_minor(matrix: np.ndarray) -> Tuple[int, int, List[int]]:
     """
     Find largest non-zero principal minor of a matrix $n \times n$
@@ -215,39 +453,21 @@ def largest_nonzero_principal_minor(matrix: np.ndarray) -> Tuple[int, int, List[
 
     **Warning**: if a matrix has rank 0, the value of a minor is considered 1.
 
+    The matrix is diagonalized by congruence with exact arithmetic mod 3
+    (see `symmetric_elimination_f3`), so this takes $O(n^3)$ operations
+    instead of a search over all subsets of indices.
+
     Args:
-        matrix (np.ndarray): matrix of values over $\\mathbb{F}_3$, i.e. -1, 0 or 1
+        matrix (np.ndarray): symmetric matrix of values over $\\mathbb{F}_3$
 
     Returns:
         Tuple[int, int, List[int]]: value of the minor, rank of the submatrix (minor) and
             list of indices that form this submatrix (minor)
     """
-    n = matrix.shape[0]
-
-    # If matrix is non-singular, return whole matrix
-    det_minor = int(round(np.linalg.det(matrix))) % 3
-    if det_minor != 0:
-        if det_minor == 2:
-            det_minor = -1
-        return det_minor, n, list(range(n))
+    return symmetric_elimination_f3(matrix)
 
-    # If matrix is singular, find the set of rows that form non-zero minor
-    for rank in range(n - 1, 0, -1):
-        # Generate combination of indices of a size `rank``
-        for rows in itertools.combinations(range(n), rank):
 
-            minor = matrix[np.ix_(rows, rows)]
-
-            det_minor = int(round(np.linalg.det(minor))) % 3
-            if det_minor != 0:
-                if det_minor == 2:
-                    det_minor = -1
-                return det_minor, rank, list(rows)
-    # If matrix only has values '0', we consider its minor = 1, but rank is still 0
-    return 1, 0, []
-
-
-def gaussian_sum(matrix: np.ndarray) -> Tuple[sympy.Basic, int, int, List[int]]:
+def gaussian_sum(matrix: np.ndarray) -> Tuple[Cyclotomic3, int, int, List[int]]:
     """
     Calc normalized gaussian sum of a matrix $n \\times n$ over the field $\\mathbb{F}_3$:
     $$
@@ -264,16 +484,14 @@ def gaussian_sum(matrix: np.ndarray) -> Tuple[sympy.Basic, int, int, List[int]]:
         matrix (np.ndarray): $n \\times n$ over the field $\\mathbb{F}_3$
 
     Returns:
-        Tuple[sympy.Basic, int, int, List[int]]:
-            1) Gaussian sum value
+        Tuple[Cyclotomic3, int, int, List[int]]:
+            1) Exact gaussian sum value
             2) Largest nonzero principal minor
             3) Rank of M
             4) List of indices that form largest nonzero principal minor
     """
     det_minor, rank, rows = largest_nonzero_principal_minor(matrix)
-    if rank == 0:
-        return 1, det_minor, rank, []
-    return det_minor * (i_div_sqrt_3**rank), det_minor, rank, rows
+    return gauss_sum_value(det_minor, rank), det_minor, rank, rows
 
 
 def calc_rank_f3(matrix: np.ndarray) -> int:
@@ -282,8 +500,156 @@ def calc_rank_f3(matrix: np.ndarray) -> int:
     return m.rank()
 
 
+def build_masks_tensor(
+    faces_matrix: List[List[List[int]]], vertices: List[int]
+) -> np.ndarray:
+    """
+    Build masks of vertices: `masks[k][f1][f2] = 1` if vertex `vertices[k]` is
+    present both in face `f1` and face `f2`, so that Faces Matrix filled with
+    spins $\\sigma$ is $\\sum_k \\sigma_k \\cdot masks[k]$.
+
+    Args:
+        faces_matrix (List[List[List[int]]]): Faces Matrix
+        vertices (List[int]): vertices to build masks for
+
+    Returns:
+        np.ndarray: integer tensor of shape (len(vertices), n_faces, n_faces)
+    """
+    n_faces = len(faces_matrix)
+    vertex_index = {v: k for k, v in enumerate(vertices)}
+    masks_tensor = np.zeros((len(vertices), n_faces, n_faces), dtype=int)
+    for f1 in range(n_faces):
+        for f2 in range(f1, n_faces):
+            for v in faces_matrix[f1][f2]:
+                if v in vertex_index:
+                    masks_tensor[vertex_index[v]][f1][f2] = 1
+                    masks_tensor[vertex_index[v]][f2][f1] = 1
+    return masks_tensor
+
+
+def sigma_from_index(sigma_index: int, n_vertices: int) -> Tuple[int, ...]:
+    """
+    Vector of spins number `sigma_index` in the order of
+    `itertools.product([-1, 1], repeat=n_vertices)`
+
+    Args:
+        sigma_index (int): index of the vector, from 0 to $2^{n\\_vertices} - 1$
+        n_vertices (int): number of spins
+
+    Returns:
+        Tuple[int, ...]: vector of spins, each is -1 or 1
+    """
+    return tuple(
+        1 if (sigma_index >> (n_vertices - 1 - v)) & 1 else -1
+        for v in range(n_vertices)
+    )
+
+
+def gray_code_walk(
+    n_vertices: int, start: int = 0, stop: int | None = None
+) -> Iterator[Tuple[int, int]]:
+    """
+    Walk over all vectors of spins in Gray code order, so that every next vector
+    differs from the previous one in exactly one spin. The walk starts
+    from the vector with index `start`.
+
+    A range of indices `start`, `stop` must fix a prefix of spins, i.e.
+    `stop - start` is a power of 2 and `start` is divisible by it
+    (see `app.parallel.split_shards`); only the remaining spins are walked over.
+
+    Args:
+        n_vertices (int): number of spins
+        start (int, optional): index of the first vector. Defaults to 0.
+        stop (int | None, optional): index after the last vector.
+            Defaults to None, i.e. all vectors.
+
+    Yields:
+        Iterator[Tuple[int, int]]: index of the current vector (in the order of
+            `itertools.product([-1, 1], repeat=n_vertices)`, see `sigma_from_index`)
+            and index of the spin flipped to get it (-1 for the first vector)
+    """
+    if stop is None:
+        stop = 2**n_vertices
+    size = stop - start
+    assert size > 0 and size & (size - 1) == 0 and start % size == 0, (
+        f"Range [{start}, {stop}) does not fix a prefix of spins"
+    )
+
+    yield start, -1
+    for step in range(1, size):
+        bit = (step & -step).bit_length() - 1
+        yield start + (step ^ (step >> 1)), n_vertices - 1 - bit
+
+
+def iter_filled_faces_matrices(
+    masks_tensor: np.ndarray, start: int = 0, stop: int | None = None
+) -> Iterator[Tuple[int, int, np.ndarray]]:
+    """
+    Iterate over Faces Matrices filled with every vector of spins, mod 3.
+
+    Vectors are visited in Gray code order (see `gray_code_walk`), so instead
+    of summing all masks for every vector, only the entries of the flipped vertex
+    are updated: flipping $\\sigma_v$ from -1 to 1 adds $2 \\cdot masks[v] \\equiv
+    -masks[v]$, and back adds $masks[v]$.
+
+    **Warning**: the same array is updated in place and yielded on every step,
+    copy it if it needs to be kept.
+
+    Args:
+        masks_tensor (np.ndarray): masks of vertices, see `build_masks_tensor`
+        start (int, optional): index of the first vector. Defaults to 0.
+        stop (int | None, optional): index after the last vector.
+            Defaults to None, i.e. all vectors. See `gray_code_walk`.
+
+    Yields:
+        Iterator[Tuple[int, int, np.ndarray]]: index of the vector of spins
+            (see `sigma_from_index`), index of the flipped spin (-1 for the first
+            vector) and Faces Matrix filled with this vector, values are 0, 1 or 2
+    """
+    n_vertices = masks_tensor.shape[0]
+    support = [np.nonzero(mask) for mask in masks_tensor]
+
+    sigma = np.array(sigma_from_index(start, n_vertices))
+    faces_matrix_filled = np.tensordot(sigma, masks_tensor, axes=1) % 3
+
+    for sigma_index, v in gray_code_walk(n_vertices, start, stop):
+        if v >= 0:
+            rows, cols = support[v]
+            delta = -1 if sigma[v] == -1 else 1
+            sigma[v] = -sigma[v]
+            faces_matrix_filled[rows, cols] = (
+                faces_matrix_filled[rows, cols] + delta
+            ) % 3
+        yield sigma_index, v, faces_matrix_filled
+
+
+def _tait_0_in_detail_shard(
+    masks_tensor: np.ndarray, start: int, stop: int
+) -> Tuple[List[Cyclotomic3], List[int], List[int]]:
+    """
+    Gaussian sums, largest nonzero principal minors and ranks for vectors of spins
+    from `start` to `stop`, see `calc_tait_0_in_detail`
+    """
+    n_sigma = stop - start
+    det_minor_list = [None] * n_sigma
+    rank_list = [None] * n_sigma
+    gauss_list = [None] * n_sigma
+
+    for sigma_index, _, faces_matrix_filled in iter_filled_faces_matrices(
+        masks_tensor, start, stop
+    ):
+        gauss, det_minor, rank, _ = gaussian_sum(faces_matrix_filled)
+        gauss_list[sigma_index - start] = gauss
+        det_minor_list[sigma_index - start] = det_minor
+        rank_list[sigma_index - start] = rank
+
+    return gauss_list, det_minor_list, rank_list
+
+
 def calc_tait_0_in_detail(
     faces_matrix: List[List[List[int]]],
+    n_workers: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
 ) -> Tuple[int, List[int], List[int], List[int]]:
     """
     Given Faces Matrix of a planar cubic graph $G$, calculate number of Tait colorings
@@ -294,6 +660,10 @@ def calc_tait_0_in_detail(
             a list of all vertices that are present both in face `i` and face `j`.
             Note that vertex indices should be from 0 to 2n-1, where Faces Matrix
             has size $(n+2) \times (n+2)$.
+        n_workers (int | None, optional): number of worker processes, see
+            `app.parallel.map_shards`. Defaults to None.
+        progress (Callable[[int, int], None] | None, optional): progress callback,
+            see `app.parallel.map_shards`. Defaults to None.
 
     Returns:
         Tuple[int, List[int], List[int], List[int]]:
@@ -306,96 +676,325 @@ def calc_tait_0_in_detail(
     n_faces = len(faces_matrix)  # n + 2
     n_vertices = 2 * (n_faces - 2)  # 2n
 
-    masks_tensor = np.zeros((n_vertices, n_faces, n_faces))
-    for v in range(n_vertices):
-        for f1 in range(n_faces):
-            for f2 in range(f1, n_faces):
-                if v in faces_matrix[f1][f2]:
-                    masks_tensor[v][f1][f2] = 1
-                    masks_tensor[v][f2][f1] = 1
-    all_sigma = itertools.product([-1, 1], repeat=n_vertices)
+    masks_tensor = build_masks_tensor(faces_matrix, list(range(n_vertices)))
 
     det_minor_list = []
     rank_list = []
     gauss_list = []
 
-    for sigma in all_sigma:
-        sigma = np.array(sigma).reshape(-1, 1, 1)
-        faces_matrix_filled = np.sum(masks_tensor * sigma, axis=0)
-        gauss, det_minor, rank, _ = gaussian_sum(faces_matrix_filled)
-        gauss_list.append(gauss)
-        det_minor_list.append(det_minor)
-        rank_list.append(rank)
+    for shard_gauss, shard_det_minor, shard_rank in map_shards(
+        _tait_0_in_detail_shard, n_vertices, (masks_tensor,), n_workers, progress
+    ):
+        gauss_list.extend(shard_gauss)
+        det_minor_list.extend(shard_det_minor)
+        rank_list.extend(shard_rank)
+
+    n_tait_0 = to_tait_0(sum(gauss_list))
 
-    n_tait_0 = sympy.nsimplify(sum(gauss_list))
+    return n_tait_0, gauss_list, det_minor_list, rank_list
 
-    assert isinstance(
-        n_tait_0, sympy.core.numbers.Integer
-    ), "Calculated sum of Tait colorings is not integer"
 
-    return int(n_tait_0), gauss_list, det_minor_list, rank_list
+def sigma_block(start: int, stop: int, n_vertices: int) -> np.ndarray:
+    """
+    Vectors of spins with indices from `start` to `stop` (see `sigma_from_index`)
 
+    Args:
+        start (int): first index
+        stop (int): index after the last one
+        n_vertices (int): number of spins
 
-def calc_tait_0_aggregated(
-    faces_matrix: List[List[List[int]]],
-) -> Tuple[int, List[int], List[int]]:
-    n_faces = len(faces_matrix)  # n + 2
-    n_vertices = 2 * (n_faces - 2)  # 2n
-    # masks = [ for v in range(n_vertices)]
-    masks = np.zeros((n_vertices, n_faces, n_faces))
-    for v in range(n_vertices):
-        for f1 in range(n_faces):
-            for f2 in range(f1, n_faces):
-                if v in faces_matrix[f1][f2]:
-                    masks[v][f1][f2] = 1
-                    masks[v][f2][f1] = 1
-    all_sigma = itertools.product([-1, 1], repeat=n_vertices)
+    Returns:
+        np.ndarray: int8 array of shape (stop - start, n_vertices) of -1 and 1
+    """
+    return sigmas_from_indices(np.arange(start, stop, dtype=np.int64), n_vertices)
+
+
+def sigmas_from_indices(indices: np.ndarray, n_vertices: int) -> np.ndarray:
+    """
+    Vectors of spins with given indices, see `sigma_from_index`
+
+    Args:
+        indices (np.ndarray): int64 array of indices
+        n_vertices (int): number of spins
+
+    Returns:
+        np.ndarray: int8 array of shape (len(indices), n_vertices) of -1 and 1
+    """
+    shifts = np.arange(n_vertices - 1, -1, -1, dtype=np.int64)
+    bits = (indices.reshape(-1, 1) >> shifts) & 1
+    return (2 * bits - 1).astype(np.int8)
+
+
+def build_filled_faces_matrices(
+    sigma: np.ndarray, masks_tensor: np.ndarray
+) -> np.ndarray:
+    """
+    Fill Faces Matrix with a block of vectors of spins at once, as one matrix product
+    of the block and the flattened masks.
+
+    Args:
+        sigma (np.ndarray): array of shape (K, n_vertices) of -1 and 1
+        masks_tensor (np.ndarray): masks of vertices, see `build_masks_tensor`
 
+    Returns:
+        np.ndarray: int8 tensor of shape (K, n_faces, n_faces) with values 0, 1, 2
+    """
+    n_vertices, n_faces, _ = masks_tensor.shape
+    # float32 products of small integers are exact and use BLAS
+    filled = sigma.astype(np.float32) @ masks_tensor.reshape(n_vertices, -1).astype(
+        np.float32
+    )
+    filled = np.rint(filled).astype(np.int16) % 3
+    return filled.astype(np.int8).reshape(-1, n_faces, n_faces)
+
+
+def calc_block_size(n_vertices: int, n_faces: int, memory_budget: int) -> int:
+    """
+    Number of vectors of spins per block, so that one block fits into `memory_budget`
+    bytes (filled matrices, their float32 product and temporaries of elimination).
+    """
+    bytes_per_sigma = 8 * n_faces * n_faces + n_vertices
+    return max(1, memory_budget // bytes_per_sigma)
+
+
+def iter_rank_det_blocks(
+    masks_tensor: np.ndarray,
+    start: int = 0,
+    stop: int | None = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Calculate ranks and ${\\det}'$ of Faces Matrix filled with vectors of spins
+    from `start` to `stop`, block by block, see `batched_symmetric_elimination_f3`.
+
+    Args:
+        masks_tensor (np.ndarray): masks of vertices, see `build_masks_tensor`
+        start (int, optional): index of the first vector of spins. Defaults to 0.
+        stop (int | None, optional): index after the last vector of spins.
+            Defaults to None, i.e. all vectors.
+        memory_budget (int, optional): approximate memory limit for one block in bytes.
+
+    Yields:
+        Iterator[Tuple[int, np.ndarray, np.ndarray]]: index of the first vector
+            of the block, int8 arrays of ranks and ${\\det}'$ values of the block
+    """
+    n_vertices, n_faces, _ = masks_tensor.shape
+    if stop is None:
+        stop = 2**n_vertices
+    block_size = calc_block_size(n_vertices, n_faces, memory_budget)
+    for block_start in range(start, stop, block_size):
+        block_stop = min(block_start + block_size, stop)
+        sigma = sigma_block(block_start, block_stop, n_vertices)
+        filled = build_filled_faces_matrices(sigma, masks_tensor)
+        ranks, dets = batched_symmetric_elimination_f3(filled)
+        yield block_start, ranks, dets
+
+
+def calc_rank_det_histogram(
+    masks_tensor: np.ndarray,
+    start: int = 0,
+    stop: int | None = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> Dict[Tuple[int, int], List[int]]:
+    """
+    Count vectors of spins from `start` to `stop` by (${\\det}'$, rank) of filled
+    Faces Matrix; gaussian sum only depends on these two values.
+
+    Args:
+        masks_tensor (np.ndarray): masks of vertices, see `build_masks_tensor`
+        start (int, optional): index of the first vector of spins. Defaults to 0.
+        stop (int | None, optional): index after the last vector of spins.
+            Defaults to None, i.e. all vectors.
+        memory_budget (int, optional): approximate memory limit for one block in bytes.
+
+    Returns:
+        Dict[Tuple[int, int], List[int]]: for every (det_minor, rank) pair, number
+            of vectors of spins and index of the first of them
+    """
+    histogram = {}
+    for block_start, ranks, dets in iter_rank_det_blocks(
+        masks_tensor, start, stop, memory_budget
+    ):
+        add_to_histogram(
+            histogram,
+            ranks,
+            dets,
+            np.ones(len(ranks), dtype=np.int64),
+            np.arange(block_start, block_start + len(ranks), dtype=np.int64),
+        )
+    return histogram
+
+
+def add_to_histogram(
+    histogram: Dict[Tuple[int, int], List[int]],
+    ranks: np.ndarray,
+    dets: np.ndarray,
+    counts: np.ndarray,
+    first_indices: np.ndarray,
+) -> None:
+    """
+    Add weighted (${\\det}'$, rank) values to a histogram in place,
+    see `calc_rank_det_histogram`
+    """
+    codes = 2 * ranks.astype(np.int64) + (dets == 1)
+    keys, inverse = np.unique(codes, return_inverse=True)
+    key_counts = np.zeros(len(keys), dtype=np.int64)
+    key_first = np.full(len(keys), np.iinfo(np.int64).max)
+    np.add.at(key_counts, inverse, counts)
+    np.minimum.at(key_first, inverse, first_indices)
+    for code, count, first_index in zip(
+        keys.tolist(), key_counts.tolist(), key_first.tolist()
+    ):
+        key = (1 if code % 2 else -1, code // 2)
+        if key not in histogram:
+            histogram[key] = [0, first_index]
+        histogram[key][0] += count
+        histogram[key][1] = min(histogram[key][1], first_index)
+
+
+def calc_rank_det_histogram_symmetric(
+    masks_tensor: np.ndarray,
+    weights: np.ndarray,
+    start: int = 0,
+    stop: int | None = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> Dict[Tuple[int, int], List[int]]:
+    """
+    Same as `calc_rank_det_histogram`, but Faces Matrix is only filled and eliminated
+    for one representative of every orbit of vectors of spins under automorphisms
+    of the face structure and the flip of all spins (see `app.symmetry.calc_orbits`);
+    the other vectors of the orbit are counted with its weight.
+
+    Args:
+        masks_tensor (np.ndarray): masks of vertices, see `build_masks_tensor`
+        weights (np.ndarray): see `app.symmetry.bit_permutation_weights`
+        start (int, optional): index of the first vector of spins. Defaults to 0.
+        stop (int | None, optional): index after the last vector of spins.
+            Defaults to None, i.e. all vectors.
+        memory_budget (int, optional): approximate memory limit for one block in bytes.
+
+    Returns:
+        Dict[Tuple[int, int], List[int]]: see `calc_rank_det_histogram`
+    """
+    n_vertices, n_faces, _ = masks_tensor.shape
+    if stop is None:
+        stop = 2**n_vertices
+    block_size = min(
+        calc_block_size(n_vertices, n_faces, memory_budget),
+        max(1, memory_budget // (24 * weights.shape[1] + 8 * n_vertices)),
+    )
+
+    histogram = {}
+    for block_start in range(start, stop, block_size):
+        indices = np.arange(
+            block_start, min(block_start + block_size, stop), dtype=np.int64
+        )
+        is_representative, orbit_sizes, flip_in_orbit, min_flipped = calc_orbits(
+            indices, weights, n_vertices
+        )
+        indices = indices[is_representative]
+        if len(indices) == 0:
+            continue
+        orbit_sizes = orbit_sizes[is_representative]
+        flip_in_orbit = flip_in_orbit[is_representative]
+        min_flipped = min_flipped[is_representative]
+
+        filled = build_filled_faces_matrices(
+            sigmas_from_indices(indices, n_vertices), masks_tensor
+        )
+        ranks, dets = batched_symmetric_elimination_f3(filled)
+        add_to_histogram(histogram, ranks, dets, orbit_sizes, indices)
+
+        # vectors of the flipped orbit, if it is different
+        flipped = ~flip_in_orbit
+        flipped_dets = np.where(ranks % 2 == 1, -dets, dets)
+        add_to_histogram(
+            histogram,
+            ranks[flipped],
+            flipped_dets[flipped],
+            orbit_sizes[flipped],
+            min_flipped[flipped],
+        )
+    return histogram
+
+
+def _rank_det_histogram_shard(
+    masks_tensor: np.ndarray, memory_budget: int, start: int, stop: int
+) -> Dict[Tuple[int, int], List[int]]:
+    return calc_rank_det_histogram(masks_tensor, start, stop, memory_budget)
+
+
+def _rank_det_histogram_symmetric_shard(
+    masks_tensor: np.ndarray,
+    weights: np.ndarray,
+    memory_budget: int,
+    start: int,
+    stop: int,
+) -> Dict[Tuple[int, int], List[int]]:
+    return calc_rank_det_histogram_symmetric(
+        masks_tensor, weights, start, stop, memory_budget
+    )
+
+
+def merge_histograms(
+    histograms: List[Dict[Tuple[int, int], List[int]]],
+) -> Dict[Tuple[int, int], List[int]]:
+    """
+    Merge histograms of (${\\det}'$, rank) calculated for different ranges
+    of vectors of spins, see `calc_rank_det_histogram`. Merging is done in the given
+    order and does not depend on the way the space was split.
+    """
+    merged = {}
+    for histogram in histograms:
+        for key, (count, first_index) in histogram.items():
+            if key not in merged:
+                merged[key] = [0, first_index]
+            merged[key][0] += count
+            merged[key][1] = min(merged[key][1], first_index)
+    return merged
+
+
+def _merge_two_histograms(
+    histogram: Dict[Tuple[int, int], List[int]],
+    other: Dict[Tuple[int, int], List[int]],
+) -> Dict[Tuple[int, int], List[int]]:
+    return merge_histograms([histogram, other])
+
+
+def tait_0_aggregated_from_histogram(
+    histogram: Dict[Tuple[int, int], List[int]],
+) -> Tuple[int, int, int, int, Tuple, Tuple, Tuple, Tuple, Tuple]:
+    """
+    Build result of `calc_tait_0_aggregated` from a histogram of (${\\det}'$, rank),
+    see `calc_rank_det_histogram`.
+    """
     n_tait_0 = 0
 
     n_zero_ranks = 0
     n_even_ranks = 0
     n_odd_ranks = 0
 
-    data = {}  # dict keys are tuples: (det_minor, rank, gauss_sum)
-
-    for sigma in all_sigma:
-        sigma = np.array(sigma).reshape(-1, 1, 1)
-        faces_matrix_filled = np.sum(masks * sigma, axis=0)
-        gauss_sum, det_minor, rank, _ = gaussian_sum(faces_matrix_filled)
+    data_rows = []
+    for (det_minor, rank), (num, _) in sorted(
+        histogram.items(), key=lambda item: item[1][1]
+    ):
+        gauss_sum = gauss_sum_value(det_minor, rank)
+        data_rows.append([det_minor, rank, gauss_sum, num, gauss_sum * num])
 
-        ind = (det_minor, rank, gauss_sum)
-        if ind not in data:
-            # add this entry if it is not yet present
-            data[ind] = 0
-
-        # add this count
-        data[ind] += 1
-
-        n_tait_0 += gauss_sum
+        n_tait_0 += gauss_sum * num
 
         if rank == 0:
-            n_zero_ranks += 1
+            n_zero_ranks += num
         elif rank % 2 == 1:
-            n_odd_ranks += 1
+            n_odd_ranks += num
         else:
             # rank is even, non-zero
-            n_even_ranks += 1
+            n_even_ranks += num
 
-    n_tait_0 = sympy.nsimplify(n_tait_0)
-    assert isinstance(
-        n_tait_0, sympy.core.numbers.Integer
-    ), "Calculated sum of Tait colorings is not integer"
-
-    data_rows = [
-        [det_minor, rank, gauss_sum, num, gauss_sum * num]
-        for (det_minor, rank, gauss_sum), num in data.items()
-    ]
+    n_tait_0 = to_tait_0(n_tait_0)
 
     det_minors, ranks, gauss_sums, nums, total_gauss_sums = zip(*data_rows)
 
-    n_tait_0 = int(n_tait_0)
-
     return (
         n_tait_0,
         n_even_ranks,
@@ -409,40 +1008,148 @@ def calc_tait_0_aggregated(
     )
 
 
-def calc_tait_0_dual_chromatic(faces_adjacency_matrix: List[List[int]]) -> int:
-    dual_graph = nx.from_numpy_array(np.array(faces_adjacency_matrix))
-    chromatic_polynomial = nx.chromatic_polynomial(dual_graph)
-    val = int(chromatic_polynomial.subs({"x": 4}))
-    return val // 12
+def calc_tait_0_aggregated(
+    faces_matrix: List[List[List[int]]],
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    n_workers: int | None = None,
+    symmetry: bool = False,
+    progress: Callable[[int, int], None] | None = None,
+    checkpoint: Checkpoint | None = None,
+    coordinator: Coordinator | None = None,
+) -> Tuple[int, int, int, int, Tuple, Tuple, Tuple, Tuple, Tuple]:
+    """
+    Given Faces Matrix of a planar cubic graph $G$, calculate number of Tait colorings
+    using $\\alpha$-representation, together with distribution of
+    (${\\det}'$, rank, gaussian sum) over all vectors of spins.
 
+    Vectors of spins are processed in blocks with `batched_symmetric_elimination_f3`.
 
-def calc_tait_0_fixed_in_detail(
+    Args:
+        faces_matrix (List[List[List[int]]]): Faces Matrix
+        memory_budget (int, optional): approximate memory limit for one block
+            of vectors of spins in bytes, per worker.
+        n_workers (int | None, optional): number of worker processes, see
+            `app.parallel.map_shards`. Defaults to None.
+        symmetry (bool, optional): only calculate one vector of spins per orbit
+            under automorphisms of the face structure and the flip of all spins,
+            see `calc_rank_det_histogram_symmetric`. Results are the same.
+            Defaults to False.
+        progress (Callable[[int, int], None] | None, optional): progress callback,
+            see `app.parallel.map_shards`. Defaults to None.
+        checkpoint (Checkpoint | None, optional): periodically save the histogram
+            of processed vectors of spins and resume from it, see
+            `app.parallel.fold_shards`. Defaults to None.
+        coordinator (Coordinator | None, optional): calculate shards on workers
+            of other hosts, see `app.distributed.Coordinator`. Defaults to None.
+
+    Returns:
+        Tuple[int, int, int, int, Tuple, Tuple, Tuple, Tuple, Tuple]:
+            1) Number of Tait colorings
+            2-4) Number of vectors of spins with even non-zero, odd and zero rank
+            5-9) For every distinct (det_minor, rank, gaussian sum), in the order
+                of first appearance: det_minor, rank, gaussian sum, number of vectors
+                of spins and total gaussian sum of them
+    """
+    n_faces = len(faces_matrix)  # n + 2
+    n_vertices = 2 * (n_faces - 2)  # 2n
+    masks = build_masks_tensor(faces_matrix, list(range(n_vertices)))
+    if symmetry:
+        perms = face_structure_automorphisms(faces_matrix)
+        weights = bit_permutation_weights(perms, n_vertices)
+        shard_function = _rank_det_histogram_symmetric_shard
+        args = (masks, weights, memory_budget)
+    else:
+        shard_function = _rank_det_histogram_shard
+        args = (masks, memory_budget)
+    histogram = fold_shards(
+        shard_function,
+        n_vertices,
+        _merge_two_histograms,
+        {},
+        args,
+        n_workers,
+        progress,
+        checkpoint,
+        checkpoint_key("calc_tait_0_aggregated", faces_matrix, symmetry),
+        coordinator,
+    )
+    return tait_0_aggregated_from_histogram(histogram)
+
+
+def iter_tait_0_in_detail(
     faces_matrix: List[List[List[int]]],
-    fixed_values: Dict[int, int],
-) -> Tuple[bool, Tuple[int, List[int], List[int]] | List[int]]:
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> Iterator[Tuple[int, List[Cyclotomic3], List[int], List[int]]]:
+    """
+    Calculate the same lists as `calc_tait_0_in_detail`, chunk by chunk, so that
+    only one chunk is kept in memory. Number of Tait colorings is the sum
+    of all gaussian sums.
+
+    Args:
+        faces_matrix (List[List[List[int]]]): Faces Matrix
+        chunk_size (int, optional): number of vectors of spins per chunk.
+        memory_budget (int, optional): approximate memory limit for one block
+            of vectors of spins in bytes, see `iter_rank_det_blocks`.
+
+    Yields:
+        Iterator[Tuple[int, List[Cyclotomic3], List[int], List[int]]]: index
+            of the first vector of spins of the chunk, gaussian sums, largest
+            nonzero principal minors and ranks for the vectors of the chunk
+    """
     n_faces = len(faces_matrix)  # n + 2
     n_vertices = 2 * (n_faces - 2)  # 2n
+    masks_tensor = build_masks_tensor(faces_matrix, list(range(n_vertices)))
+
+    n_sigma = 2**n_vertices
+    for start in range(0, n_sigma, chunk_size):
+        stop = min(start + chunk_size, n_sigma)
+        gauss_list = []
+        det_minor_list = []
+        rank_list = []
+        for _, ranks, dets in iter_rank_det_blocks(
+            masks_tensor, start, stop, memory_budget
+        ):
+            ranks = ranks.tolist()
+            dets = dets.tolist()
+            gauss_list.extend(map(gauss_sum_value, dets, ranks))
+            det_minor_list.extend(dets)
+            rank_list.extend(ranks)
+        yield start, gauss_list, det_minor_list, rank_list
 
-    l = [
-        sum(fixed_values.get(v, 0) for v in faces_matrix[i][i]) % 3
-        for i in range(n_faces)
-    ]
-    l = np.array(l)
 
-    fixed_vertices = np.array(list(fixed_values.keys()))
-    free_vertices = np.array([v for v in range(n_vertices) if v not in fixed_vertices])
+def calc_tait_0_dual_chromatic(faces_adjacency_matrix: List[List[int]]) -> int:
+    """
+    Calculate the number of Tait colorings as the number of 4-colorings
+    of the dual graph divided by 12 (the value of its chromatic polynomial at 4),
+    see `app.coloring.count_colorings_backtracking`
+
+    Args:
+        faces_adjacency_matrix (List[List[int]]): adjacency matrix of the dual graph
+
+    Returns:
+        int: number of Tait colorings
+    """
+    dual_graph = nx.from_numpy_array(np.array(faces_adjacency_matrix))
+    return count_colorings_backtracking(dual_graph, 4) // 12
 
-    fixed_vertices.sort()
-    free_vertices.sort()
 
-    masks_tensor = np.zeros((len(free_vertices), n_faces, n_faces), dtype=int)
-    for v in free_vertices:
-        for f1 in range(n_faces):
-            for f2 in range(f1, n_faces):
-                if v in faces_matrix[f1][f2]:
-                    vertex_index = np.nonzero(free_vertices == v)[0][0]
-                    masks_tensor[vertex_index][f1][f2] = 1
-                    masks_tensor[vertex_index][f2][f1] = 1
+def _tait_0_fixed_shard(
+    masks_tensor: np.ndarray,
+    l: np.ndarray,
+    start: int,
+    stop: int,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> Tuple[bool, Tuple]:
+    """
+    Terms of $\\alpha$-representation with fixed spins for vectors of free spins
+    from `start` to `stop`, see `calc_tait_0_fixed_in_detail`.
+
+    Faces Matrices are filled block by block and every one is eliminated
+    once together with $l$ (see `batched_bordered_elimination_f3`), which gives
+    the gaussian sum, the consistency of the system and the bordered determinant.
+    """
+    n_free_vertices, n_faces, _ = masks_tensor.shape
 
     det_minor_list = []
     rank_list = []
@@ -451,59 +1158,110 @@ def calc_tait_0_fixed_in_detail(
     chi_list = []
     term_list = []
 
-    all_free_sigma = itertools.product([-1, 1], repeat=len(free_vertices))
-    for sigma_free in all_free_sigma:
-        sigma_free = np.array(sigma_free).reshape(-1, 1, 1)
-        faces_matrix_filled = np.sum(masks_tensor * sigma_free, axis=0) % 3
-
-        gauss, det_minor, rank, rows = gaussian_sum(faces_matrix_filled)
+    # values only depend on ${\\det}'$, rank and the bordered determinant
+    values = {}
 
-        # check that system of linear equations is consistent
-        # for this check that rank of an augmented matrix (faces_matrix_filled|l)
-        # is the same as `rank` variable (rank of just `faces_matrix_filled`)
-        augmented_matrix = np.concatenate(
-            [faces_matrix_filled, l.reshape(-1, 1)], axis=1, dtype=int
+    block_size = calc_block_size(n_free_vertices, n_faces + 1, memory_budget)
+    for block_start in range(start, stop, block_size):
+        block_stop = min(block_start + block_size, stop)
+        sigma = sigma_block(block_start, block_stop, n_free_vertices)
+        filled = build_filled_faces_matrices(sigma, masks_tensor)
+        ranks, dets, consistent, bordered_dets = batched_bordered_elimination_f3(
+            filled, l.reshape(1, -1)
         )
-        augmented_matrix_rank = calc_rank_f3(augmented_matrix)
-
-        if rank != augmented_matrix_rank:
-            # System is inconsistent, return False and details
+        consistent, bordered_dets = consistent[:, 0], bordered_dets[:, 0]
+
+        if not consistent.all():
+            # System is inconsistent, return False and details:
+            # rank of the augmented matrix (faces_matrix_filled|l) is larger by 1
+            k = int(np.argmin(consistent))
+            augmented_matrix = np.concatenate(
+                [filled[k], l.reshape(-1, 1)], axis=1, dtype=int
+            )
             return False, (
-                sigma_free.reshape(-1).tolist(),
+                list(sigma_from_index(block_start + k, n_free_vertices)),
                 augmented_matrix.tolist(),
-                rank,
-                augmented_matrix_rank,
+                int(ranks[k]),
+                int(ranks[k]) + 1,
             )
 
-        M_ = faces_matrix_filled[np.ix_(rows, rows)]
+        dets = dets.tolist()
+        ranks = ranks.tolist()
+        bordered_dets = bordered_dets.tolist()
+        for det_minor, rank, bordered_det in zip(dets, ranks, bordered_dets):
+            key = (det_minor, rank, bordered_det)
+            if key not in values:
+                gauss = gauss_sum_value(det_minor, rank)
+                chi_val = calc_chi(bordered_det * det_minor)
+                values[key] = gauss, chi_val, chi_val * gauss
+            gauss, chi_val, term = values[key]
+            gauss_sum_list.append(gauss)
+            chi_list.append(chi_val)
+            term_list.append(term)
+        det_minor_list.extend(dets)
+        rank_list.extend(ranks)
+        bordered_det_list.extend(bordered_dets)
 
-        l_ = l[rows]
+    return True, (
+        det_minor_list,
+        rank_list,
+        gauss_sum_list,
+        bordered_det_list,
+        chi_list,
+        term_list,
+    )
 
-        M_l_ = np.pad(M_, ((0, 1), (0, 1)))
-        M_l_[-1, :-1] = l_
-        M_l_[:-1, -1] = l_
 
-        bordered_det = int(round(np.linalg.det(M_l_))) % 3
-        if bordered_det == 2:
-            bordered_det = -1
-        chi_val = sympy.nsimplify(calc_chi(bordered_det * det_minor))
+def calc_tait_0_fixed_in_detail(
+    faces_matrix: List[List[List[int]]],
+    fixed_values: Dict[int, int],
+    n_workers: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> Tuple[bool, Tuple[int, List[int], List[int]] | List[int]]:
+    n_faces = len(faces_matrix)  # n + 2
+    n_vertices = 2 * (n_faces - 2)  # 2n
+
+    l = [
+        sum(fixed_values.get(v, 0) for v in faces_matrix[i][i]) % 3
+        for i in range(n_faces)
+    ]
+    l = np.array(l)
 
-        gauss_sum_list.append(gauss)
-        det_minor_list.append(det_minor)
-        rank_list.append(rank)
-        bordered_det_list.append(bordered_det)
-        chi_list.append(chi_val)
-        term_list.append(sympy.nsimplify(chi_val * gauss))
+    fixed_vertices = np.array(list(fixed_values.keys()))
+    free_vertices = np.array([v for v in range(n_vertices) if v not in fixed_vertices])
 
-    n_tait_0 = sum(term_list)
-    n_tait_0 = sympy.nsimplify(n_tait_0)
+    fixed_vertices.sort()
+    free_vertices.sort()
 
-    assert isinstance(
-        n_tait_0, sympy.core.numbers.Integer
-    ), f"Calculated sum of Tait colorings is not integer, got {n_tait_0}"
+    masks_tensor = build_masks_tensor(faces_matrix, free_vertices.tolist())
+
+    lists = [[] for _ in range(6)]
+    for is_consistent, shard_details in map_shards(
+        _tait_0_fixed_shard,
+        len(free_vertices),
+        (masks_tensor, l),
+        n_workers,
+        progress,
+    ):
+        if not is_consistent:
+            # System is inconsistent, return False and details
+            return False, shard_details
+        for merged, shard_list in zip(lists, shard_details):
+            merged.extend(shard_list)
+
+    (
+        det_minor_list,
+        rank_list,
+        gauss_sum_list,
+        bordered_det_list,
+        chi_list,
+        term_list,
+    ) = lists
+
+    n_tait_0 = to_tait_0(sum(term_list))
 
     return True, (
-        int(n_tait_0),
+        n_tait_0,
         det_minor_list,
         rank_list,
         gauss_sum_list,
@@ -513,73 +1271,592 @@ def calc_tait_0_fixed_in_detail(
     )
 
 
-def calc_heawood(faces: List[List[int]]) -> List[int]:
+def _tait_0_fixed_sweep_shard(
+    masks_tensor: np.ndarray,
+    vectors: np.ndarray,
+    memory_budget: int,
+    start: int,
+    stop: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Histograms of (rank, ${\\det}'$, bordered determinant) for every vector $l$
+    over vectors of free spins from `start` to `stop`, see
+    `calc_tait_0_fixed_sweep`
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: int64 counts of shape
+            (m, n_faces + 1, 2, 3), indexed by rank, ${\\det}' = 1$ and
+            bordered determinant + 1, and bool array of shape (m,):
+            the system is inconsistent for some vector of spins
+    """
+    n_free_vertices, n_faces, _ = masks_tensor.shape
+    n_vectors = len(vectors)
+    n_codes = (n_faces + 1) * 2 * 3
+    counts = np.zeros(n_vectors * n_codes, dtype=np.int64)
+    inconsistent = np.zeros(n_vectors, dtype=bool)
+
+    block_size = calc_block_size(
+        n_free_vertices, n_faces + n_vectors, memory_budget
+    )
+    for block_start in range(start, stop, block_size):
+        block_stop = min(block_start + block_size, stop)
+        sigma = sigma_block(block_start, block_stop, n_free_vertices)
+        filled = build_filled_faces_matrices(sigma, masks_tensor)
+        ranks, dets, consistent, bordered_dets = batched_bordered_elimination_f3(
+            filled, vectors
+        )
+        inconsistent |= ~consistent.all(axis=0)
+        codes = (ranks.astype(np.int64) * 2 + (dets == 1))[:, None] * 3 + (
+            bordered_dets + 1
+        )
+        codes += np.arange(n_vectors) * n_codes
+        counts += np.bincount(codes.reshape(-1), minlength=len(counts))
+
+    return counts.reshape(n_vectors, n_faces + 1, 2, 3), inconsistent
+
+
+def _merge_sweep_histograms(
+    histogram: Tuple[np.ndarray, np.ndarray], shard: Tuple[np.ndarray, np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    if histogram is None:
+        return shard
+    return histogram[0] + shard[0], histogram[1] | shard[1]
+
+
+def calc_tait_0_fixed_sweep(
+    faces_matrix: List[List[List[int]]],
+    vertices: List[int],
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    n_workers: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> Tuple[List[Tuple[int, ...]], List[bool], List[int | None]]:
+    """
+    Calculate the number of Tait colorings with fixed spins (see
+    `calc_tait_0_fixed_in_detail`) for all $2^k$ assignments of spins
+    of `vertices` at once.
+
+    Faces Matrix filled with free spins does not depend on the assignment,
+    only the vector $l$ does, so every vector of free spins is enumerated once
+    and its matrix is eliminated once together with all $2^k$ vectors $l$
+    (see `batched_bordered_elimination_f3`).
+
+    Args:
+        faces_matrix (List[List[List[int]]]): Faces Matrix
+        vertices (List[int]): distinct vertices to fix
+        memory_budget (int, optional): approximate memory limit for one block
+            of vectors of spins in bytes, per worker.
+        n_workers (int | None, optional): number of worker processes, see
+            `app.parallel.map_shards`. Defaults to None.
+        progress (Callable[[int, int], None] | None, optional): progress callback,
+            see `app.parallel.map_shards`. Defaults to None.
+
+    Raises:
+        ValueError: if `vertices` are not distinct vertices of the graph
+            or all vertices are fixed
+
+    Returns:
+        Tuple[List[Tuple[int, ...]], List[bool], List[int | None]]:
+            1) Spins of `vertices` of every assignment, in the order of
+                `itertools.product([-1, 1], repeat=k)`
+            2) Whether the system is consistent for all vectors of free spins
+            3) Number of Tait colorings, None for inconsistent assignments
+    """
+    n_faces = len(faces_matrix)  # n + 2
+    n_vertices = 2 * (n_faces - 2)  # 2n
+    if len(set(vertices)) != len(vertices) or not all(
+        0 <= v < n_vertices for v in vertices
+    ):
+        raise ValueError(f"Vertices must be distinct and from 0 to {n_vertices - 1}")
+    if len(vertices) == n_vertices:
+        raise ValueError("At least one vertex must be free")
+
+    fixed_vertices = set(vertices)
+    free_vertices = [v for v in range(n_vertices) if v not in fixed_vertices]
+    masks_tensor = build_masks_tensor(faces_matrix, free_vertices)
+
+    # l of an assignment $\\tau$ is $\\sum_v \\tau_v \\cdot incidence[v]$
+    incidence = np.zeros((len(vertices), n_faces), dtype=int)
+    for k, v in enumerate(vertices):
+        for i in range(n_faces):
+            incidence[k][i] = faces_matrix[i][i].count(v)
+    assignments = sigma_block(0, 2 ** len(vertices), len(vertices))
+    vectors = assignments.astype(int) @ incidence % 3
+
+    counts, inconsistent = fold_shards(
+        _tait_0_fixed_sweep_shard,
+        len(free_vertices),
+        _merge_sweep_histograms,
+        None,
+        (masks_tensor, vectors, memory_budget),
+        n_workers,
+        progress,
+    )
+
+    # terms only depend on (rank, ${\\det}'$, bordered determinant)
+    terms = {}
+    for rank, det_index, bordered_index in zip(*np.nonzero(counts.any(axis=0))):
+        det_minor = 1 if det_index else -1
+        bordered_det = int(bordered_index) - 1
+        terms[rank, det_index, bordered_index] = calc_chi(
+            bordered_det * det_minor
+        ) * gauss_sum_value(det_minor, int(rank))
+
+    consistent_list = (~inconsistent).tolist()
+    tait_0_list = []
+    for vector_counts, is_consistent in zip(counts, consistent_list):
+        if not is_consistent:
+            tait_0_list.append(None)
+            continue
+        total = sum(
+            terms[index] * int(vector_counts[index])
+            for index in zip(*np.nonzero(vector_counts))
+        )
+        tait_0_list.append(to_tait_0(total))
+
+    return [tuple(a) for a in assignments.tolist()], consistent_list, tait_0_list
+
+
+def _heawood_face_is_feasible(face_sum: int, n_remaining: int) -> bool:
+    """
+    Whether a face with the sum of assigned spins `face_sum` and `n_remaining`
+    unassigned spins can still have the sum 0 mod 3: two or more spins reach
+    every residue, one spin changes the sum by $\\pm 1$
+    """
+    if n_remaining >= 2:
+        return True
+    if n_remaining == 1:
+        return face_sum % 3 != 0
+    return face_sum % 3 == 0
+
+
+def _heawood_vertex_order(
+    vertex_faces: List[List[int]],
+    n_remaining: List[int],
+    vertices: List[int],
+) -> List[int]:
+    """
+    Order of assignment of `vertices`: vertices of the face closest to completion
+    go first, so faces are completed (and checked) as early as possible
+    """
+    n_remaining = list(n_remaining)
+    faces_vertices = [[] for _ in n_remaining]
+    for v in vertices:
+        for i in vertex_faces[v]:
+            faces_vertices[i].append(v)
+
+    order = []
+    is_assigned = set()
+    while True:
+        open_faces = [i for i in range(len(n_remaining)) if n_remaining[i] > 0]
+        if not open_faces:
+            break
+        face = min(open_faces, key=lambda i: n_remaining[i])
+        v = next(v for v in faces_vertices[face] if v not in is_assigned)
+        order.append(v)
+        is_assigned.add(v)
+        for i in vertex_faces[v]:
+            n_remaining[i] -= 1
+
+    # vertices that are not in any face
+    order.extend(v for v in vertices if v not in is_assigned)
+    return order
+
+
+def _heawood_search(
+    faces_free: List[List[int]],
+    faces_fixed_sums: List[int],
+    n_free_vertices: int,
+    prefix: Tuple[int, ...] = (),
+) -> Tuple[List[List[int]], List[int], List[int], List[int]] | None:
+    """
+    Initial state of the backtracking of `_heawood_solutions` with spins
+    of the first free vertices fixed to `prefix`
+
+    Returns:
+        Tuple[List[List[int]], List[int], List[int], List[int]] | None: faces
+            of every free vertex, sums and numbers of unassigned spins of faces,
+            and the order of assignment of the other vertices; None if some face
+            cannot reach 0 mod 3
+    """
+    n_prefix = len(prefix)
+    vertex_faces = [[] for _ in range(n_free_vertices)]
+    face_sums = list(faces_fixed_sums)
+    n_remaining = [len(face) for face in faces_free]
+    for i, face in enumerate(faces_free):
+        for v in face:
+            vertex_faces[v].append(i)
+            if v < n_prefix:
+                face_sums[i] += prefix[v]
+                n_remaining[i] -= 1
+    if not all(map(_heawood_face_is_feasible, face_sums, n_remaining)):
+        return None
+
+    order = _heawood_vertex_order(
+        vertex_faces, n_remaining, list(range(n_prefix, n_free_vertices))
+    )
+    return vertex_faces, face_sums, n_remaining, order
+
+
+def _heawood_solutions(
+    faces_free: List[List[int]],
+    faces_fixed_sums: List[int],
+    n_free_vertices: int,
+    start: int = 0,
+    stop: int | None = None,
+    count_only: bool = False,
+) -> List[int] | int:
+    """
+    Find indices (see `sigma_from_index`) of all vectors of free spins, such that
+    the sum of spins in every face is 0 mod 3.
+
+    Spins are assigned by backtracking in the order of `_heawood_vertex_order`,
+    keeping the partial sum and the number of unassigned spins of every face.
+    A branch is cut as soon as some face cannot reach 0 mod 3 any more
+    (see `_heawood_face_is_feasible`), i.e. when its last spin is assigned wrong
+    or when the only unassigned spin cannot fix its sum, so the work is
+    proportional to the number of solutions rather than to $2^{n}$.
+
+    Args:
+        faces_free (List[List[int]]): for every face, indices of free vertices in it
+        faces_fixed_sums (List[int]): for every face, sum of its fixed spins
+        n_free_vertices (int): number of free spins
+        start (int, optional): index of the first vector. Defaults to 0.
+        stop (int | None, optional): index after the last vector.
+            Defaults to None, i.e. all vectors. Like in `gray_code_walk`,
+            the range must fix a prefix of spins.
+        count_only (bool, optional): return only the number of solutions.
+            Defaults to False.
+
+    Returns:
+        List[int] | int: sorted indices of good vectors of free spins,
+            or their number if `count_only`
+    """
+    n = n_free_vertices
+    if stop is None:
+        stop = 2**n
+    size = stop - start
+    assert size > 0 and size & (size - 1) == 0 and start % size == 0
+    n_prefix = n - (size.bit_length() - 1)
+
+    prefix = sigma_from_index(start >> (n - n_prefix), n_prefix) if n_prefix else ()
+    search = _heawood_search(faces_free, faces_fixed_sums, n, prefix)
+    if search is None:
+        return 0 if count_only else []
+    vertex_faces, face_sums, n_remaining, order = search
+    bits = [1 << (n - 1 - v) for v in order]
+
+    count = 0
+    good_sigma_indices = []
+
+    # iterative depth-first search, tried[depth] is the number of tried spins
+    depth = 0
+    tried = [0] * len(order)
+    spins = [0] * len(order)
+    index = start
+    while depth >= 0:
+        if depth == len(order):
+            count += 1
+            if not count_only:
+                good_sigma_indices.append(index)
+            depth -= 1
+            continue
+
+        v = order[depth]
+        if tried[depth] > 0:
+            # undo the previous spin of this vertex
+            spin = spins[depth]
+            for i in vertex_faces[v]:
+                face_sums[i] -= spin
+                n_remaining[i] += 1
+            if spin == 1:
+                index -= bits[depth]
+        if tried[depth] == 2:
+            tried[depth] = 0
+            depth -= 1
+            continue
+
+        spin = -1 if tried[depth] == 0 else 1
+        tried[depth] += 1
+        spins[depth] = spin
+        is_feasible = True
+        for i in vertex_faces[v]:
+            face_sums[i] += spin
+            n_remaining[i] -= 1
+            is_feasible = is_feasible and _heawood_face_is_feasible(
+                face_sums[i], n_remaining[i]
+            )
+        if spin == 1:
+            index += bits[depth]
+        if is_feasible:
+            depth += 1
+
+    if count_only:
+        return count
+    good_sigma_indices.sort()
+    return good_sigma_indices
+
+
+def estimate_heawood_search(
+    faces: List[List[int]],
+    fixed_spins: Dict[int, int] | None = None,
+    n_probes: int = 64,
+    seed: int = 0,
+) -> Tuple[float, float]:
+    """
+    Estimate the size of the backtracking tree of `calc_heawood_fixed` (or
+    `calc_heawood`, if `fixed_spins` is None) without searching it, by the random
+    probes of Knuth: a probe walks from the root choosing a random feasible spin
+    at every step, and the products of the numbers of feasible spins along
+    the path are unbiased estimates of the number of nodes on every depth.
+    The mean over probes estimates the number of nodes and of solutions;
+    estimates are rough (the search tree is irregular) but take
+    $O(n\_probes \cdot n)$ instead of the whole search.
+
+    Args:
+        faces (List[List[int]]): list of faces, not modified
+        fixed_spins (Dict[int, int] | None, optional): fixed spins. Defaults to None.
+        n_probes (int, optional): number of random probes. Defaults to 64.
+        seed (int, optional): seed of the random choices. Defaults to 0.
+
+    Returns:
+        Tuple[float, float]: estimated number of nodes of the search tree
+            and of good vectors of spins
+    """
+    faces_free, faces_fixed_sums, n_free_vertices, _ = _prepare_heawood(
+        [list(face) for face in faces], fixed_spins or {}
+    )
+    search = _heawood_search(faces_free, faces_fixed_sums, n_free_vertices)
+    if search is None:
+        return 1.0, 0.0
+    vertex_faces, initial_sums, initial_remaining, order = search
+
+    rng = random.Random(seed)
+    total_nodes = 0.0
+    total_solutions = 0.0
+    for _ in range(n_probes):
+        face_sums = list(initial_sums)
+        n_remaining = list(initial_remaining)
+        weight = 1.0
+        total_nodes += weight
+        for v in order:
+            feasible = []
+            for spin in (-1, 1):
+                if all(
+                    _heawood_face_is_feasible(face_sums[i] + spin, n_remaining[i] - 1)
+                    for i in vertex_faces[v]
+                ):
+                    feasible.append(spin)
+            if not feasible:
+                weight = 0.0
+                break
+            weight *= len(feasible)
+            total_nodes += weight
+            spin = rng.choice(feasible)
+            for i in vertex_faces[v]:
+                face_sums[i] += spin
+                n_remaining[i] -= 1
+        total_solutions += weight
+    return total_nodes / n_probes, total_solutions / n_probes
+
+
+def _heawood_count_shard(
+    faces_free: List[List[int]],
+    faces_fixed_sums: List[int],
+    n_free_vertices: int,
+    start: int,
+    stop: int,
+) -> int:
+    return _heawood_solutions(
+        faces_free, faces_fixed_sums, n_free_vertices, start, stop, count_only=True
+    )
+
+
+def _extend_indices(indices: List[int], shard_indices: List[int]) -> List[int]:
+    indices.extend(shard_indices)
+    return indices
+
+
+def _merge_heawood_shards(
+    faces_free: List[List[int]],
+    faces_fixed_sums: List[int],
+    n_free_vertices: int,
+    n_workers: int | None,
+    progress: Callable[[int, int], None] | None = None,
+    count_only: bool = False,
+    checkpoint: Checkpoint | None = None,
+    coordinator: Coordinator | None = None,
+) -> List[int] | int:
+    if count_only:
+        shard_function, merge, initial = _heawood_count_shard, operator.add, 0
+    else:
+        shard_function, merge, initial = _heawood_solutions, _extend_indices, []
+    return fold_shards(
+        shard_function,
+        n_free_vertices,
+        merge,
+        initial,
+        (faces_free, faces_fixed_sums, n_free_vertices),
+        n_workers,
+        progress,
+        checkpoint,
+        checkpoint_key("heawood", faces_free, faces_fixed_sums, count_only),
+        coordinator,
+    )
+
+
+def calc_heawood(
+    faces: List[List[int]],
+    n_workers: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+    count_only: bool = False,
+    checkpoint: Checkpoint | None = None,
+    coordinator: Coordinator | None = None,
+) -> List[int] | int:
     n_faces = len(faces)  # n + 2
     n_vertices = 2 * (n_faces - 2)  # 2n
-    good_sigma_list = []
 
     for i in range(n_faces):
         faces[i] = list(set(faces[i]))
 
-    for sigma in itertools.product([-1, 1], repeat=n_vertices):
-        bad_sigma = False
-        for face in faces:
-            s = sum(sigma[v] for v in face) % 3
-            if s != 0:
-                bad_sigma = True
-                break
-        if bad_sigma:
-            continue
-        good_sigma_list.append(sigma)
-    return good_sigma_list
+    good_sigma_indices = _merge_heawood_shards(
+        faces,
+        [0] * n_faces,
+        n_vertices,
+        n_workers,
+        progress,
+        count_only,
+        checkpoint,
+        coordinator,
+    )
+    if count_only:
+        return good_sigma_indices
+    return [sigma_from_index(ind, n_vertices) for ind in good_sigma_indices]
 
 
-def calc_heawood_fixed(
+def _prepare_heawood(
     faces: List[List[int]], fixed_spins: Dict[int, int]
-) -> List[int]:
+) -> Tuple[List[List[int]], List[int], int, int]:
+    """
+    Split faces into free vertices and sums of fixed spins, see
+    `_heawood_solutions`. Duplicate vertices are removed from `faces`
+    in place.
+
+    Returns:
+        Tuple[List[List[int]], List[int], int, int]: indices of free vertices
+            in every face, sums of fixed spins in every face, number of free
+            vertices and number of all vertices
+    """
     n_faces = len(faces)  # n + 2
     n_vertices = 2 * (n_faces - 2)  # 2n
-    good_sigma_list = []
 
     free_vertices = [v for v in range(n_vertices) if v not in fixed_spins]
+    free_vertex_index = {v: i for i, v in enumerate(free_vertices)}
 
     faces_free = []
     faces_fixed_sums = []
     for i in range(n_faces):
         faces[i] = list(set(faces[i]))
         faces_free.append(
-            [free_vertices.index(v) for v in faces[i] if v not in fixed_spins]
+            [free_vertex_index[v] for v in faces[i] if v not in fixed_spins]
         )
         faces_fixed_sums.append(
             sum([fixed_spins[v] for v in faces[i] if v in fixed_spins])
         )
 
-    n_fixed_vertices = len(fixed_spins.keys())
-    n_free_vertices = n_vertices - n_fixed_vertices
+    return faces_free, faces_fixed_sums, len(free_vertices), n_vertices
 
-    for sigma_free in itertools.product([-1, 1], repeat=n_free_vertices):
-        bad_sigma = False
-        for face, face_fixed in zip(faces_free, faces_fixed_sums):
-            s = (sum(sigma_free[v] for v in face) + face_fixed) % 3
-            if s != 0:
-                bad_sigma = True
-                break
-        if bad_sigma:
-            continue
 
+def _heawood_configuration(
+    sigma_index: int, fixed_spins: Dict[int, int], n_free_vertices: int, n_vertices: int
+) -> List[int]:
+    """
+    Full vector of spins from the index of the vector of free spins and fixed spins
+    """
+    sigma_free = sigma_from_index(sigma_index, n_free_vertices)
+
+    sigma = []
+    i = 0
+    for v in range(n_vertices):
+        if v in fixed_spins:
+            sigma.append(fixed_spins[v])
+        else:
+            sigma.append(sigma_free[i])
+            i += 1
+    return sigma
+
+
+def calc_heawood_fixed(
+    faces: List[List[int]],
+    fixed_spins: Dict[int, int],
+    n_workers: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+    count_only: bool = False,
+    checkpoint: Checkpoint | None = None,
+    coordinator: Coordinator | None = None,
+) -> List[int] | int:
+    faces_free, faces_fixed_sums, n_free_vertices, n_vertices = _prepare_heawood(
+        faces, fixed_spins
+    )
+
+    good_sigma_indices = _merge_heawood_shards(
+        faces_free,
+        faces_fixed_sums,
+        n_free_vertices,
+        n_workers,
+        progress,
+        count_only,
+        checkpoint,
+        coordinator,
+    )
+    if count_only:
+        return good_sigma_indices
+
+    good_sigma_list = []
+    for sigma_index in good_sigma_indices:
         # this is good configuration, so add it
-        sigma = []
-        i = 0
-        for v in range(n_vertices):
-            if v in fixed_spins:
-                sigma.append(fixed_spins[v])
-            else:
-                sigma.append(sigma_free[i])
-                i += 1
-        good_sigma_list.append(sigma)
+        good_sigma_list.append(
+            _heawood_configuration(
+                sigma_index, fixed_spins, n_free_vertices, n_vertices
+            )
+        )
     return good_sigma_list
 
 
+def iter_heawood(
+    faces: List[List[int]],
+    fixed_spins: Dict[int, int] | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[List[List[int]]]:
+    """
+    Find the same configurations as `calc_heawood_fixed` (or `calc_heawood`,
+    if `fixed_spins` is None), chunk by chunk.
+
+    Args:
+        faces (List[List[int]]): list of faces
+        fixed_spins (Dict[int, int] | None, optional): fixed spins. Defaults to None.
+        chunk_size (int, optional): number of vectors of free spins checked
+            per chunk, rounded to a power of 2.
+
+    Yields:
+        Iterator[List[List[int]]]: good configurations of every chunk, in order
+    """
+    if fixed_spins is None:
+        fixed_spins = {}
+    faces_free, faces_fixed_sums, n_free_vertices, n_vertices = _prepare_heawood(
+        faces, fixed_spins
+    )
+    n_chunks = max(1, 2**n_free_vertices // max(1, chunk_size))
+    for start, stop in split_shards(n_free_vertices, n_chunks):
+        yield [
+            _heawood_configuration(
+                sigma_index, fixed_spins, n_free_vertices, n_vertices
+            )
+            for sigma_index in _heawood_solutions(
+                faces_free, faces_fixed_sums, n_free_vertices, start, stop
+            )
+        ]
+
+
 def faces_matrix_to_dual_adjacency_matrix(
     faces_matrix: List[List[List[int]]],
 ) -> List[List[int]]:
@@ -592,61 +1869,189 @@ def faces_matrix_to_dual_adjacency_matrix(
     return adjacency_matrix
 
 
-def calc_s_values(
-    faces_matrix: List[List[List[int]]], vertices_in: List[int], vertices_mid: List[int]
-) -> List[Any]:
-    n_faces = len(faces_matrix)
-    vertices_in.sort()
-    vertices_mid.sort()
+def all_face_vectors(
+    n_faces: int, start: int = 0, stop: int | None = None
+) -> np.ndarray:
+    """
+    All vectors $x \\in \\mathbb{F}_3^{n\\_faces}$ in the order of
+    `itertools.product([-1, 0, 1], repeat=n_faces)`, or the vectors with indices
+    from `start` to `stop` in this order
+
+    Args:
+        n_faces (int): number of faces
+        start (int, optional): index of the first vector. Defaults to 0.
+        stop (int | None, optional): index after the last vector, None for
+            $3^{n\\_faces}$. Defaults to None.
+
+    Returns:
+        np.ndarray: int8 array of shape (stop - start, n_faces) of -1, 0 and 1
+    """
+    if stop is None:
+        stop = 3**n_faces
+    indices = np.arange(start, stop, dtype=np.int64).reshape(-1, 1)
+    powers = 3 ** np.arange(n_faces - 1, -1, -1, dtype=np.int64)
+    return ((indices // powers) % 3 - 1).astype(np.int8)
 
-    vertices_in = np.array(vertices_in)
-    vertices_mid = np.array(vertices_mid)
-
-    masks_tensor_mid = np.zeros((len(vertices_mid), n_faces, n_faces), dtype=int)
-    for v in vertices_mid:
-        for f1 in range(n_faces):
-            for f2 in range(f1, n_faces):
-                if v in faces_matrix[f1][f2]:
-                    vertex_index = np.nonzero(vertices_mid == v)[0][0]
-                    masks_tensor_mid[vertex_index][f1][f2] = 1
-                    masks_tensor_mid[vertex_index][f2][f1] = 1
-
-    masks_tensor_in = np.zeros((len(vertices_in), n_faces, n_faces), dtype=int)
-    for v in vertices_in:
-        for f1 in range(n_faces):
-            for f2 in range(f1, n_faces):
-                if v in faces_matrix[f1][f2]:
-                    vertex_index = np.nonzero(vertices_in == v)[0][0]
-                    masks_tensor_in[vertex_index][f1][f2] = 1
-                    masks_tensor_in[vertex_index][f2][f1] = 1
-
-    all_sigma_mid = itertools.product([-1, 1], repeat=len(vertices_mid))
 
+def quadratic_forms_f3(masks_tensor: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    Values $x^T \\cdot masks[k] \\cdot x$ mod 3 for every mask and every vector $x$
+
+    Args:
+        masks_tensor (np.ndarray): masks of vertices, see `build_masks_tensor`
+        x (np.ndarray): array of shape (K, n_faces)
+
+    Returns:
+        np.ndarray: int8 array of shape (len(masks_tensor), K) with values 0, 1, 2
+    """
+    values = np.zeros((len(masks_tensor), len(x)), dtype=np.int8)
+    for k, mask in enumerate(masks_tensor):
+        rows, cols = np.nonzero(mask)
+        q = np.zeros(len(x), dtype=np.int64)
+        for i, j in zip(rows.tolist(), cols.tolist()):
+            q += mask[i, j] * x[:, i].astype(np.int64) * x[:, j]
+        values[k] = q % 3
+    return values
+
+
+def _s_values_shard(
+    masks_tensor_in: np.ndarray, masks_tensor_mid: np.ndarray, start: int, stop: int
+) -> List[Cyclotomic3]:
+    """
+    S-values for vectors of spins of `vertices_mid` from `start` to `stop`,
+    see `calc_s_values`.
+
+    Faces Matrix is $M = M_{mid} + \\sum_{v \\in in} \\sigma_v \\cdot masks[v]$, so
+    $\\chi(x^T M x) = \\chi(x^T M_{mid} x) \\prod_{v \\in in} \\chi(\\sigma_v q_v(x))$,
+    where $q_v(x) = x^T \\cdot masks[v] \\cdot x$, and the sum over spins
+    of `vertices_in` factorizes:
+    $$
+    \\sum_{\\sigma_{in}} \\chi(x^T M x) = \\chi(x^T M_{mid} x) \\prod_{v \\in in}
+        \\left( \\chi(q_v(x)) + \\chi(-q_v(x)) \\right),
+    $$
+    each factor is 2 if $q_v(x) = 0$ and $\\omega + \\omega^2 = -1$ otherwise.
+    This is calculated for all vectors $x$ at once.
+    """
     results = []
+    for values in _iter_s_values(masks_tensor_in, masks_tensor_mid, start, stop):
+        results.extend(values)
+    return results
 
-    for sigma_mid in all_sigma_mid:
 
-        sigma_mid = np.array(sigma_mid).reshape(-1, 1, 1)
-        faces_matrix_filled_mid = np.sum(masks_tensor_mid * sigma_mid, axis=0) % 3
+def _s_values_factors(
+    masks_tensor_in: np.ndarray, masks_tensor_mid: np.ndarray, start: int, stop: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Factors of S-values for vectors $x$ with indices from `start` to `stop`
+    (see `all_face_vectors`): the sums over spins of `vertices_in` without
+    $\\chi(x^T M_{mid} x)$, and the forms $q_v(x)$ of `vertices_mid`,
+    see `_s_values_shard`
+    """
+    n_faces = masks_tensor_in.shape[1]
+    n_vertices_in = masks_tensor_in.shape[0]
 
-        all_x = itertools.product([-1, 0, 1], repeat=n_faces)
-        for x in all_x:
-            x = np.array(x).reshape(-1, 1)
+    x = all_face_vectors(n_faces, start, stop)
 
-            s = 0
-            all_sigma_in = itertools.product([-1, 1], repeat=len(vertices_in))
-            for sigma_in in all_sigma_in:
-                sigma_in = np.array(sigma_in).reshape(-1, 1, 1)
-                faces_matrix_filled_in = np.sum(masks_tensor_in * sigma_in, axis=0)
+    n_zero_forms = np.count_nonzero(quadratic_forms_f3(masks_tensor_in, x) == 0, axis=0)
+    sums_in = np.left_shift(np.int64(1), n_zero_forms) * np.where(
+        (n_vertices_in - n_zero_forms) % 2 == 1, -1, 1
+    )
+    forms_mid = quadratic_forms_f3(masks_tensor_mid, x).astype(np.int64)
+    return sums_in, forms_mid
+
+
+def _iter_s_values(
+    masks_tensor_in: np.ndarray,
+    masks_tensor_mid: np.ndarray,
+    start: int,
+    stop: int,
+    chunk_size: int | None = None,
+) -> Iterator[List[Cyclotomic3]]:
+    """
+    S-values for every vector of spins of `vertices_mid` from `start` to `stop`,
+    see `_s_values_shard`, in chunks of at most `chunk_size` vectors $x$
+    (None for all $3^{n\\_faces}$ vectors at once). With several chunks
+    the factors are recalculated for every vector of spins, so memory
+    is bounded by the chunk size.
+    """
+    n_faces = masks_tensor_in.shape[1]
+    n_vertices_mid = masks_tensor_mid.shape[0]
+    n_x = 3**n_faces
+    chunk_size = n_x if chunk_size is None else max(1, chunk_size)
+    x_chunks = [
+        (x_start, min(x_start + chunk_size, n_x))
+        for x_start in range(0, n_x, chunk_size)
+    ]
+
+    factors = None
+    if len(x_chunks) == 1:
+        factors = _s_values_factors(masks_tensor_in, masks_tensor_mid, 0, n_x)
 
-                faces_matrix_filled = (
-                    faces_matrix_filled_in + faces_matrix_filled_mid
-                ) % 3
+    values = {}
 
-                s += calc_chi((x.T @ faces_matrix_filled @ x)[0][0])
+    for sigma_mid_index in range(start, stop):
+        sigma_mid = np.array(sigma_from_index(sigma_mid_index, n_vertices_mid))
+        for x_start, x_stop in x_chunks:
+            if factors is None:
+                sums_in, forms_mid = _s_values_factors(
+                    masks_tensor_in, masks_tensor_mid, x_start, x_stop
+                )
+            else:
+                sums_in, forms_mid = factors
+            chi_arguments = (sigma_mid @ forms_mid) % 3 if n_vertices_mid else 0
+
+            codes = 3 * sums_in + chi_arguments
+            results = []
+            for code in codes.tolist():
+                if code not in values:
+                    values[code] = chi(code % 3) * (code // 3)
+                results.append(values[code])
+            yield results
+
+
+def calc_s_values(
+    faces_matrix: List[List[List[int]]],
+    vertices_in: List[int],
+    vertices_mid: List[int],
+    n_workers: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> List[Any]:
+    vertices_in.sort()
+    vertices_mid.sort()
 
-            s = sympy.nsimplify(s)
+    masks_tensor_in = build_masks_tensor(faces_matrix, vertices_in)
+    masks_tensor_mid = build_masks_tensor(faces_matrix, vertices_mid)
 
-            results.append(s)
+    results = []
+    for shard_results in map_shards(
+        _s_values_shard,
+        len(vertices_mid),
+        (masks_tensor_in, masks_tensor_mid),
+        n_workers,
+        progress,
+    ):
+        results.extend(shard_results)
 
     return results
+
+
+def iter_s_values(
+    faces_matrix: List[List[List[int]]],
+    vertices_in: List[int],
+    vertices_mid: List[int],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[List[Any]]:
+    """
+    Calculate the same values as `calc_s_values` in the same order, in chunks
+    of at most `chunk_size` values: the $3^{n\\_faces}$ values of every vector
+    of spins of `vertices_mid` are split into consecutive chunks.
+    """
+    vertices_in.sort()
+    vertices_mid.sort()
+
+    masks_tensor_in = build_masks_tensor(faces_matrix, vertices_in)
+    masks_tensor_mid = build_masks_tensor(faces_matrix, vertices_mid)
+
+    yield from _iter_s_values(
+        masks_tensor_in, masks_tensor_mid, 0, 2 ** len(vertices_mid), chunk_size
+    )
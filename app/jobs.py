@@ -0,0 +1,219 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.executor import call_in_process
+from app.parallel import WorkerBudget
+
+
+# number of jobs that are calculated at the same time
+DEFAULT_JOB_WORKERS = int(os.environ.get("ALPHA_JOB_WORKERS", 2))
+
+# finished jobs are forgotten when there are more than this number of them
+MAX_FINISHED_JOBS = int(os.environ.get("ALPHA_MAX_FINISHED_JOBS", 100))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """
+    Raised from the progress callback of a job that has been cancelled
+    """
+
+
+class JobError(Exception):
+    """
+    Calculation of a job failed, `data` is returned to the client
+    together with the message
+    """
+
+    def __init__(self, message: str, data: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.message = message
+        self.data = data or {}
+
+    def __reduce__(self):
+        # jobs and requests are calculated in other processes, keep `data`
+        return JobError, (self.message, self.data)
+
+
+class Job:
+    """
+    State of one background calculation.
+
+    `processed` and `total` count vectors of spins, they are updated by the
+    calculation through `report_progress`.
+    """
+
+    def __init__(self, method: str, function: Callable[..., Any]):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.function = function
+        self.status = QUEUED
+        self.processed = 0
+        self.total = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    def report_progress(self, processed: int, total: int) -> None:
+        """
+        Progress callback of the calculation, see `app.parallel.map_shards`
+        and `app.executor.call_in_process`
+
+        Raises:
+            JobCancelled: if the job has been cancelled, so the calculation
+                stops after the current shard
+        """
+        self.processed = processed
+        self.total = total
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def eta(self) -> Optional[float]:
+        """
+        Estimated number of seconds left, assuming all vectors of spins take
+        the same time; None if it cannot be estimated yet
+        """
+        if self.status != RUNNING or not self.processed or not self.total:
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed * (self.total - self.processed) / self.processed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "method": self.method,
+            "status": self.status,
+            "processed": self.processed,
+            "total": self.total,
+            "eta": self.eta(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Bounded queue of background jobs: at most `max_workers` jobs are calculated
+    at the same time, the others wait in the queue. Only the last
+    `max_finished_jobs` finished jobs are kept.
+
+    Every job is calculated in its own process (see
+    `app.executor.call_in_process`), so it does not compete with the server
+    for the GIL and can be killed; threads of the queue only wait for them.
+    Worker processes of `app.parallel` are taken from `budget`.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_JOB_WORKERS,
+        max_finished_jobs: int = MAX_FINISHED_JOBS,
+        budget: Optional[WorkerBudget] = None,
+    ):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="alpha-job"
+        )
+        self.max_finished_jobs = max_finished_jobs
+        self.budget = budget
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, method: str, function: Callable[..., Any]) -> Job:
+        """
+        Put a job to the queue
+
+        Args:
+            method (str): name of the calculation, only for the client
+            function (Callable[..., Any]): called with the progress callback
+                (see `Job.report_progress`), returns a JSON-serializable result
+
+        Returns:
+            Job: the new job
+        """
+        job = Job(method, function)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._forget_finished()
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job: a queued job is never started, a running one stops after
+        its current shard (its process is killed if it does not stop
+        in `app.executor.STOP_GRACE_SECONDS`). Finished jobs are not changed.
+
+        Returns:
+            Optional[Job]: the job, None if it does not exist
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status in FINISHED_STATUSES:
+                return job
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+        return job
+
+    def _run(self, job: Job) -> None:
+        with self.lock:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+
+        try:
+            result = call_in_process(
+                job.function, progress=job.report_progress, budget=self.budget
+            )
+        except JobCancelled:
+            with self.lock:
+                self._finish(job, CANCELLED)
+        except JobError as e:
+            with self.lock:
+                job.error = {"message": e.message, **e.data}
+                self._finish(job, FAILED)
+        except Exception as e:
+            with self.lock:
+                job.error = {"message": f"{type(e).__name__}: {e}"}
+                self._finish(job, FAILED)
+        else:
+            with self.lock:
+                job.result = result
+                self._finish(job, DONE)
+
+    def _finish(self, job: Job, job_status: str) -> None:
+        job.status = job_status
+        job.finished_at = time.time()
+        job.function = None
+        self._forget_finished()
+
+    def _forget_finished(self) -> None:
+        finished = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.status in FINISHED_STATUSES
+        ]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
@@ -1,27 +1,89 @@
 import os
+import json
+import asyncio
 import pathlib
-from typing import List, Optional, Dict
+import threading
+from contextlib import asynccontextmanager
+from typing import (
+    List,
+    Optional,
+    Dict,
+    Iterator,
+    Any,
+    Callable,
+    Literal,
+    Union,
+    Tuple,
+)
 
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, Header
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi import status
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError, model_validator
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.graph import (
     calc_vertex_positions,
     find_faces_in_graph,
+    graph_from_edges,
+    graph_from_adjacency_matrix,
+    planar_embedding,
+    find_faces_in_embedding,
     build_faces_matrix,
+    build_vertex_faces,
+    vertex_faces_to_faces,
+    vertex_faces_to_faces_matrix,
     calc_tait_0_in_detail,
     calc_tait_0_aggregated,
     calc_tait_0_dual_chromatic,
     calc_tait_0_fixed_in_detail,
+    calc_tait_0_fixed_sweep,
     faces_matrix_to_dual_adjacency_matrix,
     calc_s_values,
     calc_heawood,
     calc_heawood_fixed,
+    iter_tait_0_in_detail,
+    iter_s_values,
+    iter_heawood,
+    to_tait_0,
+    DEFAULT_CHUNK_SIZE,
+)
+from app.batch import process_graph_records
+from app.binary import BINARY_MEDIA_TYPE, accepts_binary, encode_binary
+from app.parallel import WorkerBudget, default_n_workers
+from app.coloring import calc_tait_0_tree_decomposition
+from app.checkpoint import Checkpoint, checkpoint_for, checkpoint_key
+from app.jobs import JobManager, JobError, DONE, FAILED, CANCELLED
+from app.executor import ComputeExecutor, Overloaded, RequestTimeout
+from app.estimate import (
+    get_calibration,
+    estimate_tait_0,
+    estimate_tait_0_fixed,
+    estimate_tait_0_fixed_sweep,
+    estimate_s_values,
+    estimate_heawood,
+    estimate_batch,
+    admission_action,
+    DOWNGRADE,
+    JOB,
+    REJECT,
+)
+from app.cache import (
+    open_default_cache,
+    cached_call,
+    faces_matrix_structure,
+    faces_structure,
+    dual_graph_structure,
+    sigma_index_permutation,
+    face_vector_index_permutation,
+    permute_lists,
 )
 
 
@@ -34,39 +96,167 @@ class FacesRequest(BaseModel):
     positions: List[List[float]]
 
 
+class EmbeddingFacesRequest(BaseModel):
+    adjacency_matrix: Optional[List[List[int]]] = None
+    edges: Optional[List[List[int]]] = None
+    n_vertices: Optional[int] = None
+
+
 class FacesMatrixRequest(BaseModel):
     faces: List[List[int]]
+    compact: bool = False
+
+
+class FacesMatrixInput(BaseModel):
+    """
+    Faces Matrix either in the legacy form `faces_matrix` or in the compact form
+    `vertex_faces` (three faces of every vertex, see `build_vertex_faces`);
+    after validation `faces_matrix` is always set
+    """
+
+    faces_matrix: Optional[List[List[List[int]]]] = None
+    vertex_faces: Optional[List[List[int]]] = None
+
+    @model_validator(mode="after")
+    def restore_faces_matrix(self):
+        if (self.faces_matrix is None) == (self.vertex_faces is None):
+            raise ValueError(
+                "Exactly one of `faces_matrix` and `vertex_faces` parameters must be non-empty"
+            )
+        if self.faces_matrix is None:
+            self.faces_matrix = vertex_faces_to_faces_matrix(self.vertex_faces)
+        return self
 
 
-class CalcTait0Request(BaseModel):
-    faces_matrix: List[List[List[int]]]
+class CalcTait0Request(FacesMatrixInput):
     detail: bool = True
+    symmetry: bool = False
+    method: Literal["alpha", "tree_decomposition"] = "alpha"
+    # seconds between checkpoints of the aggregated enumeration, None disables them
+    checkpoint_interval: Optional[float] = None
+
+
+class CalcTait0StreamRequest(FacesMatrixInput):
+    chunk_size: int = DEFAULT_CHUNK_SIZE
 
 
-class CalcTait0FixedRequest(BaseModel):
-    faces_matrix: List[List[List[int]]]
+class CalcTait0FixedRequest(FacesMatrixInput):
     fixed_spins: Dict[int, int]
 
 
+class CalcTait0FixedSweepRequest(FacesMatrixInput):
+    # all assignments of spins of these vertices are calculated
+    vertices: List[int]
+
+
 class CalcTait0DualChromatic(BaseModel):
     faces_matrix: Optional[List[List[List[int]]]] = None
+    vertex_faces: Optional[List[List[int]]] = None
     dual_adjacency_matrix: Optional[List[List[List[int]]]] = None
 
 
-class FindSValuesRequest(BaseModel):
-    faces_matrix: List[List[List[int]]]
+class FindSValuesRequest(FacesMatrixInput):
     vertices_in: List[int]
     vertices_mid: List[int]
+    # values per record of the stream
+    chunk_size: int = DEFAULT_CHUNK_SIZE
 
 
 class HeawoodRequest(BaseModel):
-    faces: List[List[int]]
+    faces: Optional[List[List[int]]] = None
+    vertex_faces: Optional[List[List[int]]] = None
     fixed_spins: Optional[Dict[int, int]] = None
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    count_only: bool = False
+    # seconds between checkpoints of the enumeration, None disables them
+    checkpoint_interval: Optional[float] = None
+
+    @model_validator(mode="after")
+    def restore_faces(self):
+        if (self.faces is None) == (self.vertex_faces is None):
+            raise ValueError(
+                "Exactly one of `faces` and `vertex_faces` parameters must be non-empty"
+            )
+        if self.faces is None:
+            self.faces = vertex_faces_to_faces(self.vertex_faces)
+        return self
+
+
+class BatchRequest(BaseModel):
+    graphs: List[Union[str, Dict[str, Any], List[List[int]]]]
+    symmetry: bool = False
+
+
+class JobRequest(BaseModel):
+    method: Literal[
+        "calc_tait_0",
+        "calc_tait_0_fixed",
+        "calc_tait_0_fixed_sweep",
+        "calc_s_values",
+        "calc_heawood",
+        "batch",
+    ]
+    params: Dict[str, Any]
+
+
+class EstimateRequest(BaseModel):
+    method: Literal[
+        "calc_tait_0",
+        "calc_tait_0_fixed",
+        "calc_tait_0_fixed_sweep",
+        "calc_s_values",
+        "calc_heawood",
+        "batch",
+    ]
+    params: Dict[str, Any]
+
+
+def compute_response(
+    content: Dict[str, Any], accept: Optional[str]
+) -> Union[Dict[str, Any], Response]:
+    """
+    Response of a calculation endpoint: JSON, or packed lists (see
+    `app.binary.encode_binary`) if the client accepts `BINARY_MEDIA_TYPE`
+    """
+    if accepts_binary(accept):
+        return Response(encode_binary(content), media_type=BINARY_MEDIA_TYPE)
+    return content
+
+
+async def ndjson_response(
+    route: str, records: Callable[[], Iterator[Dict]]
+) -> StreamingResponse:
+    """
+    Stream records of the generator `records()` as NDJSON (one JSON object
+    per line) while they are calculated in a separate process, with the limits
+    of the route (see `app.executor.ComputeExecutor.stream`). The status
+    cannot change after the stream has started, so a failure or a timeout
+    is reported by the last record of type "error"
+    """
+    stream = await compute_executor.stream(route, records)
+
+    async def lines():
+        try:
+            async for record in stream:
+                yield json.dumps(record) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 BASE_DIR = pathlib.Path(os.path.abspath(__file__)).parent.parent
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # calibrate the cost estimator in the background, see `app.estimate.calibrate`
+    threading.Thread(target=get_calibration, daemon=True).start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -79,6 +269,31 @@ app.mount("/static", StaticFiles(directory=BASE_DIR / "build/static"), name="sta
 
 templates = Jinja2Templates(directory=BASE_DIR / "build/pages")
 
+# worker processes of `app.parallel` shared by all requests and jobs
+worker_budget = WorkerBudget()
+
+job_manager = JobManager(budget=worker_budget)
+
+compute_executor = ComputeExecutor(budget=worker_budget)
+
+result_cache = open_default_cache()
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, e: Overloaded):
+    return JSONResponse(
+        content={"status": "error", "data": {"message": str(e)}},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@app.exception_handler(RequestTimeout)
+async def request_timeout_handler(request: Request, e: RequestTimeout):
+    return JSONResponse(
+        content={"status": "error", "data": {"message": str(e)}},
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+    )
+
 
 # Static HTML page endpoint
 @app.get("/", response_class=HTMLResponse)
@@ -105,7 +320,9 @@ async def calc_positions(request: PositionsRequest):
     returns status: "error"
     """
     try:
-        pos_list = calc_vertex_positions(request.adjacency_matrix)
+        pos_list = await compute_executor.run(
+            "positions", calc_vertex_positions, request.adjacency_matrix
+        )
         return {"status": "ok", "data": {"positions": pos_list}}
     except ValueError:
         return JSONResponse(
@@ -118,86 +335,150 @@ async def calc_positions(request: PositionsRequest):
 async def find_faces(request: FacesRequest):
     adjacency_matrix = request.adjacency_matrix
     positions = request.positions
-    faces = find_faces_in_graph(adjacency_matrix, positions)
+    faces = await compute_executor.run(
+        "find_faces", find_faces_in_graph, adjacency_matrix, positions
+    )
+    return {"status": "ok", "data": {"faces": faces}}
+
+
+@app.post("/api/v1/find_faces_embedding")
+async def find_faces_embedding(request: EmbeddingFacesRequest):
+    """
+    Find faces of a planar graph from its combinatorial planar embedding,
+    without vertex positions. The graph is given either by `adjacency_matrix`
+    or by a list of `edges` (and optionally `n_vertices`)
+    """
+    if (request.adjacency_matrix is None) == (request.edges is None):
+        return JSONResponse(
+            content={
+                "status": "error",
+                "data": {
+                    "message": "Exactly one of `adjacency_matrix` and `edges` parameters must be non-empty"
+                },
+            },
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    if request.edges is None:
+        graph = graph_from_adjacency_matrix(request.adjacency_matrix)
+    else:
+        graph = graph_from_edges(request.edges, request.n_vertices)
+
+    try:
+        faces = await compute_executor.run(
+            "find_faces_embedding",
+            lambda: find_faces_in_embedding(planar_embedding(graph)),
+        )
+    except ValueError:
+        return JSONResponse(
+            content={"status": "error", "data": {"message": "Graph is not planar"}},
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
     return {"status": "ok", "data": {"faces": faces}}
 
 
 @app.post("/api/v1/find_faces_matrix")
 async def find_faces_matrix(request: FacesMatrixRequest):
+    """
+    Build Faces Matrix from faces, or its compact form `vertex_faces`
+    (three faces of every vertex) if `compact`
+    """
+    if request.compact:
+        try:
+            vertex_faces = build_vertex_faces(request.faces)
+        except ValueError as e:
+            return JSONResponse(
+                content={"status": "error", "data": {"message": str(e)}},
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        return {"status": "ok", "data": {"vertex_faces": vertex_faces.tolist()}}
     faces_matrix = build_faces_matrix(request.faces)
     return {"status": "ok", "data": {"faces_matrix": faces_matrix}}
 
 
-@app.post("/api/v1/calc_tait_0")
-async def calc_tait_0(request: CalcTait0Request):
+def _request_checkpoint(method: str, request: BaseModel) -> Optional[Checkpoint]:
+    """
+    Checkpoint of a request with `checkpoint_interval`, named by its parameters,
+    so the same request submitted again resumes the enumeration
+    """
+    if request.checkpoint_interval is None:
+        return None
+    params = request.model_dump(exclude={"checkpoint_interval"})
+    return checkpoint_for(
+        checkpoint_key(method, params), interval=request.checkpoint_interval
+    )
+
+
+def _tait_0_data(
+    request: CalcTait0Request, progress: Callable[[int, int], None] | None = None
+) -> Dict[str, Any]:
     faces_matrix = request.faces_matrix
-    detail = request.detail
-    if detail:
+    if request.method == "tree_decomposition":
+        tait_0, treewidth = calc_tait_0_tree_decomposition(faces_matrix)
+        return {"tait_0": tait_0, "treewidth": treewidth}
+    if request.detail:
         tait_0, gauss_sum_list, det_list, rank_list = calc_tait_0_in_detail(
-            faces_matrix
+            faces_matrix, progress=progress
         )
         gauss_sum_list = [str(val) for val in gauss_sum_list]
         return {
-            "status": "ok",
-            "data": {
-                "tait_0": tait_0,
-                "gauss_sum_list": gauss_sum_list,
-                "det_list": det_list,
-                "rank_list": rank_list,
-            },
-        }
-    else:
-        (
-            n_tait_0,
-            n_even_ranks,
-            n_odd_ranks,
-            n_zero_ranks,
-            det_minors,
-            rank_list,
-            gauss_sums,
-            nums,
-            total_gauss_sums,
-        ) = calc_tait_0_aggregated(faces_matrix)
-        gauss_sums = [str(val) for val in gauss_sums]
-        total_gauss_sums = [str(val) for val in total_gauss_sums]
-        return {
-            "status": "ok",
-            "data": {
-                "tait_0": n_tait_0,
-                "n_even_ranks": n_even_ranks,
-                "n_odd_ranks": n_odd_ranks,
-                "n_zero_ranks": n_zero_ranks,
-                "det_list": det_minors,
-                "rank_list": rank_list,
-                "gauss_sum_list": gauss_sums,
-                "num_list": nums,
-                "total_gauss_sum_list": total_gauss_sums,
-            },
+            "tait_0": tait_0,
+            "gauss_sum_list": gauss_sum_list,
+            "det_list": det_list,
+            "rank_list": rank_list,
         }
+    (
+        n_tait_0,
+        n_even_ranks,
+        n_odd_ranks,
+        n_zero_ranks,
+        det_minors,
+        rank_list,
+        gauss_sums,
+        nums,
+        total_gauss_sums,
+    ) = calc_tait_0_aggregated(
+        faces_matrix,
+        symmetry=request.symmetry,
+        progress=progress,
+        checkpoint=_request_checkpoint("calc_tait_0", request),
+    )
+    gauss_sums = [str(val) for val in gauss_sums]
+    total_gauss_sums = [str(val) for val in total_gauss_sums]
+    return {
+        "tait_0": n_tait_0,
+        "n_even_ranks": n_even_ranks,
+        "n_odd_ranks": n_odd_ranks,
+        "n_zero_ranks": n_zero_ranks,
+        "det_list": det_minors,
+        "rank_list": rank_list,
+        "gauss_sum_list": gauss_sums,
+        "num_list": nums,
+        "total_gauss_sum_list": total_gauss_sums,
+    }
 
 
-@app.post("/api/v1/calc_tait_0_fixed")
-async def calc_tait_0_fixed(request: CalcTait0FixedRequest):
-    faces_matrix = request.faces_matrix
-    fixed_spins = request.fixed_spins
-
+def _tait_0_fixed_data(
+    request: CalcTait0FixedRequest,
+    progress: Callable[[int, int], None] | None = None,
+) -> Dict[str, Any]:
+    """
+    Raises:
+        JobError: if the system is inconsistent for some vector of spins,
+            details are in `data`
+    """
     is_consistent, calculation_details = calc_tait_0_fixed_in_detail(
-        faces_matrix, fixed_spins
+        request.faces_matrix, request.fixed_spins, progress=progress
     )
     if not is_consistent:
         sigma, augmented_matrix, base_rank, augmented_matrix_rank = calculation_details
-        return JSONResponse(
-            content={
-                "status": "error",
-                "data": {
-                    "message": "System is inconsistent",
-                    "sigma": sigma,
-                    "augmented_matrix": augmented_matrix,
-                    "base_rank": base_rank,
-                    "augmented_matrix_rank": augmented_matrix_rank,
-                },
+        raise JobError(
+            "System is inconsistent",
+            {
+                "sigma": sigma,
+                "augmented_matrix": augmented_matrix,
+                "base_rank": base_rank,
+                "augmented_matrix_rank": augmented_matrix_rank,
             },
-            status_code=status.HTTP_412_PRECONDITION_FAILED,
         )
     (
         tait_0,
@@ -213,67 +494,669 @@ async def calc_tait_0_fixed(request: CalcTait0FixedRequest):
     chi_list = [str(v) for v in chi_list]
     term_list = [str(v) for v in term_list]
     return {
-        "status": "ok",
-        "data": {
-            "tait_0": tait_0,
-            "det_list": det_minor_list,
-            "rank_list": rank_list,
-            "gauss_sum_list": gauss_sum_list,
-            "bordered_det_list": bordered_det_list,
-            "chi_list": chi_list,
-            "term_list": term_list,
-        },
+        "tait_0": tait_0,
+        "det_list": det_minor_list,
+        "rank_list": rank_list,
+        "gauss_sum_list": gauss_sum_list,
+        "bordered_det_list": bordered_det_list,
+        "chi_list": chi_list,
+        "term_list": term_list,
     }
 
 
+def tait_0_fixed_sweep_data(
+    request: CalcTait0FixedSweepRequest,
+    progress: Callable[[int, int], None] | None = None,
+) -> Dict[str, Any]:
+    spins_list, consistent_list, tait_0_list = calc_tait_0_fixed_sweep(
+        request.faces_matrix, request.vertices, progress=progress
+    )
+    return {
+        "vertices": request.vertices,
+        "spins_list": spins_list,
+        "is_consistent_list": consistent_list,
+        "tait_0_list": tait_0_list,
+    }
+
+
+def _s_values_data(
+    request: FindSValuesRequest, progress: Callable[[int, int], None] | None = None
+) -> Dict[str, Any]:
+    results = calc_s_values(
+        request.faces_matrix,
+        vertices_in=request.vertices_in,
+        vertices_mid=request.vertices_mid,
+        progress=progress,
+    )
+    return {"s": [str(v) for v in results]}
+
+
+def _heawood_data(
+    request: HeawoodRequest, progress: Callable[[int, int], None] | None = None
+) -> Dict[str, Any]:
+    fixed_spins = request.fixed_spins
+    checkpoint = _request_checkpoint("calc_heawood", request)
+    if fixed_spins is None:
+        configurations = calc_heawood(
+            request.faces,
+            progress=progress,
+            count_only=request.count_only,
+            checkpoint=checkpoint,
+        )
+    else:
+        configurations = calc_heawood_fixed(
+            request.faces,
+            fixed_spins,
+            progress=progress,
+            count_only=request.count_only,
+            checkpoint=checkpoint,
+        )
+    if request.count_only:
+        return {"count": configurations}
+    return {"configurations": configurations}
+
+
+TAIT_0_DETAIL_FIELDS = ("gauss_sum_list", "det_list", "rank_list")
+
+TAIT_0_FIXED_FIELDS = (
+    "det_list",
+    "rank_list",
+    "gauss_sum_list",
+    "bordered_det_list",
+    "chi_list",
+    "term_list",
+)
+
+
+def tait_0_data(
+    request: CalcTait0Request, progress: Callable[[int, int], None] | None = None
+) -> Dict[str, Any]:
+    n_vertices = 2 * (len(request.faces_matrix) - 2)
+    vertices = list(range(n_vertices))
+
+    def remap(result, mapping, face_mapping):
+        # aggregated rows keep the order of the labeling they were calculated for
+        if request.method != "alpha" or not request.detail:
+            return result
+        perm = sigma_index_permutation(vertices, vertices, mapping)
+        return permute_lists(result, TAIT_0_DETAIL_FIELDS, perm)
+
+    return cached_call(
+        result_cache,
+        "calc_tait_0",
+        {"detail": request.detail, "method": request.method},
+        faces_matrix_structure(request.faces_matrix, n_vertices),
+        lambda: _tait_0_data(request, progress),
+        remap,
+    )
+
+
+def tait_0_fixed_data(
+    request: CalcTait0FixedRequest,
+    progress: Callable[[int, int], None] | None = None,
+) -> Dict[str, Any]:
+    n_vertices = 2 * (len(request.faces_matrix) - 2)
+    fixed_spins = request.fixed_spins
+    free_vertices = [v for v in range(n_vertices) if v not in fixed_spins]
+
+    def remap(result, mapping, face_mapping):
+        stored_free_vertices = sorted(mapping[v] for v in free_vertices)
+        perm = sigma_index_permutation(free_vertices, stored_free_vertices, mapping)
+        return permute_lists(result, TAIT_0_FIXED_FIELDS, perm)
+
+    return cached_call(
+        result_cache,
+        "calc_tait_0_fixed",
+        {},
+        faces_matrix_structure(
+            request.faces_matrix,
+            n_vertices,
+            {v: f":{value}" for v, value in fixed_spins.items()},
+        ),
+        lambda: _tait_0_fixed_data(request, progress),
+        remap,
+    )
+
+
+def s_values_data(
+    request: FindSValuesRequest, progress: Callable[[int, int], None] | None = None
+) -> Dict[str, Any]:
+    n_faces = len(request.faces_matrix)
+    n_vertices = 2 * (n_faces - 2)
+    vertex_labels = {v: ":in" for v in request.vertices_in}
+    vertex_labels.update({v: ":mid" for v in request.vertices_mid})
+    vertices_mid = sorted(request.vertices_mid)
+
+    def remap(result, mapping, face_mapping):
+        # values are listed for every vector of spins and every vector x over faces
+        stored_vertices_mid = sorted(mapping[v] for v in vertices_mid)
+        perm_sigma = sigma_index_permutation(
+            vertices_mid, stored_vertices_mid, mapping
+        )
+        perm_x = face_vector_index_permutation(n_faces, face_mapping)
+        perm = (perm_sigma.reshape(-1, 1) * len(perm_x) + perm_x).reshape(-1)
+        return permute_lists(result, ("s",), perm)
+
+    return cached_call(
+        result_cache,
+        "calc_s_values",
+        {},
+        faces_matrix_structure(request.faces_matrix, n_vertices, vertex_labels),
+        lambda: _s_values_data(request, progress),
+        remap,
+    )
+
+
+def heawood_data(
+    request: HeawoodRequest, progress: Callable[[int, int], None] | None = None
+) -> Dict[str, Any]:
+    n_vertices = 2 * (len(request.faces) - 2)
+    fixed_spins = request.fixed_spins or {}
+
+    def remap(result, mapping, face_mapping):
+        if request.count_only:
+            return result
+        # configurations are sorted by the index of the vector of spins
+        configurations = sorted(
+            [configuration[mapping[v]] for v in range(n_vertices)]
+            for configuration in result["configurations"]
+        )
+        return {"configurations": configurations}
+
+    return cached_call(
+        result_cache,
+        "calc_heawood",
+        {"count_only": request.count_only},
+        faces_structure(
+            request.faces,
+            n_vertices,
+            {v: f":{value}" for v, value in fixed_spins.items()},
+        ),
+        lambda: _heawood_data(request, progress),
+        remap,
+    )
+
+
+def tait_0_dual_chromatic_data(
+    dual_adjacency_matrix: List[List[int]],
+) -> Dict[str, Any]:
+    return cached_call(
+        result_cache,
+        "calc_tait_0_dual_chromatic",
+        {},
+        dual_graph_structure(dual_adjacency_matrix),
+        lambda: {"tait_0": calc_tait_0_dual_chromatic(dual_adjacency_matrix)},
+    )
+
+
+def batch_data(
+    request: BatchRequest, progress: Callable[[int, int], None] | None = None
+) -> Dict[str, Any]:
+    results = process_graph_records(
+        list(enumerate(request.graphs)),
+        symmetry=request.symmetry,
+        n_workers=default_n_workers(),
+        progress=progress,
+    )
+    return {"results": results}
+
+
+# method of a job: request model and function that calculates the data
+JOB_METHODS = {
+    "calc_tait_0": (CalcTait0Request, tait_0_data),
+    "calc_tait_0_fixed": (CalcTait0FixedRequest, tait_0_fixed_data),
+    "calc_tait_0_fixed_sweep": (CalcTait0FixedSweepRequest, tait_0_fixed_sweep_data),
+    "calc_s_values": (FindSValuesRequest, s_values_data),
+    "calc_heawood": (HeawoodRequest, heawood_data),
+    "batch": (BatchRequest, batch_data),
+}
+
+
+# method of a compute endpoint: function that estimates the cost of its request
+ESTIMATE_METHODS = {
+    "calc_tait_0": lambda request: estimate_tait_0(
+        request.faces_matrix, request.detail, request.symmetry, request.method
+    ),
+    "calc_tait_0_fixed": lambda request: estimate_tait_0_fixed(
+        request.faces_matrix, request.fixed_spins
+    ),
+    "calc_tait_0_fixed_sweep": lambda request: estimate_tait_0_fixed_sweep(
+        request.faces_matrix, request.vertices
+    ),
+    "calc_s_values": lambda request: estimate_s_values(
+        request.faces_matrix, request.vertices_in, request.vertices_mid
+    ),
+    "calc_heawood": lambda request: estimate_heawood(
+        request.faces, request.fixed_spins, request.count_only
+    ),
+    "batch": lambda request: estimate_batch(request.graphs, request.symmetry),
+}
+
+
+def over_budget(admission: Dict[str, Any]) -> JSONResponse:
+    return JSONResponse(
+        content={
+            "status": "error",
+            "data": {
+                "message": "Request exceeds the budget of the server",
+                "admission": admission,
+            },
+        },
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    )
+
+
+def admission_decision(
+    method: str, request: BaseModel
+) -> Tuple[BaseModel, Dict[str, Any]]:
+    """
+    Decide what to do with a request of a compute endpoint, see
+    `app.estimate.admission_action`; a request in detail with too large response
+    is downgraded to aggregated and decided again
+
+    Returns:
+        Tuple[BaseModel, Dict[str, Any]]: request to run and the decision
+            ("action", "downgraded" and "estimate")
+    """
+    estimate = ESTIMATE_METHODS[method](request)
+    can_downgrade = (
+        method == "calc_tait_0" and request.method == "alpha" and request.detail
+    )
+    action = admission_action(estimate, can_downgrade)
+    downgraded = action == DOWNGRADE
+    if downgraded:
+        request = request.model_copy(update={"detail": False})
+        estimate = ESTIMATE_METHODS[method](request)
+        action = admission_action(estimate)
+    return request, {"action": action, "downgraded": downgraded, "estimate": estimate}
+
+
+async def admit(
+    method: str, request: BaseModel, as_job: bool = False
+) -> Tuple[BaseModel, Optional[JSONResponse], Dict[str, Any]]:
+    """
+    Admission control of a compute endpoint, see `admission_decision`: a slow
+    request (or any request `as_job`) is submitted as a job (the response
+    is 202 with the job), a request over the budget is rejected with 413.
+    The estimate (calibration, automorphisms, treewidth) is calculated
+    in a thread, off the event loop.
+
+    Returns:
+        Tuple[BaseModel, Optional[JSONResponse], Dict[str, Any]]: request to run,
+            response to return instead of running it, and the decision
+    """
+    request, admission = await asyncio.to_thread(admission_decision, method, request)
+    if admission["action"] == REJECT:
+        return request, over_budget(admission), admission
+    if as_job:
+        admission = {**admission, "action": JOB}
+    if admission["action"] == JOB:
+        _, data_function = JOB_METHODS[method]
+        job = job_manager.submit(
+            method, lambda progress: data_function(request, progress)
+        )
+        response = JSONResponse(
+            content={"status": "ok", "data": job.to_dict(), "admission": admission},
+            status_code=status.HTTP_202_ACCEPTED,
+        )
+        return request, response, admission
+    return request, None, admission
+
+
+async def admit_stream(method: str, request: BaseModel) -> Optional[JSONResponse]:
+    """
+    Admission control of a streamed endpoint: the response is not held
+    in memory and the stream may be long, so only a request that is too slow
+    even for a job is rejected with 413 (estimated off the event loop, see `admit`)
+
+    Returns:
+        Optional[JSONResponse]: response to return instead of the stream
+    """
+    estimate = await asyncio.to_thread(ESTIMATE_METHODS[method], request)
+    action = admission_action({**estimate, "response_bytes": 0})
+    if action == REJECT:
+        return over_budget(
+            {"action": action, "downgraded": False, "estimate": estimate}
+        )
+    return None
+
+
+@app.post("/api/v1/estimate")
+async def estimate(request: EstimateRequest):
+    """
+    Estimate the number of iterations, seconds and size of the response
+    of a compute endpoint (`method`) for its request body (`params`), and what
+    admission control would do with it ("run", "job" or "reject",
+    possibly after "downgraded" to aggregated)
+    """
+    request_model, _ = JOB_METHODS[request.method]
+    try:
+        params = request_model(**request.params)
+    except ValidationError as e:
+        return JSONResponse(
+            content={
+                "status": "error",
+                "data": {"message": "Invalid params", "errors": e.errors(include_context=False)},
+            },
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    _, admission = await asyncio.to_thread(admission_decision, request.method, params)
+    return {"status": "ok", "data": admission}
+
+
+@app.post("/api/v1/calc_tait_0")
+async def calc_tait_0(
+    request: CalcTait0Request, accept: Optional[str] = Header(default=None)
+):
+    """
+    Calculate the number of Tait colorings with $\\alpha$-representation
+    (`method` "alpha", in detail or aggregated), or by dynamic programming
+    over a tree decomposition of the dual graph (`method` "tree_decomposition"),
+    which is feasible for graphs with hundreds of vertices
+    """
+    request, response, admission = await admit("calc_tait_0", request)
+    if response is not None:
+        return response
+    try:
+        data = await compute_executor.run("calc_tait_0", tait_0_data, request)
+    except ValueError as e:
+        return JSONResponse(
+            content={"status": "error", "data": {"message": str(e)}},
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    return compute_response(
+        {"status": "ok", "data": data, "admission": admission}, accept
+    )
+
+
+@app.post("/api/v1/calc_tait_0_fixed")
+async def calc_tait_0_fixed(
+    request: CalcTait0FixedRequest, accept: Optional[str] = Header(default=None)
+):
+    request, response, admission = await admit("calc_tait_0_fixed", request)
+    if response is not None:
+        return response
+    try:
+        data = await compute_executor.run(
+            "calc_tait_0_fixed", tait_0_fixed_data, request
+        )
+    except JobError as e:
+        return JSONResponse(
+            content={"status": "error", "data": {"message": e.message, **e.data}},
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+        )
+    return compute_response(
+        {"status": "ok", "data": data, "admission": admission}, accept
+    )
+
+
+@app.post("/api/v1/calc_tait_0_fixed_sweep")
+async def sweep_tait_0_fixed(request: CalcTait0FixedSweepRequest):
+    """
+    Calculate `/api/v1/calc_tait_0_fixed` for all $2^k$ assignments of spins
+    of `vertices` in one pass over vectors of free spins: the number of Tait
+    colorings of every assignment, null if its system is inconsistent
+    """
+    request, response, admission = await admit("calc_tait_0_fixed_sweep", request)
+    if response is not None:
+        return response
+    try:
+        data = await compute_executor.run(
+            "calc_tait_0_fixed_sweep", tait_0_fixed_sweep_data, request
+        )
+    except ValueError as e:
+        return JSONResponse(
+            content={"status": "error", "data": {"message": str(e)}},
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    return {"status": "ok", "data": data, "admission": admission}
+
+
 @app.post("/api/v1/calc_tait_0_dual_chromatic")
 async def calc_tait_0_using_dual_chromatic(request: CalcTait0DualChromatic):
     faces_matrix = request.faces_matrix
     dual_adjacency_matrix = request.dual_adjacency_matrix
-    if (faces_matrix is None) == (dual_adjacency_matrix is None):
+    inputs = [faces_matrix, request.vertex_faces, dual_adjacency_matrix]
+    if sum(value is not None for value in inputs) != 1:
         return JSONResponse(
             content={
                 "status": "error",
                 "data": {
-                    "message": "Exactly one of `faces_matrix` and `dual_adjacency_matrix` parameters must be non-empty"
+                    "message": "Exactly one of `faces_matrix`, `vertex_faces` and `dual_adjacency_matrix` parameters must be non-empty"
                 },
             },
             status_code=status.HTTP_400_BAD_REQUEST,
         )
+    if request.vertex_faces is not None:
+        try:
+            faces_matrix = vertex_faces_to_faces_matrix(request.vertex_faces)
+        except ValueError as e:
+            return JSONResponse(
+                content={"status": "error", "data": {"message": str(e)}},
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
     if dual_adjacency_matrix is None:
         dual_adjacency_matrix = faces_matrix_to_dual_adjacency_matrix(faces_matrix)
         print(dual_adjacency_matrix)
 
-    tait_0 = calc_tait_0_dual_chromatic(dual_adjacency_matrix)
-    return {
-        "status": "ok",
-        "data": {"tait_0": tait_0},
-    }
+    data = await compute_executor.run(
+        "calc_tait_0_dual_chromatic", tait_0_dual_chromatic_data, dual_adjacency_matrix
+    )
+    return {"status": "ok", "data": data}
 
 
 @app.post("/api/v1/calc_s_values")
 async def find_s_values(request: FindSValuesRequest):
-    results = calc_s_values(
-        request.faces_matrix,
-        vertices_in=request.vertices_in,
-        vertices_mid=request.vertices_mid,
-    )
-    results = [str(v) for v in results]
-    return {
-        "status": "ok",
-        "data": {"s": results},
-    }
+    request, response, admission = await admit("calc_s_values", request)
+    if response is not None:
+        return response
+    data = await compute_executor.run("calc_s_values", s_values_data, request)
+    return {"status": "ok", "data": data, "admission": admission}
 
 
 @app.post("/api/v1/calc_heawood")
-async def find_heawood(request: HeawoodRequest):
-    fixed_spins = request.fixed_spins
-    if fixed_spins is None:
-        configurations = calc_heawood(request.faces)
-    else:
-        configurations = calc_heawood_fixed(request.faces, fixed_spins)
+async def find_heawood(
+    request: HeawoodRequest, accept: Optional[str] = Header(default=None)
+):
+    request, response, admission = await admit("calc_heawood", request)
+    if response is not None:
+        return response
+    data = await compute_executor.run("calc_heawood", heawood_data, request)
+    return compute_response(
+        {"status": "ok", "data": data, "admission": admission}, accept
+    )
 
-    return {
-        "status": "ok",
-        "data": {"configurations": configurations},
-    }
+
+@app.post("/api/v1/calc_tait_0/stream")
+async def calc_tait_0_stream(request: CalcTait0StreamRequest):
+    """
+    Same as `/api/v1/calc_tait_0` in detail mode, but streamed as NDJSON: records
+    of type "chunk" with lists for consecutive vectors of spins, and the final
+    record of type "summary" with the number of Tait colorings
+    """
+    response = await admit_stream(
+        "calc_tait_0", CalcTait0Request(faces_matrix=request.faces_matrix)
+    )
+    if response is not None:
+        return response
+    chunk_size = max(1, request.chunk_size)
+
+    def records():
+        total = 0
+        n_sigma = 0
+        for offset, gauss_sum_list, det_list, rank_list in iter_tait_0_in_detail(
+            request.faces_matrix, chunk_size
+        ):
+            total += sum(gauss_sum_list)
+            n_sigma += len(gauss_sum_list)
+            yield {
+                "type": "chunk",
+                "offset": offset,
+                "gauss_sum_list": [str(val) for val in gauss_sum_list],
+                "det_list": det_list,
+                "rank_list": rank_list,
+            }
+        yield {"type": "summary", "tait_0": to_tait_0(total), "count": n_sigma}
+
+    return await ndjson_response("calc_tait_0/stream", records)
+
+
+@app.post("/api/v1/calc_s_values/stream")
+async def find_s_values_stream(request: FindSValuesRequest):
+    """
+    Same as `/api/v1/calc_s_values`, but streamed as NDJSON: records of type
+    "chunk" with at most `chunk_size` consecutive values, and the final record
+    of type "summary"
+    """
+    response = await admit_stream("calc_s_values", request)
+    if response is not None:
+        return response
+    chunk_size = max(1, request.chunk_size)
+
+    def records():
+        offset = 0
+        for values in iter_s_values(
+            request.faces_matrix,
+            request.vertices_in,
+            request.vertices_mid,
+            chunk_size,
+        ):
+            yield {"type": "chunk", "offset": offset, "s": [str(v) for v in values]}
+            offset += len(values)
+        yield {"type": "summary", "count": offset}
+
+    return await ndjson_response("calc_s_values/stream", records)
+
+
+@app.post("/api/v1/calc_heawood/stream")
+async def find_heawood_stream(request: HeawoodRequest):
+    """
+    Same as `/api/v1/calc_heawood`, but streamed as NDJSON: records of type "chunk"
+    with configurations found so far, and the final record of type "summary"
+    """
+    response = await admit_stream("calc_heawood", request)
+    if response is not None:
+        return response
+    chunk_size = max(1, request.chunk_size)
+
+    def records():
+        if request.count_only:
+            yield {"type": "summary", **heawood_data(request)}
+            return
+
+        count = 0
+        for configurations in iter_heawood(
+            request.faces, request.fixed_spins, chunk_size
+        ):
+            count += len(configurations)
+            if configurations:
+                yield {"type": "chunk", "configurations": configurations}
+        yield {"type": "summary", "count": count}
+
+    return await ndjson_response("calc_heawood/stream", records)
+
+
+def job_not_found(job_id: str) -> JSONResponse:
+    return JSONResponse(
+        content={
+            "status": "error",
+            "data": {"message": f"Job {job_id} is not found"},
+        },
+        status_code=status.HTTP_404_NOT_FOUND,
+    )
+
+
+@app.post("/api/v1/jobs")
+async def submit_job(request: JobRequest):
+    """
+    Start a long calculation in the background. `method` is the name of one of
+    the calculation endpoints and `params` is its request body. Returns `job_id`
+    to poll `/api/v1/jobs/{job_id}` for progress and fetch the result
+    from `/api/v1/jobs/{job_id}/result`
+    """
+    request_model, data_function = JOB_METHODS[request.method]
+    try:
+        params = request_model(**request.params)
+    except ValidationError as e:
+        return JSONResponse(
+            content={
+                "status": "error",
+                "data": {"message": "Invalid params", "errors": e.errors(include_context=False)},
+            },
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if request.method in ESTIMATE_METHODS:
+        _, admission = await asyncio.to_thread(
+            admission_decision, request.method, params
+        )
+        # jobs are not downgraded, the client asked for this response explicitly
+        if admission["action"] == REJECT or admission["downgraded"]:
+            return over_budget({**admission, "action": REJECT})
+
+    job = job_manager.submit(
+        request.method, lambda progress: data_function(params, progress)
+    )
+    return {"status": "ok", "data": job.to_dict()}
+
+
+@app.get("/api/v1/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status of a job ("queued", "running", "done", "failed" or "cancelled"),
+    number of processed and total vectors of spins, and estimated seconds left
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    return {"status": "ok", "data": job.to_dict()}
+
+
+@app.delete("/api/v1/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    return {"status": "ok", "data": job.to_dict()}
+
+
+@app.get("/api/v1/jobs/{job_id}/result")
+async def get_job_result(job_id: str, accept: Optional[str] = Header(default=None)):
+    """
+    Result of a finished job, in the same format as the response
+    of the corresponding calculation endpoint (also packed, see `compute_response`)
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    if job.status == DONE:
+        return compute_response({"status": "ok", "data": job.result}, accept)
+    if job.status == FAILED:
+        return JSONResponse(
+            content={"status": "error", "data": job.error},
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+        )
+    if job.status == CANCELLED:
+        return JSONResponse(
+            content={"status": "error", "data": {"message": "Job is cancelled"}},
+            status_code=status.HTTP_410_GONE,
+        )
+    return JSONResponse(
+        content={
+            "status": "error",
+            "data": {"message": "Job is not finished", **job.to_dict()},
+        },
+        status_code=status.HTTP_409_CONFLICT,
+    )
+
+
+@app.post("/api/v1/batch")
+async def submit_batch(request: BatchRequest):
+    """
+    Process a list of graphs (see `app.batch.parse_graph_record` for formats):
+    faces, Faces Matrix and aggregated ranks and det' of every graph.
+    Runs as a background job (202), same as `/api/v1/jobs` with method "batch";
+    a catalog over the budget is rejected with 413
+    """
+    _, response, _ = await admit("batch", request, as_job=True)
+    return response
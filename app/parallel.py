@@ -0,0 +1,328 @@
+import os
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, List, Tuple
+
+from app.checkpoint import Checkpoint
+
+if TYPE_CHECKING:
+    from app.distributed import Coordinator
+
+
+# number of worker processes when it is not given explicitly
+DEFAULT_N_WORKERS = int(os.environ.get("ALPHA_N_WORKERS", os.cpu_count() or 1))
+
+# upper bound of worker processes of one calculation of the server,
+# see `WorkerBudget`
+MAX_WORKERS_PER_CALCULATION = int(
+    os.environ.get("ALPHA_MAX_WORKERS_PER_CALCULATION", DEFAULT_N_WORKERS)
+)
+
+# spaces smaller than this are not worth sending to other processes
+MIN_SIGMA_PER_WORKER = 2**12
+
+# shards per worker, more shards balance the load better
+SHARDS_PER_WORKER = 4
+
+# minimal number of shards when progress is reported
+PROGRESS_SHARDS = 64
+
+# number of shards of checkpointed enumerations, fixed so that the saved position
+# is a boundary of shards for any number of workers
+CHECKPOINT_SHARDS = 1024
+
+_executors = {}
+
+
+def resolve_n_workers(n_workers: int | None, n_sigma: int) -> int:
+    """
+    Number of worker processes to use for a space of `n_sigma` vectors of spins
+
+    Args:
+        n_workers (int | None): requested number of workers, None for the default
+        n_sigma (int): size of the space
+
+    Returns:
+        int: number of workers, 1 means the space is processed in this process
+    """
+    if n_workers is None:
+        n_workers = DEFAULT_N_WORKERS
+    return max(1, min(n_workers, n_sigma // MIN_SIGMA_PER_WORKER))
+
+
+def limit_n_workers(n_workers: int) -> None:
+    """
+    Use at most `n_workers` worker processes by default in this process, e.g.
+    in the process of one request, which shares the cores with other requests
+    """
+    global DEFAULT_N_WORKERS
+    DEFAULT_N_WORKERS = max(1, min(DEFAULT_N_WORKERS, n_workers))
+
+
+class WorkerBudget:
+    """
+    Worker processes shared at run time by calculations that run in their own
+    processes at the same time (see `app.executor.call_in_process`):
+    a calculation takes the free workers when it starts, at least 1 and at most
+    `max_per_calculation`, and gives them back when it ends. A calculation
+    alone on an idle server uses all cores, concurrent ones split them.
+    """
+
+    def __init__(
+        self,
+        n_workers: int = DEFAULT_N_WORKERS,
+        max_per_calculation: int = MAX_WORKERS_PER_CALCULATION,
+    ):
+        self.n_workers = n_workers
+        self.max_per_calculation = max_per_calculation
+        self.n_free = n_workers
+        self.lock = threading.Lock()
+
+    def acquire(self) -> int:
+        """
+        Take workers for a calculation that starts
+
+        Returns:
+            int: number of workers, pass it to `release` when the calculation ends
+        """
+        with self.lock:
+            n_workers = max(1, min(self.n_free, self.max_per_calculation))
+            self.n_free -= n_workers
+            return n_workers
+
+    def release(self, n_workers: int) -> None:
+        with self.lock:
+            self.n_free += n_workers
+
+
+def default_n_workers() -> int:
+    """
+    Number of worker processes when it is not given explicitly, see
+    `limit_n_workers`
+    """
+    return DEFAULT_N_WORKERS
+
+
+def split_shards(n_vertices: int, n_shards: int) -> List[Tuple[int, int]]:
+    """
+    Split indices of all vectors of spins of `itertools.product([-1, 1],
+    repeat=n_vertices)` into shards with a fixed prefix: shard $i$ contains all
+    vectors whose first $p$ spins encode $i$, i.e. a range of $2^{n - p}$ indices.
+
+    Args:
+        n_vertices (int): number of spins
+        n_shards (int): minimal number of shards, rounded up to a power of 2
+            (but at most $2^{n\\_vertices}$)
+
+    Returns:
+        List[Tuple[int, int]]: ranges of indices (start, stop) in increasing order
+    """
+    n_prefix = min(n_vertices, max(0, n_shards - 1).bit_length())
+    shard_size = 2 ** (n_vertices - n_prefix)
+    return [
+        (shard * shard_size, (shard + 1) * shard_size)
+        for shard in range(2**n_prefix)
+    ]
+
+
+def get_executor(n_workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool with `n_workers` workers, shared between calls
+    """
+    if n_workers not in _executors:
+        _executors[n_workers] = ProcessPoolExecutor(max_workers=n_workers)
+    return _executors[n_workers]
+
+
+def _forget_executors() -> None:
+    # pools of the parent process are not usable in a forked child
+    _executors.clear()
+
+
+os.register_at_fork(after_in_child=_forget_executors)
+
+
+@atexit.register
+def shutdown_executors() -> None:
+    for executor in _executors.values():
+        executor.shutdown(cancel_futures=True)
+    _executors.clear()
+
+
+def _run_shards(
+    shard_function: Callable[..., Any],
+    args: Tuple,
+    shards: List[Tuple[int, int]],
+    n_workers: int,
+    on_result: Callable[[int, Any], None],
+) -> None:
+    """
+    Run `shard_function(*args, start, stop)` for every shard and call
+    `on_result(stop, result)` in the order of shards. If `on_result` raises
+    an exception, shards that have not started yet are cancelled.
+    """
+    if n_workers == 1:
+        for start, stop in shards:
+            on_result(stop, shard_function(*args, start, stop))
+        return
+
+    executor = get_executor(n_workers)
+    futures = [
+        executor.submit(shard_function, *args, start, stop) for start, stop in shards
+    ]
+    try:
+        for future, (_, stop) in zip(futures, shards):
+            on_result(stop, future.result())
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def map_shards(
+    shard_function: Callable[..., Any],
+    n_vertices: int,
+    args: Tuple = (),
+    n_workers: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> List[Any]:
+    """
+    Run `shard_function(*args, start, stop)` for every shard of the space
+    of vectors of spins (see `split_shards`) on a process pool.
+
+    Results are returned in the order of shards, regardless of the order they were
+    finished in, so merging them sequentially gives the same result as processing
+    the whole space with one call.
+
+    Args:
+        shard_function (Callable[..., Any]): top-level (picklable) function
+        n_vertices (int): number of spins
+        args (Tuple, optional): arguments passed before `start` and `stop`
+        n_workers (int | None, optional): number of worker processes.
+            Defaults to None, i.e. `DEFAULT_N_WORKERS`.
+        progress (Callable[[int, int], None] | None, optional): called with
+            the number of processed vectors of spins and the total number after
+            every shard. If it raises an exception, shards that have not started
+            yet are cancelled and the exception is propagated. Defaults to None.
+
+    Returns:
+        List[Any]: results for every shard
+    """
+    n_sigma = 2**n_vertices
+    n_workers = resolve_n_workers(n_workers, n_sigma)
+    if n_workers == 1 and progress is None:
+        return [shard_function(*args, 0, n_sigma)]
+
+    n_shards = n_workers * SHARDS_PER_WORKER
+    if progress is not None:
+        n_shards = max(n_shards, PROGRESS_SHARDS)
+
+    results = []
+
+    def on_result(stop: int, result: Any) -> None:
+        results.append(result)
+        if progress is not None:
+            progress(stop, n_sigma)
+
+    _run_shards(
+        shard_function, args, split_shards(n_vertices, n_shards), n_workers, on_result
+    )
+    return results
+
+
+def fold_shards(
+    shard_function: Callable[..., Any],
+    n_vertices: int,
+    merge: Callable[[Any, Any], Any],
+    initial: Any,
+    args: Tuple = (),
+    n_workers: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+    checkpoint: Checkpoint | None = None,
+    key: str = "",
+    coordinator: "Coordinator | None" = None,
+) -> Any:
+    """
+    Like `map_shards`, but results of shards are merged in the order of shards:
+    `merge(...merge(merge(initial, result_0), result_1)..., result_k)`.
+
+    With a checkpoint the space is split into `CHECKPOINT_SHARDS` shards
+    and the merged state of all finished shards is saved every
+    `checkpoint.interval` seconds and when an exception (e.g. cancellation)
+    is raised. If the checkpoint exists, the enumeration continues after its
+    position; since shards are merged in the same order, the result is the same
+    as without an interruption. The checkpoint is removed when the enumeration
+    is finished.
+
+    Args:
+        shard_function (Callable[..., Any]): see `map_shards`
+        n_vertices (int): number of spins
+        merge (Callable[[Any, Any], Any]): merges a state and a result of a shard,
+            the state must be picklable
+        initial (Any): state before the first shard
+        args (Tuple, optional): see `map_shards`
+        n_workers (int | None, optional): see `map_shards`
+        progress (Callable[[int, int], None] | None, optional): see `map_shards`,
+            after resuming it starts from the position of the checkpoint
+        checkpoint (Checkpoint | None, optional): Defaults to None.
+        key (str, optional): identifier of the calculation, see
+            `app.checkpoint.checkpoint_key`. Defaults to "".
+        coordinator (Coordinator | None, optional): calculate shards on workers
+            through a shared directory instead of the process pool, see
+            `app.distributed.Coordinator`. Finished shards are kept in the
+            directory, so `checkpoint` is not needed then. Defaults to None.
+
+    Raises:
+        ValueError: if the checkpoint (or the directory of the coordinator)
+            belongs to another calculation
+
+    Returns:
+        Any: merged state
+    """
+    if coordinator is not None:
+        return coordinator.fold(
+            shard_function, n_vertices, merge, initial, args, progress, key
+        )
+
+    if checkpoint is None:
+        state = initial
+        for result in map_shards(shard_function, n_vertices, args, n_workers, progress):
+            state = merge(state, result)
+        return state
+
+    n_sigma = 2**n_vertices
+    position, state = 0, initial
+    saved = checkpoint.load(key)
+    if saved is not None:
+        position, state = saved
+    shards = [
+        (start, stop)
+        for start, stop in split_shards(n_vertices, CHECKPOINT_SHARDS)
+        if start >= position
+    ]
+    if shards and shards[0][0] != position:
+        raise ValueError(f"Position {position} of the checkpoint is not a shard start")
+
+    def on_result(stop: int, result: Any) -> None:
+        nonlocal position, state
+        state = merge(state, result)
+        position = stop
+        if checkpoint.is_due():
+            checkpoint.save(key, position, state)
+        if progress is not None:
+            progress(stop, n_sigma)
+
+    try:
+        _run_shards(
+            shard_function,
+            args,
+            shards,
+            resolve_n_workers(n_workers, n_sigma),
+            on_result,
+        )
+    except BaseException:
+        checkpoint.save(key, position, state)
+        raise
+    checkpoint.remove()
+    return state
@@ -0,0 +1,289 @@
+import os
+import json
+import argparse
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.checkpoint import checkpoint_key
+from app.cyclotomic import gauss_sum_value
+from app.f3 import batched_symmetric_elimination_f3, batched_bordered_elimination_f3
+from app.graph import (
+    DEFAULT_MEMORY_BUDGET,
+    build_masks_tensor,
+    build_filled_faces_matrices,
+    calc_block_size,
+    calc_chi,
+    sigma_block,
+    sigma_from_index,
+    to_tait_0,
+    vertex_faces_to_faces_matrix,
+)
+from app.parallel import map_shards
+
+
+METADATA_FILE = "metadata.json"
+
+# arrays of a store of `calc_tait_0_in_detail`
+DETAIL_ARRAYS = ("rank", "det")
+
+# arrays of a store of `calc_tait_0_fixed_in_detail`; "chi" is the exponent $x$
+# of $\\chi = \\omega^x$, i.e. ${\\det}'$ times the bordered determinant
+FIXED_ARRAYS = ("rank", "det", "bordered_det", "chi")
+
+# vectors of spins per chunk when arrays of a store are read
+DEFAULT_READ_CHUNK = 2**24
+
+
+def _array_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.npy")
+
+
+def _store_shard(
+    directory: str,
+    names: Tuple[str, ...],
+    masks_tensor: np.ndarray,
+    l: Optional[np.ndarray],
+    memory_budget: int,
+    start: int,
+    stop: int,
+) -> Tuple[np.ndarray, Optional[int]]:
+    """
+    Calculate vectors of spins from `start` to `stop` block by block and write
+    them into the arrays of the store, see `write_detail_store`
+
+    Returns:
+        Tuple[np.ndarray, Optional[int]]: int64 counts of shape (n_faces + 1, 2, 3),
+            indexed by rank, ${\\det}' = 1$ and the exponent of $\\chi$ + 1, and index
+            of the first vector of spins with inconsistent system (None if there
+            is none)
+    """
+    n_vertices, n_faces, _ = masks_tensor.shape
+    arrays = {
+        name: np.load(_array_path(directory, name), mmap_mode="r+") for name in names
+    }
+    counts = np.zeros((n_faces + 1) * 2 * 3, dtype=np.int64)
+    first_inconsistent = None
+
+    block_size = calc_block_size(n_vertices, n_faces + 1, memory_budget)
+    for block_start in range(start, stop, block_size):
+        block_stop = min(block_start + block_size, stop)
+        sigma = sigma_block(block_start, block_stop, n_vertices)
+        filled = build_filled_faces_matrices(sigma, masks_tensor)
+        if l is None:
+            ranks, dets = batched_symmetric_elimination_f3(filled)
+            chis = np.zeros(len(ranks), dtype=np.int8)
+        else:
+            ranks, dets, consistent, bordered_dets = batched_bordered_elimination_f3(
+                filled, l.reshape(1, -1)
+            )
+            consistent, bordered_dets = consistent[:, 0], bordered_dets[:, 0]
+            if first_inconsistent is None and not consistent.all():
+                first_inconsistent = block_start + int(np.argmin(consistent))
+            chis = dets * bordered_dets
+            arrays["bordered_det"][block_start:block_stop] = bordered_dets
+            arrays["chi"][block_start:block_stop] = chis
+        arrays["rank"][block_start:block_stop] = ranks
+        arrays["det"][block_start:block_stop] = dets
+
+        codes = (ranks.astype(np.int64) * 2 + (dets == 1)) * 3 + (chis + 1)
+        counts += np.bincount(codes, minlength=len(counts))
+
+    for array in arrays.values():
+        array.flush()
+    return counts.reshape(n_faces + 1, 2, 3), first_inconsistent
+
+
+def write_detail_store(
+    directory: str,
+    faces_matrix: List[List[List[int]]],
+    fixed_spins: Optional[Dict[int, int]] = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    n_workers: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> Dict[str, Any]:
+    """
+    Calculate the per-vector values of `calc_tait_0_in_detail` (or, with
+    `fixed_spins`, of `calc_tait_0_fixed_in_detail`) into int8 `.npy` files
+    of `directory`, indexed by the index of the vector of (free) spins
+    (see `sigma_from_index`). Files are preallocated and written block by block
+    through memory maps by the workers, so memory does not depend on the size
+    of the graph; they are read with `np.load(path, mmap_mode="r")` or
+    `open_detail_store`.
+
+    Arrays are `DETAIL_ARRAYS` or `FIXED_ARRAYS`; gaussian sums and $\\chi$
+    are not stored, they only depend on these values (see `gauss_sum_value`).
+    The sidecar `METADATA_FILE` (hash of Faces Matrix, order of vertices
+    of the bits of the index, fixed spins, number of Tait colorings) is written
+    last, so a store without it is incomplete.
+
+    Args:
+        directory (str): directory of the store, created if needed
+        faces_matrix (List[List[List[int]]]): Faces Matrix
+        fixed_spins (Optional[Dict[int, int]], optional): fixed spins.
+            Defaults to None.
+        memory_budget (int, optional): approximate memory limit for one block
+            of vectors of spins in bytes, per worker.
+        n_workers (int | None, optional): number of worker processes, see
+            `app.parallel.map_shards`. Defaults to None.
+        progress (Callable[[int, int], None] | None, optional): progress callback,
+            see `app.parallel.map_shards`. Defaults to None.
+
+    Raises:
+        ValueError: if the system with fixed spins is inconsistent for some
+            vector of free spins
+
+    Returns:
+        Dict[str, Any]: metadata of the store
+    """
+    n_faces = len(faces_matrix)  # n + 2
+    n_vertices = 2 * (n_faces - 2)  # 2n
+    fixed_spins = fixed_spins or {}
+    vertices = [v for v in range(n_vertices) if v not in fixed_spins]
+    masks_tensor = build_masks_tensor(faces_matrix, vertices)
+
+    l = None
+    names = DETAIL_ARRAYS
+    if fixed_spins:
+        l = np.array(
+            [
+                sum(fixed_spins.get(v, 0) for v in faces_matrix[i][i]) % 3
+                for i in range(n_faces)
+            ]
+        )
+        names = FIXED_ARRAYS
+
+    os.makedirs(directory, exist_ok=True)
+    metadata_path = os.path.join(directory, METADATA_FILE)
+    if os.path.exists(metadata_path):
+        os.remove(metadata_path)
+    n_sigma = 2 ** len(vertices)
+    for name in names:
+        array = np.lib.format.open_memmap(
+            _array_path(directory, name), mode="w+", dtype=np.int8, shape=(n_sigma,)
+        )
+        del array
+
+    counts = 0
+    first_inconsistent = None
+    for shard_counts, shard_inconsistent in map_shards(
+        _store_shard,
+        len(vertices),
+        (directory, names, masks_tensor, l, memory_budget),
+        n_workers,
+        progress,
+    ):
+        counts = counts + shard_counts
+        if first_inconsistent is None:
+            first_inconsistent = shard_inconsistent
+    if first_inconsistent is not None:
+        sigma = list(sigma_from_index(first_inconsistent, len(vertices)))
+        raise ValueError(f"System is inconsistent for vector of free spins {sigma}")
+
+    total = 0
+    for rank, det_index, chi_index in zip(*np.nonzero(counts)):
+        det_minor = 1 if det_index else -1
+        total += (
+            calc_chi(int(chi_index) - 1)
+            * gauss_sum_value(det_minor, int(rank))
+            * int(counts[rank, det_index, chi_index])
+        )
+
+    metadata = {
+        "method": "calc_tait_0_fixed" if fixed_spins else "calc_tait_0",
+        "graph_hash": checkpoint_key("faces_matrix", faces_matrix),
+        "faces_matrix": faces_matrix,
+        # bit n - 1 - k of the index of a vector is 1 if spin of vertices[k] is 1
+        "vertices": vertices,
+        "fixed_spins": {str(v): value for v, value in fixed_spins.items()},
+        "n_sigma": n_sigma,
+        "arrays": {name: f"{name}.npy" for name in names},
+        "tait_0": to_tait_0(total),
+    }
+    tmp_path = f"{metadata_path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(metadata, file)
+    os.replace(tmp_path, metadata_path)
+    return metadata
+
+
+def open_detail_store(
+    directory: str,
+) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Open a store written by `write_detail_store` without reading the arrays
+    into memory
+
+    Raises:
+        FileNotFoundError: if the store is incomplete
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, np.ndarray]]: metadata and read-only
+            memory-mapped arrays by name
+    """
+    with open(os.path.join(directory, METADATA_FILE)) as file:
+        metadata = json.load(file)
+    arrays = {
+        name: np.load(os.path.join(directory, file_name), mmap_mode="r")
+        for name, file_name in metadata["arrays"].items()
+    }
+    return metadata, arrays
+
+
+def count_rank_det(
+    ranks: np.ndarray, dets: np.ndarray, chunk_size: int = DEFAULT_READ_CHUNK
+) -> Dict[Tuple[int, int], int]:
+    """
+    Number of vectors of spins for every (${\\det}'$, rank), reading memory-mapped
+    arrays of a store chunk by chunk
+
+    Returns:
+        Dict[Tuple[int, int], int]: number of vectors for every (det_minor, rank)
+    """
+    counts = {}
+    for start in range(0, len(ranks), chunk_size):
+        codes = 2 * ranks[start : start + chunk_size].astype(np.int64) + (
+            dets[start : start + chunk_size] == 1
+        )
+        for code, count in enumerate(np.bincount(codes).tolist()):
+            if count > 0:
+                key = (1 if code % 2 else -1, code // 2)
+                counts[key] = counts.get(key, 0) + count
+    return dict(sorted(counts.items(), key=lambda item: (item[0][1], item[0][0])))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Calculate per-vector values of calc_tait_0 in detail "
+        "into .npy files"
+    )
+    parser.add_argument("directory", help="directory of the store")
+    parser.add_argument(
+        "params",
+        help="JSON file with `faces_matrix` or `vertex_faces` "
+        "and optional `fixed_spins`",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.params) as file:
+        params = json.load(file)
+    faces_matrix = params.get("faces_matrix")
+    if faces_matrix is None:
+        faces_matrix = vertex_faces_to_faces_matrix(params["vertex_faces"])
+    fixed_spins = {int(v): value for v, value in params.get("fixed_spins", {}).items()}
+
+    metadata = write_detail_store(
+        args.directory,
+        faces_matrix,
+        fixed_spins,
+        n_workers=args.workers,
+        progress=lambda processed, total: print(
+            f"{processed}/{total} vectors of spins", flush=True
+        ),
+    )
+    print(f"Finished: {metadata['n_sigma']} vectors, tait_0 = {metadata['tait_0']}")
+
+
+if __name__ == "__main__":
+    main()
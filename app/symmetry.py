@@ -0,0 +1,118 @@
+from typing import List, Tuple
+
+import numpy as np
+import networkx as nx
+from networkx.algorithms.isomorphism import GraphMatcher
+
+
+def build_edges_graph(faces_matrix: List[List[List[int]]]) -> nx.Graph:
+    """
+    Build the planar cubic graph back from its Faces Matrix: two vertices are adjacent
+    if they are the intersection of two faces.
+
+    Args:
+        faces_matrix (List[List[List[int]]]): Faces Matrix
+
+    Returns:
+        nx.Graph: graph on vertices from 0 to 2n-1
+    """
+    n_faces = len(faces_matrix)
+    graph = nx.Graph()
+    graph.add_nodes_from(range(2 * (n_faces - 2)))
+    for i in range(n_faces):
+        for j in range(i + 1, n_faces):
+            if len(faces_matrix[i][j]) == 2:
+                graph.add_edge(*faces_matrix[i][j])
+    return graph
+
+
+def face_structure_automorphisms(faces_matrix: List[List[List[int]]]) -> List[List[int]]:
+    """
+    Find all automorphisms of the face structure of a planar cubic graph,
+    i.e. permutations $\\pi$ of vertices that map faces to faces.
+
+    For such a permutation Faces Matrices filled with $\\sigma$ and with
+    $\\sigma \\circ \\pi^{-1}$ are congruent (they differ by the corresponding
+    permutation of rows and columns), so they have the same rank and ${\\det}'$.
+
+    Candidates are automorphisms of the graph itself (for a 3-connected planar graph
+    they all map faces to faces), only those that preserve the set of faces are kept,
+    so the result is a group in any case.
+
+    Args:
+        faces_matrix (List[List[List[int]]]): Faces Matrix
+
+    Returns:
+        List[List[int]]: list of permutations `perm`, where `perm[v]` is the image
+            of vertex `v`; the identity is the first one
+    """
+    n_faces = len(faces_matrix)
+    n_vertices = 2 * (n_faces - 2)
+    faces = {frozenset(faces_matrix[f][f]) for f in range(n_faces)}
+
+    graph = build_edges_graph(faces_matrix)
+
+    identity = list(range(n_vertices))
+    perms = [identity]
+    for mapping in GraphMatcher(graph, graph).isomorphisms_iter():
+        perm = [mapping[v] for v in range(n_vertices)]
+        if perm == identity:
+            continue
+        if all(frozenset(perm[v] for v in face) in faces for face in faces):
+            perms.append(perm)
+    return perms
+
+
+def bit_permutation_weights(perms: List[List[int]], n_vertices: int) -> np.ndarray:
+    """
+    Weights to permute indices of vectors of spins (see `app.graph.sigma_from_index`):
+    the spin of vertex `v` is bit $n - 1 - v$ of the index, so the image
+    of index with bits $b$ under permutation $g$ is `b @ weights[:, g]`.
+
+    Args:
+        perms (List[List[int]]): permutations of vertices
+        n_vertices (int): number of spins
+
+    Returns:
+        np.ndarray: int64 array of shape (n_vertices, len(perms))
+    """
+    perms = np.array(perms, dtype=np.int64).T
+    return np.left_shift(np.int64(1), n_vertices - 1 - perms)
+
+
+def calc_orbits(
+    indices: np.ndarray, weights: np.ndarray, n_vertices: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Describe orbits of vectors of spins under the group generated by automorphisms
+    (see `face_structure_automorphisms`) and the flip of all spins $\\sigma \\to -\\sigma$.
+
+    Flipping all spins maps Faces Matrix $M$ to $-M$: rank stays the same
+    and ${\\det}'$ is multiplied by $(-1)^{\\rank M}$. So an orbit is either
+    one orbit $O$ of the automorphism group (if $-\\sigma \\in O$), or $O \\cup -O$,
+    where all vectors of $-O$ have the flipped ${\\det}'$.
+
+    Args:
+        indices (np.ndarray): int64 indices of vectors of spins
+        weights (np.ndarray): see `bit_permutation_weights`
+        n_vertices (int): number of spins
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: for every index:
+            1) whether it is the smallest index of its orbit (representative)
+            2) size of its orbit $O$ under automorphisms
+            3) whether $-\\sigma \\in O$
+            4) the smallest index in $-O$
+    """
+    shifts = np.arange(n_vertices - 1, -1, -1, dtype=np.int64)
+    bits = (indices.reshape(-1, 1) >> shifts) & 1
+    images = bits @ weights  # (K, |G|)
+    flipped = (2**n_vertices - 1) - images
+
+    images.sort(axis=1)
+    orbit_sizes = 1 + np.count_nonzero(np.diff(images, axis=1), axis=1)
+    flipped_index = (2**n_vertices - 1) - indices
+    flip_in_orbit = (images == flipped_index.reshape(-1, 1)).any(axis=1)
+    min_flipped = flipped.min(axis=1)
+    is_representative = (images[:, 0] == indices) & (indices <= min_flipped)
+    return is_representative, orbit_sizes, flip_in_orbit, min_flipped
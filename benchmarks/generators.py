@@ -0,0 +1,101 @@
+import random
+from typing import Any, Dict, List
+
+import networkx as nx
+
+from app.graph import (
+    graph_from_edges,
+    planar_embedding,
+    find_faces_in_embedding,
+    build_faces_matrix,
+)
+
+
+def graph_case(name: str, graph: nx.Graph) -> Dict[str, Any]:
+    """
+    Benchmark input from a planar cubic graph: vertices are relabeled to 0..n-1
+
+    Args:
+        name (str): name of the graph in reports
+        graph (nx.Graph): planar cubic graph
+
+    Returns:
+        Dict[str, Any]: "name", "n_vertices", "edges", "adjacency_matrix",
+            "faces" and "faces_matrix"
+    """
+    graph = nx.convert_node_labels_to_integers(graph, ordering="sorted")
+    edges = sorted(sorted(edge) for edge in graph.edges)
+    n_vertices = graph.number_of_nodes()
+    adjacency_matrix = [[0] * n_vertices for _ in range(n_vertices)]
+    for v, w in edges:
+        adjacency_matrix[v][w] = 1
+        adjacency_matrix[w][v] = 1
+    faces = find_faces_in_embedding(planar_embedding(graph_from_edges(edges)))
+    return {
+        "name": name,
+        "n_vertices": n_vertices,
+        "edges": edges,
+        "adjacency_matrix": adjacency_matrix,
+        "faces": faces,
+        "faces_matrix": build_faces_matrix(faces),
+    }
+
+
+def k4() -> Dict[str, Any]:
+    return graph_case("k4", nx.complete_graph(4))
+
+
+def prism(k: int) -> Dict[str, Any]:
+    """
+    Prism $C_k \\times K_2$ (circular ladder), $2k$ vertices. Möbius ladders
+    are not planar for $k \\geq 3$, so this is the planar ladder family.
+    """
+    return graph_case(f"prism{k}", nx.circular_ladder_graph(k))
+
+
+def dodecahedron() -> Dict[str, Any]:
+    return graph_case("dodecahedron", nx.dodecahedral_graph())
+
+
+def random_planar_cubic(n_vertices: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    Random 3-connected planar cubic graph: starting from $K_4$, repeatedly pick
+    a face and two of its edges, subdivide both and join the two new vertices
+    inside the face. Every step adds 2 vertices and keeps the graph planar,
+    cubic and 3-connected.
+
+    Args:
+        n_vertices (int): even number of vertices, at least 4
+        seed (int, optional): seed of the random choices. Defaults to 0.
+
+    Raises:
+        ValueError: if `n_vertices` is odd or less than 4
+    """
+    if n_vertices < 4 or n_vertices % 2:
+        raise ValueError("Number of vertices must be even and at least 4")
+    rng = random.Random(seed)
+    graph = nx.complete_graph(4)
+    while graph.number_of_nodes() < n_vertices:
+        faces = find_faces_in_embedding(planar_embedding(graph))
+        face = rng.choice(faces)[:-1]
+        face_edges = [(face[i], face[(i + 1) % len(face)]) for i in range(len(face))]
+        i, j = rng.sample(range(len(face_edges)), 2)
+        new_vertices: List[int] = []
+        for v, w in (face_edges[i], face_edges[j]):
+            x = graph.number_of_nodes()
+            graph.remove_edge(v, w)
+            graph.add_edges_from([(v, x), (x, w)])
+            new_vertices.append(x)
+        graph.add_edge(*new_vertices)
+    return graph_case(f"random{n_vertices}_{seed}", graph)
+
+
+def default_cases(max_vertices: int = 20) -> List[Dict[str, Any]]:
+    """
+    Graphs of all families with at most `max_vertices` vertices, ordered by size
+    """
+    cases = [k4(), *(prism(k) for k in range(3, max_vertices // 2 + 1))]
+    if max_vertices >= 20:
+        cases.append(dodecahedron())
+    cases.extend(random_planar_cubic(n, seed=n) for n in range(8, max_vertices + 1, 4))
+    return sorted(cases, key=lambda case: case["n_vertices"])
@@ -0,0 +1,553 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import networkx as nx
+
+from app.coloring import calc_tait_0_tree_decomposition
+from app.graph import (
+    build_faces_matrix,
+    build_masks_tensor,
+    build_filled_faces_matrices,
+    calc_heawood,
+    calc_heawood_fixed,
+    calc_s_values,
+    calc_tait_0_aggregated,
+    calc_tait_0_dual_chromatic,
+    calc_tait_0_fixed_in_detail,
+    calc_tait_0_fixed_sweep,
+    calc_tait_0_in_detail,
+    calc_vertex_positions,
+    faces_matrix_to_dual_adjacency_matrix,
+    find_faces_in_embedding,
+    find_faces_in_graph,
+    graph_from_edges,
+    largest_nonzero_principal_minor,
+    planar_embedding,
+    sigma_block,
+)
+from benchmarks.generators import default_cases
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# a kernel is timed until the total time of repeated calls exceeds this, in seconds
+DEFAULT_MIN_TIME = float(os.environ.get("ALPHA_BENCH_MIN_TIME", "0.2"))
+
+# the best of this many timings is reported
+DEFAULT_REPEATS = int(os.environ.get("ALPHA_BENCH_REPEATS", "3"))
+
+# relative drop of throughput against the baseline reported as a regression
+DEFAULT_TOLERANCE = 0.25
+
+# number of random filled Faces Matrices per call of largest_nonzero_principal_minor
+N_MINOR_MATRICES = 64
+
+# vertices of calc_tait_0_fixed_sweep
+SWEEP_VERTICES = [0, 1, 2, 3]
+
+# Numbers of Tait colorings with some spins fixed ({} for all colorings),
+# None where the kernel does not define it
+Counts = List[Tuple[Dict[int, int], Optional[int]]]
+
+# A kernel prepares a call for a graph (untimed) and returns None if the graph
+# does not suit it, or the call, the number of processed units (vectors of spins,
+# faces, ...) and a function extracting the numbers of Tait colorings from
+# the result (None if the kernel does not count them)
+Prepared = Tuple[Callable[[], Any], int, Optional[Callable[[Any], Counts]]]
+
+
+def _total(tait_0_of: Callable[[Any], int]) -> Callable[[Any], Counts]:
+    # the result counts all Tait colorings
+    return lambda result: [({}, tait_0_of(result))]
+
+
+def _find_faces_in_embedding(case: Dict[str, Any], n_workers: int) -> Prepared:
+    graph = graph_from_edges(case["edges"])
+    return (
+        lambda: find_faces_in_embedding(planar_embedding(graph)),
+        len(case["edges"]),
+        None,
+    )
+
+
+def _find_faces_in_graph(case: Dict[str, Any], n_workers: int) -> Prepared:
+    positions = calc_vertex_positions(case["adjacency_matrix"])
+    return (
+        lambda: find_faces_in_graph(case["adjacency_matrix"], positions),
+        len(case["edges"]),
+        None,
+    )
+
+
+def _build_faces_matrix(case: Dict[str, Any], n_workers: int) -> Prepared:
+    return lambda: build_faces_matrix(case["faces"]), len(case["faces"]), None
+
+
+def _build_masks_tensor(case: Dict[str, Any], n_workers: int) -> Prepared:
+    vertices = list(range(case["n_vertices"]))
+    return (
+        lambda: build_masks_tensor(case["faces_matrix"], vertices),
+        case["n_vertices"],
+        None,
+    )
+
+
+def _largest_nonzero_principal_minor(
+    case: Dict[str, Any], n_workers: int
+) -> Prepared:
+    n_vertices = case["n_vertices"]
+    masks_tensor = build_masks_tensor(case["faces_matrix"], list(range(n_vertices)))
+    rng = random.Random(n_vertices)
+    indices = [rng.randrange(2**n_vertices) for _ in range(N_MINOR_MATRICES)]
+    matrices = [
+        build_filled_faces_matrices(sigma_block(i, i + 1, n_vertices), masks_tensor)[0]
+        for i in indices
+    ]
+
+    def run() -> List[Tuple[int, int, List[int]]]:
+        return [largest_nonzero_principal_minor(matrix) for matrix in matrices]
+
+    return run, len(matrices), None
+
+
+def _calc_tait_0_in_detail(case: Dict[str, Any], n_workers: int) -> Prepared:
+    return (
+        lambda: calc_tait_0_in_detail(case["faces_matrix"], n_workers=n_workers),
+        2 ** case["n_vertices"],
+        _total(lambda result: result[0]),
+    )
+
+
+def _calc_tait_0_aggregated(case: Dict[str, Any], n_workers: int) -> Prepared:
+    return (
+        lambda: calc_tait_0_aggregated(case["faces_matrix"], n_workers=n_workers),
+        2 ** case["n_vertices"],
+        _total(lambda result: result[0]),
+    )
+
+
+def _calc_tait_0_aggregated_symmetry(
+    case: Dict[str, Any], n_workers: int
+) -> Prepared:
+    return (
+        lambda: calc_tait_0_aggregated(
+            case["faces_matrix"], n_workers=n_workers, symmetry=True
+        ),
+        2 ** case["n_vertices"],
+        _total(lambda result: result[0]),
+    )
+
+
+def _tait_0_of_fixed(results: List[Tuple[bool, Any]]) -> Counts:
+    return [
+        ({0: spin}, details[0] if is_consistent else None)
+        for spin, (is_consistent, details) in zip((-1, 1), results)
+    ]
+
+
+def _calc_tait_0_fixed_in_detail(case: Dict[str, Any], n_workers: int) -> Prepared:
+    # both spins of vertex 0, the number is not defined for an inconsistent system
+    def run() -> List[Tuple[bool, Any]]:
+        return [
+            calc_tait_0_fixed_in_detail(
+                case["faces_matrix"], {0: spin}, n_workers=n_workers
+            )
+            for spin in (-1, 1)
+        ]
+
+    return run, 2 ** case["n_vertices"], _tait_0_of_fixed
+
+
+def _calc_tait_0_fixed_sweep(
+    case: Dict[str, Any], n_workers: int
+) -> Optional[Prepared]:
+    if case["n_vertices"] <= len(SWEEP_VERTICES):
+        return None
+
+    def tait_0(result: Tuple[List, List[bool], List[Optional[int]]]) -> Counts:
+        spins_list, _, tait_0_list = result
+        return [
+            (dict(zip(SWEEP_VERTICES, spins)), tait_0)
+            for spins, tait_0 in zip(spins_list, tait_0_list)
+        ]
+
+    return (
+        lambda: calc_tait_0_fixed_sweep(
+            case["faces_matrix"], SWEEP_VERTICES, n_workers=n_workers
+        ),
+        2 ** (case["n_vertices"] - len(SWEEP_VERTICES)),
+        tait_0,
+    )
+
+
+def _calc_tait_0_dual_chromatic(case: Dict[str, Any], n_workers: int) -> Prepared:
+    adjacency_matrix = faces_matrix_to_dual_adjacency_matrix(case["faces_matrix"])
+    return (
+        lambda: calc_tait_0_dual_chromatic(adjacency_matrix),
+        len(case["faces"]),
+        _total(lambda result: result),
+    )
+
+
+def _calc_tait_0_tree_decomposition(
+    case: Dict[str, Any], n_workers: int
+) -> Prepared:
+    return (
+        lambda: calc_tait_0_tree_decomposition(case["faces_matrix"]),
+        len(case["faces"]),
+        _total(lambda result: result[0]),
+    )
+
+
+def _calc_heawood(case: Dict[str, Any], n_workers: int) -> Prepared:
+    return (
+        lambda: calc_heawood(
+            [list(face) for face in case["faces"]], n_workers=n_workers
+        ),
+        2 ** case["n_vertices"],
+        _total(len),
+    )
+
+
+def _calc_heawood_count(case: Dict[str, Any], n_workers: int) -> Prepared:
+    return (
+        lambda: calc_heawood(
+            [list(face) for face in case["faces"]],
+            n_workers=n_workers,
+            count_only=True,
+        ),
+        2 ** case["n_vertices"],
+        _total(lambda result: result),
+    )
+
+
+def _calc_heawood_fixed(case: Dict[str, Any], n_workers: int) -> Prepared:
+    # both spins of vertex 0, solutions of the two cases add up to all solutions
+    def run() -> List[int]:
+        return [
+            calc_heawood_fixed(
+                [list(face) for face in case["faces"]],
+                {0: spin},
+                n_workers=n_workers,
+                count_only=True,
+            )
+            for spin in (-1, 1)
+        ]
+
+    return run, 2 ** case["n_vertices"], _total(sum)
+
+
+def _calc_s_values(case: Dict[str, Any], n_workers: int) -> Prepared:
+    vertices_in = [0, 1]
+    vertices_mid = [2, 3, 4]
+    return (
+        lambda: calc_s_values(
+            case["faces_matrix"],
+            list(vertices_in),
+            list(vertices_mid),
+            n_workers=n_workers,
+        ),
+        2 ** len(vertices_mid) * 3 ** len(case["faces"]),
+        None,
+    )
+
+
+# name: (preparation of a call, largest graph in vertices, None for no limit);
+# limits keep a full run within a few minutes on one core
+KERNELS: Dict[
+    str, Tuple[Callable[[Dict[str, Any], int], Optional[Prepared]], Optional[int]]
+] = {
+    "find_faces_in_embedding": (_find_faces_in_embedding, None),
+    "find_faces_in_graph": (_find_faces_in_graph, None),
+    "build_faces_matrix": (_build_faces_matrix, None),
+    "build_masks_tensor": (_build_masks_tensor, None),
+    "largest_nonzero_principal_minor": (_largest_nonzero_principal_minor, None),
+    "calc_tait_0_in_detail": (_calc_tait_0_in_detail, 14),
+    "calc_tait_0_aggregated": (_calc_tait_0_aggregated, 20),
+    "calc_tait_0_aggregated_symmetry": (_calc_tait_0_aggregated_symmetry, 20),
+    "calc_tait_0_fixed_in_detail": (_calc_tait_0_fixed_in_detail, 14),
+    "calc_tait_0_fixed_sweep": (_calc_tait_0_fixed_sweep, 20),
+    "calc_tait_0_dual_chromatic": (_calc_tait_0_dual_chromatic, None),
+    "calc_tait_0_tree_decomposition": (_calc_tait_0_tree_decomposition, None),
+    "calc_heawood": (_calc_heawood, 20),
+    "calc_heawood_count": (_calc_heawood_count, 20),
+    "calc_heawood_fixed": (_calc_heawood_fixed, 20),
+    "calc_s_values": (_calc_s_values, 12),
+}
+
+
+def time_call(
+    call: Callable[[], Any], min_time: float, repeats: int
+) -> Tuple[float, Any]:
+    """
+    Time a call: the number of calls per timing is doubled until a timing takes
+    at least `min_time`, then the best of `repeats` timings is taken
+
+    Returns:
+        Tuple[float, Any]: seconds per call and the result of the first call
+    """
+    start = time.perf_counter()
+    result = call()
+    elapsed = time.perf_counter() - start
+    n_calls = 1
+    while elapsed < min_time:
+        n_calls *= 2
+        start = time.perf_counter()
+        for _ in range(n_calls):
+            call()
+        elapsed = time.perf_counter() - start
+    best = elapsed
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(n_calls):
+            call()
+        best = min(best, time.perf_counter() - start)
+    return best / n_calls, result
+
+
+def _reference_fixed(case: Dict[str, Any], fixed_spins: Dict[int, int]) -> int:
+    return calc_heawood_fixed(
+        [list(face) for face in case["faces"]],
+        dict(fixed_spins),
+        n_workers=1,
+        count_only=True,
+    )
+
+
+def run_benchmarks(
+    cases: List[Dict[str, Any]],
+    kernels: Optional[List[str]] = None,
+    n_workers: int = 1,
+    min_time: float = DEFAULT_MIN_TIME,
+    repeats: int = DEFAULT_REPEATS,
+    log: Callable[[str], None] | None = None,
+) -> Dict[str, Any]:
+    """
+    Time every kernel on every graph within its limit of vertices and cross-check
+    the numbers of Tait colorings against `calc_tait_0_dual_chromatic`, and
+    the numbers with fixed spins against `calc_heawood_fixed` (by Heawood's
+    theorem, a Tait coloring is a configuration of spins with all face sums
+    0 mod 3). The number is not defined for assignments whose system
+    in `calc_tait_0_fixed_*` is inconsistent, they are counted as unchecked.
+
+    Args:
+        cases (List[Dict[str, Any]]): graphs, see `benchmarks.generators.graph_case`
+        kernels (Optional[List[str]], optional): names of `KERNELS` to run,
+            None for all. Defaults to None.
+        n_workers (int, optional): number of worker processes of the kernels.
+            Defaults to 1.
+        min_time (float, optional): see `time_call`
+        repeats (int, optional): see `time_call`
+        log (Callable[[str], None] | None, optional): called with a line
+            per result. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: "environment", "results" (for every kernel and graph
+            "kernel", "graph", "n_vertices", "n_units", "seconds", "throughput"
+            in units per second, "tait_0" if all colorings are counted and
+            "n_checked" and "n_unchecked" numbers with fixed spins) and "mismatches"
+            (results with a wrong number of Tait colorings, with "fixed_spins")
+    """
+    kernels = kernels or list(KERNELS)
+    results = []
+    mismatches = []
+    for case in cases:
+        reference = calc_tait_0_dual_chromatic(
+            faces_matrix_to_dual_adjacency_matrix(case["faces_matrix"])
+        )
+        for name in kernels:
+            prepare, max_vertices = KERNELS[name]
+            if max_vertices is not None and case["n_vertices"] > max_vertices:
+                continue
+            prepared = prepare(case, n_workers)
+            if prepared is None:
+                continue
+            call, n_units, tait_0_of = prepared
+            seconds, value = time_call(call, min_time, repeats)
+            result = {
+                "kernel": name,
+                "graph": case["name"],
+                "n_vertices": case["n_vertices"],
+                "n_units": n_units,
+                "seconds": seconds,
+                "throughput": n_units / seconds,
+            }
+            n_checked, n_unchecked = 0, 0
+            for fixed_spins, tait_0 in tait_0_of(value) if tait_0_of else []:
+                if tait_0 is None:
+                    n_unchecked += 1
+                    continue
+                if fixed_spins:
+                    n_checked += 1
+                    expected = _reference_fixed(case, fixed_spins)
+                else:
+                    result["tait_0"] = tait_0
+                    expected = reference
+                if tait_0 != expected:
+                    mismatches.append(
+                        {
+                            **result,
+                            "fixed_spins": fixed_spins,
+                            "tait_0": tait_0,
+                            "reference": expected,
+                        }
+                    )
+            if n_checked or n_unchecked:
+                result["n_checked"] = n_checked
+                result["n_unchecked"] = n_unchecked
+            results.append(result)
+            if log is not None:
+                log(_format_result(result))
+
+    return {
+        "environment": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "networkx": nx.__version__,
+            "n_workers": n_workers,
+        },
+        "results": results,
+        "mismatches": mismatches,
+    }
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[Dict[str, Any]]:
+    """
+    Compare throughputs of a run with a baseline run, by kernel and graph
+
+    Returns:
+        List[Dict[str, Any]]: for every result present in both runs "kernel",
+            "graph", "baseline" and "throughput", "ratio" of throughputs
+            and "regression" if the ratio is below `1 - tolerance`
+    """
+    baseline_throughputs = {
+        (result["kernel"], result["graph"]): result["throughput"]
+        for result in baseline["results"]
+    }
+    comparisons = []
+    for result in results["results"]:
+        key = (result["kernel"], result["graph"])
+        if key not in baseline_throughputs:
+            continue
+        ratio = result["throughput"] / baseline_throughputs[key]
+        comparisons.append(
+            {
+                "kernel": result["kernel"],
+                "graph": result["graph"],
+                "baseline": baseline_throughputs[key],
+                "throughput": result["throughput"],
+                "ratio": ratio,
+                "regression": ratio < 1 - tolerance,
+            }
+        )
+    return comparisons
+
+
+def _format_result(result: Dict[str, Any]) -> str:
+    line = (
+        f"{result['kernel']:<32} {result['graph']:<14} "
+        f"{result['seconds'] * 1e3:>11.3f} ms {result['throughput']:>14.1f} /s"
+    )
+    if "tait_0" in result:
+        line += f"  tait_0 = {result['tait_0']}"
+    if "n_checked" in result:
+        line += (
+            f"  checked = {result['n_checked']}, unchecked = {result['n_unchecked']}"
+        )
+    return line
+
+
+def _print_comparisons(comparisons: List[Dict[str, Any]]) -> None:
+    for comparison in comparisons:
+        marker = "  REGRESSION" if comparison["regression"] else ""
+        print(
+            f"{comparison['kernel']:<32} {comparison['graph']:<14} "
+            f"x{comparison['ratio']:.2f}{marker}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark kernels of app.graph on planar cubic graphs"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run benchmarks")
+    run_parser.add_argument("--output", help="JSON file for the results")
+    run_parser.add_argument(
+        "--baseline",
+        default=BASELINE_PATH,
+        help="baseline JSON file to compare with, if it exists",
+    )
+    run_parser.add_argument("--max-vertices", type=int, default=20)
+    run_parser.add_argument("--kernels", nargs="+", choices=list(KERNELS))
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME)
+    run_parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    run_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+
+    compare_parser = subparsers.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("results", help="JSON file of a run")
+    compare_parser.add_argument("baseline", nargs="?", default=BASELINE_PATH)
+    compare_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_benchmarks(
+            default_cases(args.max_vertices),
+            args.kernels,
+            args.workers,
+            args.min_time,
+            args.repeats,
+            log=lambda line: print(line, flush=True),
+        )
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(results, file, indent=1)
+        baseline_path = None
+        if args.baseline and os.path.exists(args.baseline):
+            if not args.output or os.path.abspath(args.output) != os.path.abspath(
+                args.baseline
+            ):
+                baseline_path = args.baseline
+    else:
+        with open(args.results) as file:
+            results = json.load(file)
+        baseline_path = args.baseline
+
+    failed = False
+    for mismatch in results["mismatches"]:
+        fixed_spins = mismatch.get("fixed_spins") or {}
+        print(
+            f"Mismatch: {mismatch['kernel']} on {mismatch['graph']}"
+            + (f" with spins {fixed_spins}" if fixed_spins else "")
+            + f": {mismatch['tait_0']} != {mismatch['reference']}"
+        )
+        failed = True
+    if baseline_path is not None:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        comparisons = compare(results, baseline, args.tolerance)
+        print(f"Compared with {baseline_path}:")
+        _print_comparisons(comparisons)
+        failed = failed or any(comparison["regression"] for comparison in comparisons)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import axios from "axios";
+import { BINARY_MEDIA_TYPE, decodeResponseData } from "@/services/binary";
 
 const API_URL = import.meta.env.API_URL || "http://localhost:8000/api/v1";
 
@@ -8,7 +9,13 @@ const instance = axios.create({
 
 instance.interceptors.request.use(
     function (config) {
-        config.headers["Accept"] = `application/json`;
+        // запросы с binary: true получают упакованные массивы, см. binary.js
+        if (config.binary) {
+            config.headers["Accept"] = `${BINARY_MEDIA_TYPE}, application/json`;
+            config.responseType = "arraybuffer";
+        } else {
+            config.headers["Accept"] = `application/json`;
+        }
         config.headers["Content-Type"] = "application/json";
         return config;
     },
@@ -17,6 +24,19 @@ instance.interceptors.request.use(
     }
 );
 
+instance.interceptors.response.use(
+    function (response) {
+        response.data = decodeResponseData(response);
+        return response;
+    },
+    function (error) {
+        if (error.response) {
+            error.response.data = decodeResponseData(error.response);
+        }
+        return Promise.reject(error);
+    }
+);
+
 const defaultApiExceptionHandler = (error) => {
     if (error.response) {
         console.error(error.response);
@@ -79,9 +99,13 @@ export const fetchTaitChromaticPolynomial = async (facesMatrix) => {
 
 export const fetchTaitAlphaRepresentation = async (facesMatrix, detail) => {
     let resp = await instance
-        .post("/calc_tait_0", { faces_matrix: facesMatrix, detail })
+        .post(
+            "/calc_tait_0",
+            { faces_matrix: facesMatrix, detail },
+            { binary: true }
+        )
         .catch(defaultApiExceptionHandler);
-    return resp.data;
+    return admitted(resp);
 };
 
 export const fetchTaitAlphaRepresentationFixed = async (
@@ -89,12 +113,29 @@ export const fetchTaitAlphaRepresentationFixed = async (
     fixedSpins
 ) => {
     let resp = await instance
-        .post("/calc_tait_0_fixed", {
+        .post(
+            "/calc_tait_0_fixed",
+            {
+                faces_matrix: facesMatrix,
+                fixed_spins: fixedSpins,
+            },
+            { binary: true }
+        )
+        .catch(fixedSpinsExceptionHandler);
+    return admitted(resp);
+};
+
+export const fetchTaitAlphaRepresentationFixedSweep = async (
+    facesMatrix,
+    vertices
+) => {
+    let resp = await instance
+        .post("/calc_tait_0_fixed_sweep", {
             faces_matrix: facesMatrix,
-            fixed_spins: fixedSpins,
+            vertices,
         })
-        .catch(fixedSpinsExceptionHandler);
-    return resp.data;
+        .catch(defaultApiExceptionHandler);
+    return admitted(resp);
 };
 
 export const fetchSValues = async (facesMatrix, verticesIn, verticesMid) => {
@@ -105,15 +146,79 @@ export const fetchSValues = async (facesMatrix, verticesIn, verticesMid) => {
             vertices_mid: verticesMid,
         })
         .catch(defaultApiExceptionHandler);
-    return resp.data;
+    return admitted(resp);
 };
 
 export const fetchHeawood = async (faces, fixedSpins = null) => {
     let resp = await instance
-        .post("/calc_heawood", {
-            faces,
-            fixed_spins: fixedSpins,
-        })
+        .post(
+            "/calc_heawood",
+            {
+                faces,
+                fixed_spins: fixedSpins,
+            },
+            { binary: true }
+        )
+        .catch(defaultApiExceptionHandler);
+    return admitted(resp);
+};
+
+const JOB_POLL_INTERVAL = 500;
+
+export const submitJob = async (method, params) => {
+    let resp = await instance
+        .post("/jobs", { method, params })
         .catch(defaultApiExceptionHandler);
     return resp.data;
 };
+
+export const fetchJob = async (jobId) => {
+    let resp = await instance
+        .get(`/jobs/${jobId}`)
+        .catch(defaultApiExceptionHandler);
+    return resp.data;
+};
+
+export const cancelJob = async (jobId) => {
+    let resp = await instance
+        .delete(`/jobs/${jobId}`)
+        .catch(defaultApiExceptionHandler);
+    return resp.data;
+};
+
+export const fetchJobResult = async (jobId) => {
+    let resp = await instance
+        .get(`/jobs/${jobId}/result`, { binary: true })
+        .catch(fixedSpinsExceptionHandler);
+    return resp.data;
+};
+
+// Ждет завершения фоновой задачи, onProgress вызывается со статусом задачи
+// (processed, total, eta) при каждом опросе
+const waitJob = async (job, onProgress = null) => {
+    const jobId = job.job_id;
+    while (!["done", "failed", "cancelled"].includes(job.status)) {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL));
+        job = (await fetchJob(jobId)).data;
+        if (onProgress) {
+            onProgress(job);
+        }
+    }
+    return fetchJobResult(jobId);
+};
+
+// Запускает фоновую задачу и ждет ее завершения
+export const runJob = async (method, params, onProgress = null) => {
+    const submitted = await submitJob(method, params);
+    return waitJob(submitted.data, onProgress);
+};
+
+// Долгие запросы сервер ставит в очередь задач (ответ 202), тогда ждем
+// результат задачи; решение сервера сохраняется в поле admission
+const admitted = async (resp) => {
+    if (resp.status !== 202) {
+        return resp.data;
+    }
+    const result = await waitJob(resp.data.data);
+    return { ...result, admission: resp.data.admission };
+};
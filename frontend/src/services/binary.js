@@ -0,0 +1,88 @@
+// Разбор компактных ответов сервера (application/octet-stream), формат описан
+// в app/binary.py: заголовок JSON и упакованные массивы
+
+export const BINARY_MEDIA_TYPE = "application/octet-stream";
+
+const MAGIC = "ALPB";
+const ALIGNMENT = 8;
+
+const INDEX_ARRAYS = {
+    uint8: Uint8Array,
+    uint16: Uint16Array,
+    uint32: Uint32Array,
+};
+
+// Точные значения хранятся индексами в словаре различных значений,
+// массив строк ссылается на строки словаря, поэтому не требует разбора
+const decodeIndex = (buffer, offset, array) => {
+    const indices = new INDEX_ARRAYS[array.dtype](buffer, offset, array.length);
+    const values = new Array(array.length);
+    for (let i = 0; i < array.length; i++) {
+        values[i] = array.values[indices[i]];
+    }
+    return values;
+};
+
+// Векторы спинов упакованы по 8 в байт, начиная со старшего бита, каждая
+// строка с нового байта; строки результата — Int8Array над общим буфером
+const decodeSpins = (buffer, offset, array) => {
+    const [nRows, nVertices] = array.shape;
+    const rowBytes = Math.ceil(nVertices / 8);
+    const bits = new Uint8Array(buffer, offset, nRows * rowBytes);
+    const spins = new Int8Array(nRows * nVertices);
+    const rows = new Array(nRows);
+    for (let r = 0; r < nRows; r++) {
+        for (let v = 0; v < nVertices; v++) {
+            const bit = (bits[r * rowBytes + (v >> 3)] >> (7 - (v & 7))) & 1;
+            spins[r * nVertices + v] = bit ? 1 : -1;
+        }
+        rows[r] = spins.subarray(r * nVertices, (r + 1) * nVertices);
+    }
+    return rows;
+};
+
+// Возвращает ответ в том же виде, что и JSON, но списки rank_list, det_list,
+// bordered_det_list — Int8Array, configurations — список Int8Array
+export const decodeBinary = (buffer) => {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(
+        ...new Uint8Array(buffer, 0, MAGIC.length)
+    );
+    if (magic !== MAGIC) {
+        throw new Error("Неизвестный формат ответа");
+    }
+    const headerLength = view.getUint32(4, true);
+    const header = JSON.parse(
+        new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength))
+    );
+    const start = Math.ceil((8 + headerLength) / ALIGNMENT) * ALIGNMENT;
+
+    const { arrays, version, ...content } = header;
+    for (const array of arrays) {
+        const offset = start + array.offset;
+        if (array.type === "int8") {
+            content.data[array.name] = new Int8Array(
+                buffer,
+                offset,
+                array.length
+            );
+        } else if (array.type === "index") {
+            content.data[array.name] = decodeIndex(buffer, offset, array);
+        } else if (array.type === "spins") {
+            content.data[array.name] = decodeSpins(buffer, offset, array);
+        }
+    }
+    return content;
+};
+
+// Ответ, запрошенный как arraybuffer: упакованный или JSON (ошибки, задачи)
+export const decodeResponseData = (response) => {
+    if (!(response.data instanceof ArrayBuffer)) {
+        return response.data;
+    }
+    const contentType = response.headers["content-type"] || "";
+    if (contentType.startsWith(BINARY_MEDIA_TYPE)) {
+        return decodeBinary(response.data);
+    }
+    return JSON.parse(new TextDecoder().decode(response.data));
+};
@@ -506,7 +506,9 @@ export const useGraphStore = defineStore("graph", () => {
 
         coloring.value.taitAlpha = data.tait_0;
 
-        if (detail) {
+        // слишком большой ответ сервер считает в агрегированном виде;
+        // ранги и миноры приходят как Int8Array, см. services/binary.js
+        if (detail && !(resp.admission && resp.admission.downgraded)) {
             coloring.value.taitAlphaDetail.determinantList = data.det_list;
             coloring.value.taitAlphaDetail.rankList = data.rank_list;
             coloring.value.taitAlphaDetail.gaussSumList = data.gauss_sum_list;
@@ -555,6 +557,7 @@ export const useGraphStore = defineStore("graph", () => {
 
         coloringFixed.value.taitAlpha = data.tait_0;
 
+        // ранги, миноры и det M[l] — Int8Array, значения — строки из словаря
         coloringFixed.value.determinantList = data.det_list;
         coloringFixed.value.rankList = data.rank_list;
         coloringFixed.value.gaussSumList = data.gauss_sum_list;
@@ -594,6 +597,7 @@ export const useGraphStore = defineStore("graph", () => {
 
         const data = resp.data;
 
+        // каждая конфигурация — Int8Array спинов
         coloring.value.heawood.configurations = data.configurations;
     };
 
@@ -1,6 +1,6 @@
 import { defineStore } from "pinia";
 import { ref, computed } from "vue";
-import { fetchSValues } from "@/services/api";
+import { runJob, cancelJob } from "@/services/api";
 
 export const useSValuesStore = defineStore("sValues", () => {
     const vertices = ref([
@@ -63,6 +63,8 @@ export const useSValuesStore = defineStore("sValues", () => {
 
     const isLoading = ref(false);
 
+    const job = ref(null);
+
     const deleteVertex = (vertex) => {
         vertices.value = vertices.value.filter((v) => v.id !== vertex.id);
     };
@@ -132,17 +134,31 @@ export const useSValuesStore = defineStore("sValues", () => {
             }
         }
 
-        const resp = await fetchSValues(
-            matrix,
-            verticesInIndices,
-            verticesMidIndices
-        );
-
-        const data = resp.data;
-
-        s.value = data.s;
+        try {
+            const resp = await runJob(
+                "calc_s_values",
+                {
+                    faces_matrix: matrix,
+                    vertices_in: verticesInIndices,
+                    vertices_mid: verticesMidIndices,
+                },
+                (status) => {
+                    job.value = status;
+                }
+            );
+            if (resp.status === "ok") {
+                s.value = resp.data.s;
+            }
+        } finally {
+            job.value = null;
+            isLoading.value = false;
+        }
+    };
 
-        isLoading.value = false;
+    const cancelSValue = async () => {
+        if (job.value !== null) {
+            await cancelJob(job.value.job_id);
+        }
     };
 
     const deleteFace = (faceIndex) => {
@@ -231,11 +247,13 @@ export const useSValuesStore = defineStore("sValues", () => {
         facesMatrixInput,
         s,
         isLoading,
+        job,
         deleteFace,
         deleteVertex,
         addVertex,
         extendFacesMatrix,
         findSValue,
+        cancelSValue,
         buildFacesMatrix,
     };
 });
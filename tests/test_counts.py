@@ -0,0 +1,237 @@
+import itertools
+from typing import List, Tuple
+
+import numpy as np
+import networkx as nx
+import pytest
+
+from app.coloring import (
+    calc_tait_0_tree_decomposition,
+    count_colorings_backtracking,
+    count_proper_colorings,
+    dual_graph,
+)
+from app.graph import (
+    build_masks_tensor,
+    calc_chi,
+    calc_heawood,
+    calc_heawood_fixed,
+    calc_s_values,
+    calc_tait_0_aggregated,
+    calc_tait_0_dual_chromatic,
+    estimate_heawood_search,
+    faces_matrix_to_dual_adjacency_matrix,
+    find_faces_in_embedding,
+    graph_from_edges,
+    iter_heawood,
+    iter_s_values,
+    planar_embedding,
+)
+from app.symmetry import (
+    bit_permutation_weights,
+    calc_orbits,
+    face_structure_automorphisms,
+)
+from test_f3 import GRAPHS, faces_matrix_of
+
+
+def faces_of(graph: nx.Graph) -> List[List[int]]:
+    edges = [sorted(edge) for edge in graph.edges]
+    return find_faces_in_embedding(planar_embedding(graph_from_edges(edges)))
+
+
+def spin_index(sigma: Tuple[int, ...]) -> int:
+    # see `app.graph.sigma_from_index`
+    return int("".join("1" if spin == 1 else "0" for spin in sigma), 2)
+
+
+def brute_force_orbits(perms: List[List[int]], n_vertices: int) -> List[frozenset]:
+    """
+    Orbits of all vectors of spins under the group generated by `perms`
+    and the flip of all spins, by a search from every vector
+    """
+    orbit_of = {}
+    for sigma in itertools.product([-1, 1], repeat=n_vertices):
+        if sigma in orbit_of:
+            continue
+        orbit = {sigma}
+        stack = [sigma]
+        while stack:
+            current = stack.pop()
+            images = [tuple(-spin for spin in current)]
+            for perm in perms:
+                image = [0] * n_vertices
+                for v, spin in enumerate(current):
+                    image[perm[v]] = spin
+                images.append(tuple(image))
+            for image in images:
+                if image not in orbit:
+                    orbit.add(image)
+                    stack.append(image)
+        orbit = frozenset(orbit)
+        for member in orbit:
+            orbit_of[member] = orbit
+    return list(set(orbit_of.values()))
+
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_orbit_weights_match_brute_force(name):
+    graph, _ = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    n_faces = len(faces_matrix)
+    n_vertices = 2 * (n_faces - 2)
+    perms = face_structure_automorphisms(faces_matrix)
+
+    # automorphisms preserve the faces: the set of faces of every vertex
+    faces = {frozenset(faces_matrix[i][i]) for i in range(n_faces)}
+    for perm in perms:
+        assert {frozenset(perm[v] for v in face) for face in faces} == faces
+
+    indices = np.arange(2**n_vertices, dtype=np.int64)
+    weights = bit_permutation_weights(perms, n_vertices)
+    is_representative, orbit_sizes, flip_in_orbit, _ = calc_orbits(
+        indices, weights, n_vertices
+    )
+    orbits = brute_force_orbits(perms, n_vertices)
+    representatives = sorted(min(map(spin_index, orbit)) for orbit in orbits)
+    assert np.flatnonzero(is_representative).tolist() == representatives
+    for orbit in orbits:
+        index = min(map(spin_index, orbit))
+        weight = orbit_sizes[index] * (1 if flip_in_orbit[index] else 2)
+        assert weight == len(orbit)
+
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_symmetry_matches_full_enumeration(name):
+    graph, expected = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    full = calc_tait_0_aggregated(faces_matrix, n_workers=1)
+    reduced = calc_tait_0_aggregated(faces_matrix, n_workers=1, symmetry=True)
+    assert full[0] == reduced[0] == expected
+    assert full[1:4] == reduced[1:4]
+    # rows are in the order of first appearance, which depends on the orbits
+    assert sorted(zip(*full[4:8])) == sorted(zip(*reduced[4:8]))
+
+
+def baseline_s_values(
+    faces_matrix: List[List[List[int]]],
+    vertices_in: List[int],
+    vertices_mid: List[int],
+) -> List:
+    """
+    The original enumeration of `calc_s_values`: the sum over spins
+    of `vertices_in` of $\\chi(x^T M x)$ for every vector of spins of `vertices_mid`
+    and every vector $x$
+    """
+    n_faces = len(faces_matrix)
+    masks_in = build_masks_tensor(faces_matrix, vertices_in)
+    masks_mid = build_masks_tensor(faces_matrix, vertices_mid)
+    results = []
+    for sigma_mid in itertools.product([-1, 1], repeat=len(vertices_mid)):
+        filled_mid = np.tensordot(np.array(sigma_mid), masks_mid, axes=1)
+        for x in itertools.product([-1, 0, 1], repeat=n_faces):
+            x = np.array(x)
+            s = 0
+            for sigma_in in itertools.product([-1, 1], repeat=len(vertices_in)):
+                filled = (
+                    np.tensordot(np.array(sigma_in), masks_in, axes=1) + filled_mid
+                ) % 3
+                s = calc_chi(int(x @ filled @ x)) + s
+            results.append(s)
+    return results
+
+
+@pytest.mark.parametrize("name", ["k4", "prism3", "prism4"])
+def test_s_values_match_baseline(name):
+    graph, _ = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    n_vertices = 2 * (len(faces_matrix) - 2)
+    vertices_in = list(range(n_vertices // 2))
+    vertices_mid = [n_vertices // 2, n_vertices - 1]
+    expected = baseline_s_values(faces_matrix, vertices_in, vertices_mid)
+
+    assert (
+        calc_s_values(faces_matrix, vertices_in, vertices_mid, n_workers=1) == expected
+    )
+    # chunks smaller than $3^{n\\_faces}$ recalculate the factors
+    chunks = iter_s_values(faces_matrix, vertices_in, vertices_mid, chunk_size=100)
+    assert [value for chunk in chunks for value in chunk] == expected
+
+
+def baseline_heawood(faces: List[List[int]], n_vertices: int) -> List[Tuple[int, ...]]:
+    """
+    All vectors of spins with the sum of spins of every face divisible by 3
+    """
+    return [
+        sigma
+        for sigma in itertools.product([-1, 1], repeat=n_vertices)
+        if all(sum(sigma[v] for v in set(face)) % 3 == 0 for face in faces)
+    ]
+
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_heawood_matches_brute_force(name):
+    graph, expected = GRAPHS[name]
+    faces = faces_of(graph)
+    n_vertices = 2 * (len(faces) - 2)
+    configurations = baseline_heawood(faces, n_vertices)
+    # Heawood: configurations correspond to Tait colorings
+    assert len(configurations) == expected
+
+    assert calc_heawood([list(face) for face in faces], n_workers=1) == configurations
+    assert calc_heawood(faces, n_workers=1, count_only=True) == expected
+    chunks = iter_heawood(faces, chunk_size=4)
+    assert [list(sigma) for chunk in chunks for sigma in chunk] == [
+        list(sigma) for sigma in configurations
+    ]
+
+    for spin in (-1, 1):
+        fixed = [sigma for sigma in configurations if sigma[0] == spin]
+        result = calc_heawood_fixed(faces, {0: spin}, n_workers=1)
+        assert [tuple(sigma) for sigma in result] == fixed
+        assert calc_heawood_fixed(
+            faces, {0: spin}, n_workers=1, count_only=True
+        ) == len(fixed)
+
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_heawood_estimate_is_close(name):
+    graph, expected = GRAPHS[name]
+    faces = faces_of(graph)
+    n_vertices = 2 * (len(faces) - 2)
+    n_nodes, n_configurations = estimate_heawood_search(faces)
+    assert 1 <= n_nodes <= 2 ** (n_vertices + 1)
+    # probes are unbiased, on these small graphs they are within a factor of 2
+    assert expected / 2 <= n_configurations <= 2 * expected
+    if name in ("k4", "prism3"):
+        # every probe of a regular search tree finds the exact numbers
+        assert n_configurations == expected
+
+
+def brute_force_colorings(graph: nx.Graph, n_colors: int) -> int:
+    nodes = list(graph.nodes)
+    count = 0
+    for colors in itertools.product(range(n_colors), repeat=len(nodes)):
+        coloring = dict(zip(nodes, colors))
+        if all(coloring[u] != coloring[v] for u, v in graph.edges):
+            count += 1
+    return count
+
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_colorings_match_brute_force(name):
+    graph, expected = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    dual = dual_graph(faces_matrix)
+    for n_colors in (3, 4):
+        n_colorings = brute_force_colorings(dual, n_colors)
+        assert count_proper_colorings(dual, n_colors)[0] == n_colorings
+        assert count_colorings_backtracking(dual, n_colors) == n_colorings
+        # colorings of the primal graph itself, which is not a dual graph
+        assert count_proper_colorings(graph, n_colors)[0] == brute_force_colorings(
+            graph, n_colors
+        )
+
+    assert calc_tait_0_tree_decomposition(faces_matrix)[0] == expected
+    dual_adjacency_matrix = faces_matrix_to_dual_adjacency_matrix(faces_matrix)
+    assert calc_tait_0_dual_chromatic(dual_adjacency_matrix) == expected
@@ -0,0 +1,91 @@
+import os
+import signal
+import threading
+import time
+import multiprocessing
+from typing import List
+
+import pytest
+
+from app.distributed import CLAIMED_DIR, Coordinator, run_worker
+from app.parallel import fold_shards
+
+N_VERTICES = 8
+N_SHARDS = 16
+LEASE_TIMEOUT = 1.0
+POLL_INTERVAL = 0.05
+
+
+def slow_shard(delay: float, start: int, stop: int) -> List[int]:
+    # depends on the order of merged shards, but not on their sizes
+    time.sleep(delay)
+    return [bin(index).count("1") for index in range(start, stop)]
+
+
+def failing_shard(failing_start: int, start: int, stop: int) -> List[int]:
+    if start == failing_start:
+        raise ArithmeticError(f"shard {start} is broken")
+    return slow_shard(0.0, start, stop)
+
+
+def concatenate(state: List[int], result: List[int]) -> List[int]:
+    return state + result
+
+
+def start_worker(directory: str, worker_id: str) -> multiprocessing.Process:
+    process = multiprocessing.get_context("fork").Process(
+        target=run_worker,
+        args=(directory, worker_id, LEASE_TIMEOUT, POLL_INTERVAL, True),
+        daemon=True,
+    )
+    process.start()
+    return process
+
+
+def test_coordinator_survives_killed_worker(tmp_path):
+    directory = str(tmp_path)
+    coordinator = Coordinator(directory, N_SHARDS, LEASE_TIMEOUT, POLL_INTERVAL)
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(
+            coordinator.fold(slow_shard, N_VERTICES, concatenate, [], (0.1,), key="run")
+        )
+    )
+    thread.start()
+
+    victim = start_worker(directory, "victim")
+    survivor = start_worker(directory, "survivor")
+    deadline = time.time() + 30
+    claimed_dir = os.path.join(directory, CLAIMED_DIR)
+    while not any(
+        name.endswith(".victim")
+        for name in (os.listdir(claimed_dir) if os.path.isdir(claimed_dir) else [])
+    ):
+        assert time.time() < deadline
+        time.sleep(0.01)
+    os.kill(victim.pid, signal.SIGKILL)
+    victim.join()
+
+    thread.join(60)
+    survivor.join(10)
+    assert not thread.is_alive()
+    assert survivor.exitcode == 0
+    expected = fold_shards(slow_shard, N_VERTICES, concatenate, [], (0.0,), n_workers=1)
+    assert results == [expected]
+
+
+def test_coordinator_raises_after_failures(tmp_path):
+    directory = str(tmp_path)
+    coordinator = Coordinator(
+        directory, N_SHARDS, LEASE_TIMEOUT, POLL_INTERVAL, max_failures=2
+    )
+    worker = start_worker(directory, "worker")
+    try:
+        with pytest.raises(RuntimeError, match="failed 2 times") as error:
+            coordinator.fold(
+                failing_shard, N_VERTICES, concatenate, [], (32,), key="broken"
+            )
+        assert "ArithmeticError: shard 32 is broken" in str(error.value)
+    finally:
+        os.kill(worker.pid, signal.SIGKILL)
+        worker.join()
@@ -0,0 +1,257 @@
+import itertools
+from typing import List, Tuple
+
+import numpy as np
+import networkx as nx
+import pytest
+import sympy
+
+from app.cyclotomic import Cyclotomic3, chi, gauss_sum_value
+from app.f3 import (
+    symmetric_elimination_f3,
+    batched_symmetric_elimination_f3,
+    batched_bordered_elimination_f3,
+)
+from app.graph import (
+    build_faces_matrix,
+    build_masks_tensor,
+    calc_tait_0_aggregated,
+    calc_tait_0_fixed_in_detail,
+    calc_tait_0_in_detail,
+    find_faces_in_embedding,
+    graph_from_edges,
+    planar_embedding,
+)
+
+F3 = sympy.GF(3)
+I_DIV_SQRT_3 = sympy.I / sympy.sqrt(3)
+
+
+def _det_f3(matrix: np.ndarray) -> int:
+    if len(matrix) == 0:
+        return 1
+    return int(sympy.Matrix(matrix.tolist()).det()) % 3
+
+
+def _to_f3(value: int) -> int:
+    return -1 if value % 3 == 2 else value % 3
+
+
+def brute_force_minor(matrix: np.ndarray) -> Tuple[int, int, List[int]]:
+    """
+    Largest non-zero principal minor by enumeration of all principal submatrices
+    with exact determinants, like the original `largest_nonzero_principal_minor`
+    """
+    n = len(matrix)
+    for rank in range(n, 0, -1):
+        for rows in itertools.combinations(range(n), rank):
+            det = _det_f3(matrix[np.ix_(rows, rows)])
+            if det != 0:
+                return _to_f3(det), rank, list(rows)
+    return 1, 0, []
+
+
+def rank_f3(matrix: np.ndarray) -> int:
+    rows, columns = matrix.shape
+    elements = [[F3(int(value)) for value in row] for row in matrix]
+    return sympy.polys.matrices.DomainMatrix(elements, (rows, columns), F3).rank()
+
+
+def random_symmetric(rng: np.random.Generator, n: int, density: float) -> np.ndarray:
+    matrix = rng.integers(0, 3, size=(n, n)) * (rng.random((n, n)) < density)
+    matrix = np.triu(matrix)
+    matrix = (matrix + np.triu(matrix, 1).T) % 3
+    if rng.random() < 0.3:
+        # zero diagonal forces the off-diagonal (2 x 2 block) pivots
+        np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def random_matrices(seed: int, count: int = 300) -> List[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    matrices = [np.zeros((3, 3), dtype=int), np.array([[0, 1], [1, 0]])]
+    for _ in range(count):
+        n = int(rng.integers(1, 7))
+        matrices.append(random_symmetric(rng, n, float(rng.choice([0.3, 0.6, 1.0]))))
+    return matrices
+
+
+@pytest.mark.parametrize("matrix", random_matrices(0))
+def test_symmetric_elimination_matches_brute_force(matrix):
+    det_minor, rank, rows = symmetric_elimination_f3(matrix)
+    expected_det, expected_rank, _ = brute_force_minor(matrix)
+    assert (det_minor, rank) == (expected_det, expected_rank)
+    assert rank == rank_f3(matrix)
+    # the returned rows form a largest non-zero principal minor of value det'
+    assert len(rows) == rank
+    assert _to_f3(_det_f3(matrix[np.ix_(rows, rows)])) == det_minor
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 6])
+def test_batched_elimination_matches_brute_force(n):
+    rng = np.random.default_rng(n)
+    matrices = np.array(
+        [random_symmetric(rng, n, density) for density in [0.2, 0.5, 1.0] * 40]
+    )
+    ranks, dets = batched_symmetric_elimination_f3(matrices)
+    for matrix, rank, det in zip(matrices, ranks, dets):
+        expected_det, expected_rank, _ = brute_force_minor(matrix)
+        assert (int(det), int(rank)) == (expected_det, expected_rank)
+
+
+@pytest.mark.parametrize("n", [1, 2, 4, 6])
+def test_bordered_elimination_matches_brute_force(n):
+    rng = np.random.default_rng(100 + n)
+    matrices = np.array(
+        [random_symmetric(rng, n, density) for density in [0.2, 0.5, 1.0] * 30]
+    )
+    vectors = np.array(
+        [np.zeros(n, dtype=int)] + [rng.integers(0, 3, size=n) for _ in range(4)]
+    )
+    ranks, dets, consistent, bordered = batched_bordered_elimination_f3(
+        matrices, vectors
+    )
+    expected_ranks, expected_dets = batched_symmetric_elimination_f3(matrices)
+    assert (ranks == expected_ranks).all() and (dets == expected_dets).all()
+
+    for k, matrix in enumerate(matrices):
+        det_minor, rank, rows = brute_force_minor(matrix)
+        for j, l in enumerate(vectors):
+            augmented = np.concatenate([matrix, l.reshape(-1, 1)], axis=1)
+            assert consistent[k, j] == (rank_f3(augmented) == rank)
+            if not consistent[k, j]:
+                continue
+            # determinant of the minor bordered by l, as in the original
+            # calc_tait_0_fixed_in_detail
+            minor = np.pad(matrix[np.ix_(rows, rows)], ((0, 1), (0, 1)))
+            minor[-1, :-1] = l[rows]
+            minor[:-1, -1] = l[rows]
+            assert int(bordered[k, j]) == _to_f3(_det_f3(minor))
+
+
+def random_cyclotomics(seed: int, count: int = 30) -> List[Cyclotomic3]:
+    rng = np.random.default_rng(seed)
+    return [
+        Cyclotomic3(*(int(x) for x in rng.integers(-20, 21, size=2)), int(k))
+        for k in rng.integers(0, 4, size=count)
+    ]
+
+
+def test_cyclotomic_arithmetic_matches_sympy():
+    values = random_cyclotomics(0)
+    for x, y in zip(values, values[1:]):
+        for result, expected in [
+            (x + y, x.to_sympy() + y.to_sympy()),
+            (x - y, x.to_sympy() - y.to_sympy()),
+            (x * y, x.to_sympy() * y.to_sympy()),
+            (x**3, x.to_sympy() ** 3),
+        ]:
+            assert sympy.expand(result.to_sympy() - expected) == 0
+        # the representation is reduced, so equal numbers are equal objects
+        assert (x * 3) * Cyclotomic3(1, 0, 1) == x
+
+
+def test_chi_and_gauss_sum_match_sympy():
+    for x in range(-3, 6):
+        expected = sympy.exp(2 * sympy.pi * sympy.I * x / 3)
+        assert sympy.expand_complex(chi(x).to_sympy() - expected) == 0
+    for det_minor in (-1, 1):
+        for rank in range(8):
+            expected = det_minor * I_DIV_SQRT_3**rank
+            assert (
+                sympy.expand(gauss_sum_value(det_minor, rank).to_sympy() - expected)
+                == 0
+            )
+
+
+def faces_matrix_of(graph: nx.Graph) -> List[List[List[int]]]:
+    edges = [sorted(edge) for edge in graph.edges]
+    return build_faces_matrix(
+        find_faces_in_embedding(planar_embedding(graph_from_edges(edges)))
+    )
+
+
+GRAPHS = {
+    "k4": (nx.complete_graph(4), 2),
+    "prism3": (nx.circular_ladder_graph(3), 2),
+    "prism4": (nx.circular_ladder_graph(4), 8),
+    "prism5": (nx.circular_ladder_graph(5), 10),
+}
+
+
+def baseline_in_detail(
+    faces_matrix: List[List[List[int]]],
+) -> Tuple[int, List[sympy.Basic], List[int], List[int]]:
+    """
+    The original sympy enumeration of `calc_tait_0_in_detail`
+    """
+    n_vertices = 2 * (len(faces_matrix) - 2)
+    masks_tensor = build_masks_tensor(faces_matrix, list(range(n_vertices)))
+    gauss_list, det_minor_list, rank_list = [], [], []
+    for sigma in itertools.product([-1, 1], repeat=n_vertices):
+        filled = np.tensordot(np.array(sigma), masks_tensor, axes=1) % 3
+        det_minor, rank, _ = brute_force_minor(filled)
+        gauss_list.append(1 if rank == 0 else det_minor * I_DIV_SQRT_3**rank)
+        det_minor_list.append(det_minor)
+        rank_list.append(rank)
+    n_tait_0 = sympy.nsimplify(sum(gauss_list))
+    assert isinstance(n_tait_0, sympy.Integer)
+    return int(n_tait_0), gauss_list, det_minor_list, rank_list
+
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_tait_0_matches_baseline(name):
+    graph, expected = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    n_tait_0, gauss_list, det_minor_list, rank_list = baseline_in_detail(faces_matrix)
+    assert n_tait_0 == expected
+
+    result = calc_tait_0_in_detail(faces_matrix, n_workers=1)
+    assert result[0] == expected
+    assert result[2] == det_minor_list and result[3] == rank_list
+    for value, baseline in zip(result[1], gauss_list):
+        assert sympy.expand(value.to_sympy() - baseline) == 0
+
+    assert calc_tait_0_aggregated(faces_matrix, n_workers=1)[0] == expected
+
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_tait_0_fixed_matches_baseline(name):
+    graph, expected = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    n_faces = len(faces_matrix)
+    n_vertices = 2 * (n_faces - 2)
+    tait_0_list = []
+    for spin in (-1, 1):
+        fixed = {0: spin}
+        l = np.array(
+            [
+                sum(fixed.get(v, 0) for v in faces_matrix[i][i]) % 3
+                for i in range(n_faces)
+            ]
+        )
+        masks_tensor = build_masks_tensor(faces_matrix, list(range(1, n_vertices)))
+        is_consistent, details = calc_tait_0_fixed_in_detail(
+            faces_matrix, fixed, n_workers=1
+        )
+
+        baseline_consistent = True
+        bordered_det_list = []
+        for sigma in itertools.product([-1, 1], repeat=n_vertices - 1):
+            filled = np.tensordot(np.array(sigma), masks_tensor, axes=1) % 3
+            det_minor, rank, rows = brute_force_minor(filled)
+            if rank_f3(np.concatenate([filled, l.reshape(-1, 1)], axis=1)) != rank:
+                baseline_consistent = False
+                break
+            minor = np.pad(filled[np.ix_(rows, rows)], ((0, 1), (0, 1)))
+            minor[-1, :-1] = l[rows]
+            minor[:-1, -1] = l[rows]
+            bordered_det_list.append(_to_f3(_det_f3(minor)))
+
+        assert is_consistent == baseline_consistent
+        if is_consistent:
+            assert details[4] == bordered_det_list
+            tait_0_list.append(details[0])
+    # colorings with both spins of vertex 0 are all colorings
+    if len(tait_0_list) == 2:
+        assert sum(tait_0_list) == expected
@@ -0,0 +1,316 @@
+import os
+import json
+import struct
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from app.batch import load_batch_results, process_graph_record, run_batch
+from app.binary import ALIGNMENT, MAGIC, encode_binary
+from app.cache import (
+    ResultCache,
+    cached_call,
+    face_vector_index_permutation,
+    faces_matrix_structure,
+    permute_lists,
+    sigma_index_permutation,
+)
+from app.checkpoint import Checkpoint, checkpoint_key
+from app.graph import (
+    calc_heawood,
+    calc_s_values,
+    calc_tait_0_aggregated,
+    calc_tait_0_fixed_in_detail,
+    calc_tait_0_in_detail,
+)
+from app.store import count_rank_det, open_detail_store, write_detail_store
+from test_f3 import GRAPHS, baseline_in_detail, faces_matrix_of
+from test_counts import faces_of
+
+
+def relabel(
+    faces_matrix: List[List[List[int]]], vertex_perm: List[int], face_perm: List[int]
+) -> List[List[List[int]]]:
+    """
+    Faces Matrix of the same graph with vertex `v` renamed to `vertex_perm[v]`
+    and face `f` to `face_perm[f]`
+    """
+    n_faces = len(faces_matrix)
+    relabeled = [[[] for _ in range(n_faces)] for _ in range(n_faces)]
+    for i in range(n_faces):
+        for j in range(n_faces):
+            relabeled[face_perm[i]][face_perm[j]] = sorted(
+                vertex_perm[v] for v in faces_matrix[i][j]
+            )
+    return relabeled
+
+
+def tait_0_detail(faces_matrix: List[List[List[int]]]) -> Dict[str, Any]:
+    tait_0, gauss_sum_list, det_list, rank_list = calc_tait_0_in_detail(
+        faces_matrix, n_workers=1
+    )
+    return {
+        "tait_0": tait_0,
+        "gauss_sum_list": [str(value) for value in gauss_sum_list],
+        "det_list": det_list,
+        "rank_list": rank_list,
+    }
+
+
+def not_cached() -> Any:
+    raise AssertionError("The result must be taken from the cache")
+
+
+@pytest.mark.parametrize("name", ["k4", "prism4", "prism5"])
+def test_cache_remaps_relabeled_graph(name, tmp_path):
+    graph, _ = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    n_faces = len(faces_matrix)
+    n_vertices = 2 * (n_faces - 2)
+    vertices = list(range(n_vertices))
+    rng = np.random.default_rng(n_vertices)
+    relabeled = relabel(
+        faces_matrix,
+        rng.permutation(n_vertices).tolist(),
+        rng.permutation(n_faces).tolist(),
+    )
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+
+    def remap(result, mapping, face_mapping):
+        # as in `app.main.tait_0_data`
+        perm = sigma_index_permutation(vertices, vertices, mapping)
+        return permute_lists(result, ("gauss_sum_list", "det_list", "rank_list"), perm)
+
+    def call(matrix, compute):
+        structure = faces_matrix_structure(matrix, n_vertices)
+        return cached_call(cache, "calc_tait_0", {}, structure, compute, remap)
+
+    assert call(faces_matrix, lambda: tait_0_detail(faces_matrix)) == tait_0_detail(
+        faces_matrix
+    )
+    assert call(relabeled, not_cached) == tait_0_detail(relabeled)
+
+
+@pytest.mark.parametrize("name", ["k4", "prism3"])
+def test_cache_remaps_s_values(name, tmp_path):
+    graph, _ = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    n_faces = len(faces_matrix)
+    n_vertices = 2 * (n_faces - 2)
+    rng = np.random.default_rng(n_vertices)
+    vertex_perm = rng.permutation(n_vertices).tolist()
+    relabeled = relabel(faces_matrix, vertex_perm, rng.permutation(n_faces).tolist())
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+
+    def call(matrix, vertices_in, vertices_mid, compute):
+        # as in `app.main.s_values_data`
+        vertex_labels = {v: ":in" for v in vertices_in}
+        vertex_labels.update({v: ":mid" for v in vertices_mid})
+
+        def remap(result, mapping, face_mapping):
+            stored_vertices_mid = sorted(mapping[v] for v in vertices_mid)
+            perm_sigma = sigma_index_permutation(
+                vertices_mid, stored_vertices_mid, mapping
+            )
+            perm_x = face_vector_index_permutation(n_faces, face_mapping)
+            perm = (perm_sigma.reshape(-1, 1) * len(perm_x) + perm_x).reshape(-1)
+            return permute_lists(result, ("s",), perm)
+
+        structure = faces_matrix_structure(matrix, n_vertices, vertex_labels)
+        return cached_call(cache, "calc_s_values", {}, structure, compute, remap)
+
+    def s_values(matrix, vertices_in, vertices_mid):
+        values = calc_s_values(matrix, vertices_in, vertices_mid, n_workers=1)
+        return {"s": [str(value) for value in values]}
+
+    vertices_in = [0, 1]
+    vertices_mid = [2, n_vertices - 1]
+    expected = s_values(faces_matrix, vertices_in, vertices_mid)
+    assert call(faces_matrix, vertices_in, vertices_mid, lambda: expected) == expected
+
+    relabeled_in = sorted(vertex_perm[v] for v in vertices_in)
+    relabeled_mid = sorted(vertex_perm[v] for v in vertices_mid)
+    assert call(relabeled, relabeled_in, relabeled_mid, not_cached) == s_values(
+        relabeled, relabeled_in, relabeled_mid
+    )
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.mark.parametrize("symmetry", [False, True])
+@pytest.mark.parametrize("name", ["prism4", "prism5"])
+def test_checkpoint_resume_matches_uninterrupted(name, symmetry, tmp_path):
+    graph, _ = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    expected = calc_tait_0_aggregated(faces_matrix, n_workers=1, symmetry=symmetry)
+
+    n_calls = 0
+
+    def interrupt(processed: int, total: int) -> None:
+        nonlocal n_calls
+        n_calls += 1
+        if n_calls == 5:
+            raise Interrupted()
+
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.pickle"), 0)
+    with pytest.raises(Interrupted):
+        calc_tait_0_aggregated(
+            faces_matrix,
+            n_workers=1,
+            symmetry=symmetry,
+            progress=interrupt,
+            checkpoint=checkpoint,
+        )
+    key = checkpoint_key("calc_tait_0_aggregated", faces_matrix, symmetry)
+    position, _ = checkpoint.load(key)
+    assert 0 < position < 2 ** (2 * (len(faces_matrix) - 2))
+
+    positions = []
+    result = calc_tait_0_aggregated(
+        faces_matrix,
+        n_workers=1,
+        symmetry=symmetry,
+        progress=lambda processed, total: positions.append(processed),
+        checkpoint=checkpoint,
+    )
+    assert result == expected
+    # the resumed run does not repeat the shards before the checkpoint
+    assert positions[0] > position
+    assert not os.path.exists(checkpoint.path)
+
+
+def decode_binary(data: bytes) -> Dict[str, Any]:
+    """
+    Decoder of the layout documented in `app.binary.encode_binary`
+    """
+    assert data[:4] == MAGIC
+    (header_length,) = struct.unpack("<I", data[4:8])
+    header = json.loads(data[8 : 8 + header_length])
+    buffers_start = 8 + header_length
+    buffers_start += -buffers_start % ALIGNMENT
+    content = {key: header[key] for key in header if key not in ("version", "arrays")}
+    content["data"] = dict(header["data"])
+    for array in header["arrays"]:
+        offset = buffers_start + array["offset"]
+        assert offset % ALIGNMENT == 0
+        if array["type"] == "int8":
+            values = np.frombuffer(data, np.int8, array["length"], offset).tolist()
+        elif array["type"] == "index":
+            indices = np.frombuffer(data, array["dtype"], array["length"], offset)
+            values = [array["values"][i] for i in indices.tolist()]
+        else:
+            n_rows, n_vertices = array["shape"]
+            row_bytes = (n_vertices + 7) // 8
+            packed = np.frombuffer(data, np.uint8, n_rows * row_bytes, offset)
+            bits = np.unpackbits(packed.reshape(n_rows, row_bytes), axis=1)
+            values = np.where(bits[:, :n_vertices] == 1, 1, -1).tolist()
+        content["data"][array["name"]] = values
+    return content
+
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_binary_encoding_round_trip(name):
+    graph, _ = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    content = {"status": "ok", "data": tait_0_detail(faces_matrix)}
+    assert decode_binary(encode_binary(content)) == content
+
+    configurations = [list(sigma) for sigma in calc_heawood(faces_of(graph), 1)]
+    content = {"status": "ok", "data": {"configurations": configurations}}
+    assert decode_binary(encode_binary(content)) == content
+
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_detail_store_matches_baseline(name, tmp_path):
+    graph, expected = GRAPHS[name]
+    faces_matrix = faces_matrix_of(graph)
+    _, _, det_minor_list, rank_list = baseline_in_detail(faces_matrix)
+
+    metadata = write_detail_store(str(tmp_path / "full"), faces_matrix, n_workers=1)
+    assert metadata["tait_0"] == expected
+    stored_metadata, arrays = open_detail_store(str(tmp_path / "full"))
+    assert stored_metadata == json.loads(json.dumps(metadata))
+    assert isinstance(arrays["rank"], np.memmap)
+    assert arrays["rank"].tolist() == rank_list
+    assert arrays["det"].tolist() == det_minor_list
+    counts = {}
+    for key in zip(det_minor_list, rank_list):
+        counts[key] = counts.get(key, 0) + 1
+    assert count_rank_det(arrays["rank"], arrays["det"], chunk_size=3) == counts
+
+    fixed = {0: 1}
+    is_consistent, details = calc_tait_0_fixed_in_detail(faces_matrix, fixed, 1)
+    if not is_consistent:
+        with pytest.raises(ValueError):
+            write_detail_store(
+                str(tmp_path / "fixed"), faces_matrix, fixed, n_workers=1
+            )
+        return
+    n_tait_0, det_list, ranks, _, bordered_det_list, _, _ = details
+    metadata = write_detail_store(
+        str(tmp_path / "fixed"), faces_matrix, fixed, n_workers=1
+    )
+    assert metadata["tait_0"] == n_tait_0
+    _, arrays = open_detail_store(str(tmp_path / "fixed"))
+    assert arrays["rank"].tolist() == ranks
+    assert arrays["det"].tolist() == det_list
+    assert arrays["bordered_det"].tolist() == bordered_det_list
+    assert arrays["chi"].tolist() == [
+        det * bordered for det, bordered in zip(det_list, bordered_det_list)
+    ]
+
+
+def test_batch_round_trip(tmp_path):
+    records = [
+        # k4 in planar code of plantri
+        "4 bcd,adc,abd,acb",
+        json.dumps({"id": "prism3", "edges": sorted(GRAPHS["prism3"][0].edges)}),
+        # not cubic
+        json.dumps([[0, 1], [1, 2], [2, 0]]),
+        json.dumps(sorted(GRAPHS["prism4"][0].edges)),
+        "not a graph",
+        json.dumps({"id": "prism5", "edges": sorted(GRAPHS["prism5"][0].edges)}),
+    ]
+    input_path = tmp_path / "graphs.txt"
+    input_path.write_text("\n".join(records) + "\n")
+    output_dir = str(tmp_path / "results")
+
+    state = run_batch(str(input_path), output_dir, shard_size=4)
+    assert (state["n_shards"], state["n_graphs"]) == (2, len(records))
+    columns = load_batch_results(output_dir)
+
+    for i, record in enumerate(records):
+        expected = process_graph_record(i, record)
+        assert columns["line"][i] == i
+        assert columns["id"][i] == expected["id"]
+        assert columns["status"][i] == expected["status"]
+        if expected["status"] != "ok":
+            assert columns["message"][i] == expected["message"]
+            continue
+        for key in ("n_vertices", "tait_0", "n_even_ranks", "n_odd_ranks"):
+            assert columns[key][i] == expected[key]
+        start, stop = columns["histogram_offsets"][i : i + 2]
+        assert columns["histogram_det"][start:stop].tolist() == list(
+            expected["det_list"]
+        )
+        assert columns["histogram_rank"][start:stop].tolist() == list(
+            expected["rank_list"]
+        )
+        assert columns["histogram_count"][start:stop].tolist() == list(
+            expected["num_list"]
+        )
+        start, stop = columns["vertex_offsets"][i : i + 2]
+        assert columns["vertex_faces"][start:stop].tolist() == expected["vertex_faces"]
+
+    tait_0 = {name: expected for name, (_, expected) in GRAPHS.items()}
+    assert columns["tait_0"].tolist() == [
+        tait_0["k4"],
+        tait_0["prism3"],
+        -1,
+        tait_0["prism4"],
+        -1,
+        tait_0["prism5"],
+    ]